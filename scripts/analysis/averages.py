@@ -4,78 +4,114 @@ Compute average percent decrease in energy consumption across benchmarks:
 1. From worst to best Python version per (pi, distro).
 2. From worst to best OS per (pi, python).
 3. From RPi3B+ to RPi4B per (distro, python).
+4. With --variants, from worst to best interpreter build variant (default,
+   JIT, free-threaded, non-PGO) per (pi, distro, python).
+
+Only the default build is loaded unless --variants is given; then the first
+three figures are taken per build variant as well.
+
+With --bootstrap N the iterations of every configuration are resampled N times
+(see resampling.py) and percentile confidence intervals are reported for all
+three figures.
+
+Usage:
+    python3 averages.py [--bootstrap 100000] [--seed 12345] [--variants]
 """
 
-import glob
-import os
-import re
-import pandas as pd
+import argparse
+
 import numpy as np
 
+from resampling import DEFAULT_SEED, bootstrap_stats, percentile_ci
+from results_loader import load_results
 
-def parse_filename(fname):
-    m = re.match(r"../../results/results_(.+?)_(.+?)_python(\d+\.\d+)\.csv$", fname)
-    return m.groups() if m else None
+CONFIG_COLUMNS = ['rpi', 'os', 'python', 'variant']
 
 
-def compute_average_energy(path):
-    df = pd.read_csv(path)
-    return df.iloc[:, -1].mean()
+def compute_average_energy(data):
+    """Mean energy per (pi, distro, python, variant) configuration."""
+    df = data.groupby(CONFIG_COLUMNS, sort=False)['Energy consumption'].mean().reset_index()
+    return df.rename(columns={'rpi': 'pi', 'os': 'distro', 'Energy consumption': 'energy'})
 
 
 def percent_decrease(worst, best):
-    return 100 * (worst - best) / worst if worst > 0 else 0
+    worst = np.asarray(worst, dtype=np.float64)
+    safe = np.where(worst > 0, worst, 1)
+    return np.where(worst > 0, 100 * (worst - best) / safe, 0)
+
+
+def average_decreases(df, energy):
+    """The four average percent decreases for each row of an energy matrix.
+
+    energy has shape (n, len(df)): column j holds the mean energy of the
+    configuration in row j of df, row i one (point or resampled) estimate.
+    Returns an array of shape (n, 4): Python version, OS, RPi3B+ to RPi4B,
+    build variant (zero with a single variant).
+    """
+    energy = np.atleast_2d(energy)
+    df = df.reset_index(drop=True)
+
+    # 1. Python version decrease per (pi, distro, variant)
+    # 2. OS decrease per (pi, python, variant)
+    # 4. Build variant decrease per (pi, distro, python)
+    spreads = []
+    for keys in (['pi', 'distro', 'variant'], ['pi', 'python', 'variant'], ['pi', 'distro', 'python']):
+        dec = [percent_decrease(energy[:, idx].max(axis=1), energy[:, idx].min(axis=1))
+               for idx in df.groupby(keys).indices.values() if len(idx) > 1]
+        spreads.append(np.mean(dec, axis=0) if dec else np.zeros(len(energy)))
+
+    # 3. RPi3B+ to RPi4B per (distro, python, variant)
+    dec_rpi = []
+    for _, idx in df.groupby(['distro', 'python', 'variant']).indices.items():
+        pis = df.loc[idx, 'pi']
+        rpi3 = idx[(pis == 'RPi3B+').to_numpy()]
+        rpi4 = idx[(pis == 'RPi4B').to_numpy()]
+        if len(rpi3) and len(rpi4):
+            dec_rpi.append(percent_decrease(energy[:, rpi3].mean(axis=1),
+                                            energy[:, rpi4].mean(axis=1)))
+    avg_dec_rpi = np.mean(dec_rpi, axis=0) if dec_rpi else np.zeros(len(energy))
+
+    return np.column_stack(spreads[:2] + [avg_dec_rpi, spreads[2]])
 
 
 def main():
-    files = glob.glob("../../results/results_*_python*.csv")
-    data = []
-
-    for path in files:
-        parsed = parse_filename(path)
-        if not parsed:
-            continue
-        pi, distro, pyver = parsed
-        energy = compute_average_energy(path)
-        data.append({'pi': pi, 'distro': distro, 'python': pyver, 'energy': energy})
-
-    df = pd.DataFrame(data)
-
-    # 1. Python version decrease per (pi, distro)
-    dec_py = []
-    for (pi, distro), group in df.groupby(['pi', 'distro']):
-        if len(group) > 1:
-            worst = group['energy'].max()
-            best = group['energy'].min()
-            dec_py.append(percent_decrease(worst, best))
-    avg_dec_py = np.mean(dec_py)
-
-    # 2. OS decrease per (pi, python)
-    dec_os = []
-    for (pi, pyver), group in df.groupby(['pi', 'python']):
-        if len(group) > 1:
-            worst = group['energy'].max()
-            best = group['energy'].min()
-            dec_os.append(percent_decrease(worst, best))
-    avg_dec_os = np.mean(dec_os)
-
-    # 3. RPi3B+ to RPi4B per (distro, python)
-    dec_rpi = []
-    for (distro, pyver), group in df.groupby(['distro', 'python']):
-        group = group.set_index('pi')
-        if 'RPi3B+' in group.index and 'RPi4B' in group.index:
-            energy_rpi3 = group.loc['RPi3B+', 'energy']
-            energy_rpi4 = group.loc['RPi4B', 'energy']
-            if isinstance(energy_rpi3, pd.Series):
-                energy_rpi3 = energy_rpi3.mean()
-            if isinstance(energy_rpi4, pd.Series):
-                energy_rpi4 = energy_rpi4.mean()
-            dec_rpi.append(percent_decrease(energy_rpi3, energy_rpi4))
-    avg_dec_rpi = np.mean(dec_rpi) if dec_rpi else 0
-
-    print(f"Avg % decrease (Python version, per Pi+OS): {avg_dec_py:.2f}%")
-    print(f"Avg % decrease (OS, per Pi+Python): {avg_dec_os:.2f}%")
-    print(f"Avg % decrease (RPi3B+ to RPi4B, per OS+Python): {avg_dec_rpi:.2f}%")
+    parser = argparse.ArgumentParser(description='Average percent decrease in energy consumption')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='Report bootstrap confidence intervals from N resamples')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Resampling seed')
+    parser.add_argument('--workers', type=int, default=None, help='Resampling worker processes')
+    parser.add_argument('--variants', action='store_true',
+                        help='Include every build variant and the decrease from the worst to the best one')
+    args = parser.parse_args()
+
+    data = load_results(where={'variant': 'all'} if args.variants else None).dropna(subset=['Energy consumption'])
+    df = compute_average_energy(data)
+    point = average_decreases(df, df['energy'].to_numpy())[0]
+
+    labels = [
+        "Avg % decrease (Python version, per Pi+OS)",
+        "Avg % decrease (OS, per Pi+Python)",
+        "Avg % decrease (RPi3B+ to RPi4B, per OS+Python)",
+        "Avg % decrease (build variant, per Pi+OS+Python)",
+    ]
+    shown = 4 if args.variants else 3
+    if args.variants:
+        labels[:3] = [label.replace(")", "+variant)") for label in labels[:3]]
+    if not args.bootstrap:
+        for label, value in zip(labels[:shown], point):
+            print(f"{label}: {value:.2f}%")
+        return
+
+    # Resample the iterations of every configuration independently
+    groups = data.groupby(CONFIG_COLUMNS, sort=False)['Energy consumption']
+    samples = [groups.get_group(tuple(row)).to_numpy()
+               for row in df[['pi', 'distro', 'python', 'variant']].itertuples(index=False)]
+    dist = bootstrap_stats(samples, 'mean', args.bootstrap, args.seed, args.workers)
+    lo, hi = percentile_ci(average_decreases(df, dist), args.confidence)
+    for label, value, l, h in zip(labels[:shown], point, lo, hi):
+        print(f"{label}: {value:.2f}% "
+              f"({args.confidence:.0%} CI {l:.2f}% to {h:.2f}%)")
 
 
 if __name__ == '__main__':
@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-#!/usr/bin/env python3
 """
 Grouped boxplot of energy consumption for Raspberry Pi benchmarks.
 
@@ -7,79 +6,100 @@ This script generates a boxplot of energy consumption data, grouped by one of:
     - Python version
     - Operating system
     - Raspberry Pi model
+    - Interpreter build variant (default, JIT, free-threaded, non-PGO)
+    - Throttling during the run (from the telemetry in the results database)
 
 It aggregates energy values from multiple CSV files and visualizes distributions
 with mean annotations.
 
 Usage:
-    python3 boxplot.py <group>
+    python3 boxplot.py <group> [--throttled yes|no] [--quarantined yes|no|all] [--variant V] [--python X.Y]
+                       [--streaming-threshold N]
 
 Arguments:
-    group      Grouping factor for the boxplot (one of: python, os, rpi)
+    group        Grouping factor for the boxplot (one of: python, os, rpi, variant, throttled)
+    --throttled  Only runs whose telemetry shows (or does not show) throttling
+    --quarantined
+                 Runs quarantined as anomalous during the experiment are left
+                 out; 'all' includes them, 'yes' plots them alone
+    --variant    Build variant to plot (default: the default build, or all
+                 when grouping by variant)
+    --python     Only this Python version; the JIT and free-threaded builds
+                 exist for 3.13 and later only, so 'variant --python 3.13'
+                 compares the variants within one version
 
 Input:
-    - CSV files named: results_<rpi>_<os>_python<version>.csv
+    - CSV files named: results_<rpi>_<os>_python<version>[-<variant>].csv
     - Located in ../../results/
     - Each file should contain duration and energy data in the last two columns
+    - Read through the shared results cache (see results_loader.py)
 
 Output:
-    - PNG image saved to ./figures/energy_boxplot_by_<group>.png
+    - PNG image saved to
+      ./figures/energy_boxplot_by_<group>[_throttled_<yes|no>][_quarantined_<yes|no|all>]
+      [_variant_<variant>][_python_<version>].png
+
+With more than --streaming-threshold rows the boxes are drawn from bounded-memory
+quantile sketches (see streaming_stats.py) instead of the raw values.
 """
-import glob
-import os
-import re
 import argparse
+import os
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from results_index import DB_NAME, RESULTS_DIR, db_path
+from results_loader import DEFAULT_VARIANT, load_results
+from streaming_stats import STREAMING_THRESHOLD, summarize_grouped
 
-def parse_filename(fname):
-    m = re.match(r"../../results/results_(.+?)_(.+?)_python(\d+\.\d+)\.csv$", fname)
-    return m.groups() if m else None
 
+def box_stats(acc, label):
+    """bxp() statistics from a StreamingSummary, whiskers clipped at 1.5 IQR."""
+    q1, med, q3 = acc.quantile([0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    return {
+        'label': label, 'med': med, 'q1': q1, 'q3': q3,
+        'whislo': max(acc.min, q1 - 1.5 * iqr),
+        'whishi': min(acc.max, q3 + 1.5 * iqr),
+    }
 
-def main():
-    parser = argparse.ArgumentParser(description='Generate box plot of energy consumption.')
-    parser.add_argument('group', choices=['os', 'python', 'rpi'],
-                        help='Grouping for boxplot: os, python, or rpi')
-    args = parser.parse_args()
-    group = args.group
 
-    files = glob.glob("../../results/results_*_python*.csv")
-    if not files:
-        print("No benchmark CSV files found.")
-        return
+ALLOWED_OS = {'Alpine', 'Ubuntu', 'FreeBSD', 'Manjaro'}
 
-    allowed_os = {'Alpine', 'Ubuntu', 'FreeBSD', 'Manjaro'}
-    values = {}
-
-    for path in files:
-        parsed = parse_filename(path)
-        if not parsed:
-            continue
-        rpi_model, os_name, pyver = parsed
-        if os_name not in allowed_os:
-            continue
-        df = pd.read_csv(path)
-        series = df.iloc[:, -1].dropna().tolist()
-
-        if group == 'os':
-            key = os_name
-        elif group == 'python':
-            key = pyver
-        elif group == 'rpi':
-            key = rpi_model
-        else:
-            continue
+XLABELS = {
+    'os': "Operating system",
+    'python': "Python version",
+    'rpi': "Raspberry Pi",
+    'variant': "Build variant",
+    'throttled': "Throttled during the run"
+}
 
-        values.setdefault(key, []).extend(series)
 
-    if not values:
-        print("No data found for the specified grouping.")
-        return
+def boxplot_slice(data, group):
+    """The rows and columns of the results a boxplot by group depends on."""
+    data = data[data['os'].isin(ALLOWED_OS)].dropna(subset=['Energy consumption'])
+    return data[[group, 'Energy consumption']].reset_index(drop=True)
+
+
+def collect_values(data, group, streaming_threshold=STREAMING_THRESHOLD):
+    """Energy values (or streaming accumulators) per group key."""
+    streaming = len(data) > streaming_threshold
+    if streaming:
+        grouped = data.groupby(group)
+        accs = summarize_grouped(grouped.ngroup().to_numpy(),
+                                 data['Energy consumption'].to_numpy(), grouped.ngroups)
+        values = dict(zip(grouped.groups, accs))
+    else:
+        values = {key: grp['Energy consumption'].tolist() for key, grp in data.groupby(group)}
+    return values, streaming
+
 
-    keys = sorted(values.keys(), key=lambda k: float(k) if group == 'python' else k)
+def plot_boxplot(values, group, streaming, outfn):
+    if group == 'python':
+        keys = sorted(values.keys(), key=float)
+    elif group == 'variant':
+        keys = sorted(values.keys(), key=lambda k: (k != DEFAULT_VARIANT, k))
+    else:
+        keys = sorted(values.keys())
     if group == 'python' and '3.9' in keys:
         keys.remove('3.9')
         keys = ['3.9'] + keys
@@ -90,14 +110,13 @@ def main():
     else:
         labels = [f"py{k}" if group == 'python' else k for k in keys]
 
-    xlabels = {
-        'os': "Operating system",
-        'python': "Python version",
-        'rpi': "Raspberry Pi"
-    }
-
     fig, ax = plt.subplots(figsize=(9, 5))
-    bp = ax.boxplot(data, labels=labels, widths=0.4, patch_artist=True, showfliers=False)
+    if streaming:
+        bp = ax.bxp([box_stats(acc, label) for acc, label in zip(data, labels)],
+                    widths=0.4, patch_artist=True, showfliers=False)
+    else:
+        bp = ax.boxplot(data, widths=0.4, patch_artist=True, showfliers=False)
+        ax.set_xticks(range(1, len(labels) + 1), labels)
 
     for box in bp['boxes']:
         box.set(facecolor='white', edgecolor='black', linewidth=1.5)
@@ -105,19 +124,68 @@ def main():
     ax.grid(True, axis='y', linestyle='--', linewidth=0.5, color='grey', alpha=0.6)
 
     for i, vals in enumerate(data, start=1):
-        mean_val = np.mean(vals)
-        offset = (max(vals) - min(vals)) * 0.040
+        if streaming:
+            mean_val, lo, hi = vals.mean, vals.min, vals.max
+        else:
+            mean_val, lo, hi = np.mean(vals), min(vals), max(vals)
+        offset = (hi - lo) * 0.040
         ax.text(i, mean_val + offset, f"μ={mean_val:.2f}",
                 ha='center', va='bottom', fontsize='small', color='blue',
                 bbox=dict(facecolor='white', edgecolor='black', boxstyle='round,pad=0.2'))
 
-    ax.set_xlabel(xlabels[group])
+    ax.set_xlabel(XLABELS[group])
     ax.set_ylabel('Energy consumption (J)')
-    ax.set_title(f"Energy consumption by {xlabels[group]}")
+    ax.set_title(f"Energy consumption by {XLABELS[group]}")
     plt.tight_layout()
 
-    outfn = f"./figures/energy_boxplot_by_{group}.png"
     fig.savefig(outfn, dpi=150)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate box plot of energy consumption.')
+    parser.add_argument('group', choices=['os', 'python', 'rpi', 'variant', 'throttled'],
+                        help='Grouping for boxplot: os, python, rpi, variant, or throttled (needs telemetry)')
+    parser.add_argument('--throttled', choices=['yes', 'no'],
+                        help='Only runs that were (or were not) throttled, according to their telemetry')
+    parser.add_argument('--quarantined', choices=['yes', 'no', 'all'],
+                        help='Runs quarantined as anomalous: left out (no, the default), only those, or all')
+    parser.add_argument('--variant',
+                        help='Build variant to plot, e.g. jit, or all (default: the default build, '
+                             'or all when grouping by variant)')
+    parser.add_argument('--python', help='Only this Python version, e.g. 3.13')
+    parser.add_argument('--streaming-threshold', type=int, default=STREAMING_THRESHOLD,
+                        help='Rows above which boxes are drawn from streaming quantile sketches')
+    args = parser.parse_args()
+    group = args.group
+    if (group == 'throttled' or args.throttled or args.quarantined) and not db_path():
+        parser.error(f"throttling and quarantine come from the results database, "
+                     f"{os.path.join(RESULTS_DIR, DB_NAME)} does not exist")
+
+    where = {k: v for k, v in (('throttled', args.throttled), ('quarantined', args.quarantined),
+                                ('variant', args.variant), ('python', args.python)) if v}
+    if group == 'variant':
+        where.setdefault('variant', 'all')
+    where = where or None
+    if group == 'throttled' or args.throttled:
+        data = load_results(where=where, telemetry=True)
+    else:
+        data = load_results(where=where)
+    if data.empty:
+        print("No benchmark CSV files found.")
+        return
+
+    values, streaming = collect_values(boxplot_slice(data, group), group, args.streaming_threshold)
+    if not values:
+        print("No data found for the specified grouping.")
+        return
+
+    suffix = f"_throttled_{args.throttled}" if args.throttled else ""
+    suffix += f"_quarantined_{args.quarantined}" if args.quarantined else ""
+    suffix += f"_variant_{args.variant}" if args.variant else ""
+    suffix += f"_python_{args.python}" if args.python else ""
+    outfn = f"./figures/energy_boxplot_by_{group}{suffix}.png"
+    plot_boxplot(values, group, streaming, outfn)
     print(f"Saved box plot to {outfn}")
 
 
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Energy flame graphs of the profiled benchmark runs, and the profiler's overhead.
+
+experiment/run_benchmarks.py --profile measures runs under the sampling
+profiler and stores, per profiled run, the energy of every benchmark and
+folded stack ("module:function" frames, root first, joined by ';') in the
+profile table of the results database (experiment/energy_profile.py). For
+one board, OS and Python version (3.13-jit for a build variant) this script
+averages that energy over the profiled runs and:
+
+    - prints the functions and modules with the most self energy, the energy
+      of the samples in which they were the innermost frame
+    - draws an energy flame graph per benchmark, widths in joules:
+      ./figures/energy_flamegraph_<rpi>_<os>_<python>_<benchmark>.png
+    - writes the stacks in the folded format of flamegraph.pl and speedscope,
+      with the energy in µJ as the count:
+      ./figures/energy_flamegraph_<rpi>_<os>_<python>_<benchmark>.folded
+
+With --base the flame graphs are differential: widths are the energy under
+--python, and each frame is coloured by how much more (red) or less (blue)
+energy it and its callees used than under the --base version.
+
+--overhead compares every profiled run with the unprofiled reference run
+measured just before it: the extra energy and time of the whole run, and
+the CPU time of the sampler threads.
+
+Usage:
+    python3 energy_flamegraph.py --rpi RPi4B --os ubuntu --python 3.13 [--benchmark 2to3] [--top 15]
+    python3 energy_flamegraph.py --rpi RPi4B --os ubuntu --python 3.13 --base 3.12
+    python3 energy_flamegraph.py --overhead
+"""
+
+import argparse
+import os
+import sqlite3
+import zlib
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from results_index import DEFAULT_VARIANT, db_path
+from results_loader import RESULTS_DIR
+
+FIGURES_DIR = "./figures"
+# Frames narrower than this share of the graph are not labelled
+LABEL_SHARE = 0.03
+NO_SAMPLES = "[no samples]"
+
+
+def python_label(df):
+    return df['python'] + ('-' + df['variant']).where(df['variant'] != DEFAULT_VARIANT, '')
+
+
+def _has_profile(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'profile'").fetchone()
+
+
+def load_profile(path, rpi=None, os_name=None, python=None):
+    """Energy per benchmark and stack of every profiled run, with the variant folded into the python label."""
+    conn = sqlite3.connect(path)
+    try:
+        if not _has_profile(conn):
+            return pd.DataFrame()
+        df = pd.read_sql_query(
+            "SELECT r.id AS profiled_run_id, r.rpi, r.os, r.python, r.variant, p.benchmark, p.stack, "
+            "p.samples, p.cpu, p.energy FROM profile p JOIN profiled_runs r ON r.id = p.profiled_run_id", conn)
+    finally:
+        conn.close()
+    df['python'] = python_label(df)
+    for column, value in (('rpi', rpi), ('os', os_name), ('python', python)):
+        if value:
+            df = df[df[column] == value]
+    return df.drop(columns='variant')
+
+
+def mean_stacks(df):
+    """Mean energy (J) per benchmark and stack over the profiled runs; stacks a run lacks count as 0 J."""
+    runs = df['profiled_run_id'].nunique()
+    return (df.groupby(['benchmark', 'stack'])['energy'].sum() / runs).rename('energy')
+
+
+def self_energy(stacks, by='function'):
+    """Energy per innermost frame (by='function') or its module (by='module'), largest first."""
+    frames = stacks.reset_index()
+    frames = frames[frames['stack'] != NO_SAMPLES]
+    leaf = frames['stack'].str.rsplit(';', n=1).str[-1]
+    frames[by] = leaf.str.split(':', n=1).str[0] if by == 'module' else leaf
+    table = frames.groupby(by)['energy'].sum().sort_values(ascending=False).to_frame()
+    table['share'] = table['energy'] / stacks.sum()
+    return table
+
+
+def build_tree(stacks):
+    """Nested {frame: [inclusive energy, children]} of folded stacks."""
+    root = [0.0, {}]
+    for stack, energy in stacks.items():
+        node = root
+        node[0] += energy
+        for frame in stack.split(';'):
+            node = node[1].setdefault(frame, [0.0, {}])
+            node[0] += energy
+    return root
+
+
+def _lookup(tree, path):
+    node = tree
+    for frame in path:
+        node = node[1].get(frame)
+        if node is None:
+            return 0.0
+    return node[0]
+
+
+def plot_flamegraph(stacks, title, outfn, base=None):
+    """Draw the flame graph of {stack: energy}; with base stacks, colour frames by their energy difference."""
+    tree = build_tree(stacks)
+    base_tree = build_tree(base) if base is not None else None
+    total = tree[0]
+    boxes = []
+
+    def walk(node, path, x, depth):
+        for frame, child in sorted(node[1].items()):
+            boxes.append((x, depth, child[0], frame, path + (frame,)))
+            walk(child, path + (frame,), x, depth + 1)
+            x += child[0]
+
+    walk(tree, (), 0.0, 0)
+    if not boxes:
+        return
+    if base_tree is not None:
+        deltas = [energy - _lookup(base_tree, path) for _, _, energy, _, path in boxes]
+        scale = max(abs(d) for d in deltas) or 1.0
+        cmap = plt.get_cmap('coolwarm')
+        colors = [cmap(0.5 + 0.5 * d / scale) for d in deltas]
+    else:
+        cmap = plt.get_cmap('autumn')
+        colors = [cmap((zlib.crc32(frame.encode()) % 1000) / 1000 * 0.6 + 0.2) for _, _, _, frame, _ in boxes]
+
+    depth = max(d for _, d, _, _, _ in boxes) + 1
+    fig, ax = plt.subplots(figsize=(14, max(3, 0.28 * depth + 1.5)))
+    for (x, d, width, frame, _), color in zip(boxes, colors):
+        ax.barh(d, width, left=x, height=0.9, color=color, edgecolor='white', linewidth=0.5)
+        if width >= LABEL_SHARE * total:
+            max_chars = int(width / total * 180)
+            label = frame if len(frame) <= max_chars else frame[:max(max_chars - 2, 1)] + '..'
+            ax.text(x + width * 0.01, d, label, va='center', ha='left', fontsize='x-small', clip_on=True)
+    ax.set_xlim(0, total)
+    ax.set_ylim(-0.5, depth - 0.5)
+    ax.set_yticks([])
+    ax.set_xlabel('Energy (J)')
+    ax.set_title(title)
+    if base_tree is not None:
+        fig.colorbar(plt.cm.ScalarMappable(cmap=cmap, norm=plt.Normalize(-scale, scale)), ax=ax,
+                     label='Energy difference to the base (J)', pad=0.01)
+    plt.tight_layout()
+    fig.savefig(outfn, dpi=150)
+    plt.close(fig)
+
+
+def write_folded(stacks, outfn):
+    """Folded stacks with the energy in µJ, for flamegraph.pl or speedscope."""
+    with open(outfn, 'w') as f:
+        for stack, energy in stacks.items():
+            microjoules = int(round(energy * 1e6))
+            if microjoules > 0:
+                f.write(f"{stack} {microjoules}\n")
+
+
+def profiler_overhead(path):
+    """Energy, duration and sampler CPU time of every profiled run against its unprofiled reference run."""
+    conn = sqlite3.connect(path)
+    try:
+        if not _has_profile(conn):
+            return pd.DataFrame()
+        df = pd.read_sql_query(
+            "SELECT p.id AS profiled_run_id, p.rpi, p.os, p.python, p.variant, p.interval, p.samples, "
+            "p.processes, p.sampler_cpu, p.duration, p.energy, r.duration AS reference_duration, "
+            "r.energy AS reference_energy FROM profiled_runs p JOIN runs r ON r.id = p.reference_run_id", conn)
+    finally:
+        conn.close()
+    df['python'] = python_label(df)
+    df['energy_overhead'] = (df['energy'] / df['reference_energy'] - 1) * 100
+    df['duration_overhead'] = (df['duration'] / df['reference_duration'] - 1) * 100
+    df['sampler_cpu_share'] = df['sampler_cpu'] / df['duration'] * 100
+    return df.drop(columns='variant').set_index(['rpi', 'os', 'python', 'profiled_run_id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Energy flame graphs of the profiled benchmark runs')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    parser.add_argument('--rpi', help='Board, e.g. RPi4B')
+    parser.add_argument('--os', help='OS, e.g. ubuntu')
+    parser.add_argument('--python', help='Python version, e.g. 3.13 or 3.13-jit')
+    parser.add_argument('--base', help='Python version to diff against, e.g. 3.12')
+    parser.add_argument('--benchmark', help='Only this benchmark')
+    parser.add_argument('--top', type=int, default=15, help='Functions and modules to list')
+    parser.add_argument('--overhead', action='store_true',
+                        help='Report the overhead of the profiled runs against their reference runs instead')
+    args = parser.parse_args()
+
+    path = db_path(args.results_dir)
+    if args.overhead:
+        overhead = profiler_overhead(path) if path else pd.DataFrame()
+        if overhead.empty:
+            print(f"No profiled runs with a reference run in {args.results_dir}")
+            return
+        print(overhead.round(3).to_string())
+        print("\nMean overhead (%):")
+        print(overhead.groupby(['rpi', 'os', 'python'])[['energy_overhead', 'duration_overhead',
+                                                         'sampler_cpu_share']].mean().round(2).to_string())
+        return
+
+    if not (args.rpi and args.os and args.python):
+        parser.error("--rpi, --os and --python are required for the flame graphs")
+    df = load_profile(path, args.rpi, args.os, args.python) if path else pd.DataFrame()
+    if args.benchmark and not df.empty:
+        df = df[df['benchmark'] == args.benchmark]
+    if df.empty:
+        print(f"No profiled runs of {args.rpi} {args.os} {args.python} in {args.results_dir}")
+        return
+    stacks = mean_stacks(df)
+    base = None
+    if args.base:
+        base_df = load_profile(path, args.rpi, args.os, args.base)
+        if base_df.empty:
+            print(f"No profiled runs of {args.rpi} {args.os} {args.base} to diff against")
+            return
+        base = mean_stacks(base_df)
+
+    print(f"{df['profiled_run_id'].nunique()} profiled runs, {stacks.sum():.3f} J on average")
+    for by in ('function', 'module'):
+        print(f"\nSelf energy by {by}:")
+        print(self_energy(stacks, by).head(args.top).round(4).to_string())
+
+    os.makedirs(FIGURES_DIR, exist_ok=True)
+    for benchmark, group in stacks.groupby(level='benchmark'):
+        group = group.droplevel('benchmark')
+        name = f"energy_flamegraph_{args.rpi}_{args.os}_{args.python}_{benchmark}"
+        title = f"{benchmark} on {args.rpi} {args.os}, Python {args.python}"
+        base_group = None
+        if base is not None:
+            base_group = base[base.index.get_level_values('benchmark') == benchmark].droplevel('benchmark')
+            name += f"_vs_{args.base}"
+            title += f" vs {args.base}"
+        write_folded(group, os.path.join(FIGURES_DIR, name + ".folded"))
+        outfn = os.path.join(FIGURES_DIR, name + ".png")
+        plot_flamegraph(group, title, outfn, base_group)
+        print(f"Wrote {outfn}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Build every figure of the analysis in one run.
+
+The results are loaded once and every figure is rendered from its own slice of
+that in-memory dataset:
+    - energy_boxplot_by_os.png, energy_boxplot_by_python.png,
+      energy_boxplot_by_rpi.png    (boxplot.py)
+    - consumption_barplot_all_pis.png    (multi_barplot.py)
+
+Each figure's input slice is hashed together with the source of the module
+that draws it. Figures whose hash matches the one recorded at the last build
+(and whose PNG still exists) are skipped; the rest are rendered in parallel
+worker processes with the headless Agg backend.
+
+Usage:
+    python3 figures.py [--force] [--workers N]
+
+Output:
+    - PNG images in ./figures/
+    - Input hashes in ./figures/.input_hashes.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pandas as pd
+
+import boxplot
+import multi_barplot
+from results_loader import load_results
+from streaming_stats import STREAMING_THRESHOLD
+
+FIGURES_DIR = "./figures"
+HASHES_FILE = os.path.join(FIGURES_DIR, ".input_hashes.json")
+
+
+def figure_jobs(data):
+    """(output file, renderer, input slice) for every figure."""
+    jobs = []
+    for group in ['os', 'python', 'rpi']:
+        jobs.append((os.path.join(FIGURES_DIR, f"energy_boxplot_by_{group}.png"),
+                     ('boxplot', group), boxplot.boxplot_slice(data, group)))
+    jobs.append((os.path.join(FIGURES_DIR, "consumption_barplot_all_pis.png"),
+                 ('barplot',), multi_barplot.compute_avg_consumption(data)))
+    return jobs
+
+
+def input_hash(renderer, frame):
+    module = boxplot if renderer[0] == 'boxplot' else multi_barplot
+    h = hashlib.sha256()
+    h.update(repr(renderer).encode())
+    with open(module.__file__, 'rb') as f:
+        h.update(f.read())
+    h.update(repr(list(frame.columns)).encode())
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def render(outfn, renderer, frame, streaming_threshold=STREAMING_THRESHOLD):
+    if renderer[0] == 'boxplot':
+        group = renderer[1]
+        values, streaming = boxplot.collect_values(frame, group, streaming_threshold)
+        boxplot.plot_boxplot(values, group, streaming, outfn)
+    else:
+        multi_barplot.plot_barplot(frame, outfn)
+    return outfn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render all figures, skipping those whose input is unchanged')
+    parser.add_argument('--force', action='store_true', help='Render every figure')
+    parser.add_argument('--workers', type=int, default=None, help='Rendering worker processes')
+    args = parser.parse_args()
+
+    data = load_results()
+    if data.empty:
+        print("No benchmark CSV files found.")
+        return
+
+    try:
+        with open(HASHES_FILE) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    hashes = dict(previous)
+    todo = []
+    for outfn, renderer, frame in figure_jobs(data):
+        name = os.path.basename(outfn)
+        digest = input_hash(renderer, frame)
+        if not args.force and previous.get(name) == digest and os.path.exists(outfn):
+            print(f"Up to date: {outfn}")
+            continue
+        todo.append((name, digest, (outfn, renderer, frame)))
+
+    os.makedirs(FIGURES_DIR, exist_ok=True)
+    try:
+        if todo:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                futures = [(name, digest, pool.submit(render, *job)) for name, digest, job in todo]
+                for name, digest, future in futures:
+                    print(f"Saved {future.result()}")
+                    # Only record the hash once the figure was actually written
+                    hashes[name] = digest
+    finally:
+        with open(HASHES_FILE, 'w') as f:
+            json.dump(hashes, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Report the CPU governor and frequency sweep: energy, delay and the optimal operating points.
+
+experiment/frequency_sweep.py stores one row per benchmark run in the
+frequency_runs table of the results database. For every board, OS, Python
+version (with its build variant) and benchmark set, this script prints per
+operating point (a governor, or a fixed frequency in MHz):
+
+    runs        measured runs
+    energy      mean energy of the workload window (J)
+    duration    mean duration of the workload window (s)
+    power       mean power (W)
+    edp         mean energy-delay product, energy x duration (J s)
+    ed2p        mean energy x duration squared (J s²)
+    freq_mean   mean CPU frequency sampled during the runs (MHz)
+    throttled   runs during which the Pi throttled
+
+followed by the energy-optimal, EDP-optimal and ED²P-optimal operating point
+of every board, OS and Python version. EDP weighs energy and speed equally;
+ED²P favours speed.
+
+Usage:
+    python3 frequency_report.py [--results-dir ../../results] [--exclude-throttled] [--out frequency_summary.csv]
+"""
+
+import argparse
+import sqlite3
+
+import pandas as pd
+
+from results_index import DEFAULT_VARIANT, db_path
+from results_loader import RESULTS_DIR
+
+GROUP_COLUMNS = ['rpi', 'os', 'python', 'benchmarks']
+METRICS = {'energy': 'energy', 'edp': 'EDP', 'ed2p': 'ED²P'}
+
+
+def load_frequency_runs(path):
+    """Every run of the frequency_runs table, with the variant folded into the python label."""
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'frequency_runs'").fetchone():
+            return pd.DataFrame()
+        df = pd.read_sql_query(
+            "SELECT rpi, os, python, variant, benchmarks, governor, frequency, iteration, average, duration, "
+            "energy, freq_mean, throttled FROM frequency_runs", conn)
+    finally:
+        conn.close()
+    df['python'] = df['python'] + ('-' + df['variant']).where(df['variant'] != DEFAULT_VARIANT, '')
+    df['benchmarks'] = df['benchmarks'].fillna('default')
+    df['point'] = df['governor'].where(df['frequency'].isna(),
+                                       df['frequency'].astype('Int64').astype(str) + ' MHz')
+    return df.drop(columns='variant')
+
+
+def frequency_summary(df):
+    """Mean energy, duration, power, EDP and ED²P per group and operating point."""
+    df = df.assign(edp=df['energy'] * df['duration'], ed2p=df['energy'] * df['duration'] ** 2,
+                   throttled=df['throttled'].fillna(0) > 0)
+    summary = df.groupby(GROUP_COLUMNS + ['point']).agg(
+        runs=('energy', 'size'),
+        energy=('energy', 'mean'),
+        duration=('duration', 'mean'),
+        power=('average', 'mean'),
+        edp=('edp', 'mean'),
+        ed2p=('ed2p', 'mean'),
+        freq_mean=('freq_mean', 'mean'),
+        throttled=('throttled', 'sum'),
+        frequency=('frequency', 'first'),
+    )
+    # Fixed frequencies in ascending order, then the governors
+    return (summary.sort_values(GROUP_COLUMNS + ['frequency'], na_position='last')
+            .drop(columns='frequency'))
+
+
+def optimal_points(summary):
+    """The operating point minimizing energy, EDP and ED²P of every group."""
+    return pd.DataFrame({f'{label} optimal': summary[metric].groupby(GROUP_COLUMNS).idxmin().str[-1]
+                         for metric, label in METRICS.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the CPU frequency sweep of frequency_sweep.py')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    parser.add_argument('--exclude-throttled', action='store_true',
+                        help='Leave out runs during which the Pi throttled')
+    parser.add_argument('--out', help='Also write the summary to this CSV file')
+    args = parser.parse_args()
+
+    path = db_path(args.results_dir)
+    df = load_frequency_runs(path) if path else pd.DataFrame()
+    if not df.empty and args.exclude_throttled:
+        df = df[~(df['throttled'].fillna(0) > 0)]
+    if df.empty:
+        print(f"No frequency sweep runs in {args.results_dir}")
+        return
+
+    summary = frequency_summary(df)
+    print(summary.round(5).to_string())
+    print("\nOptimal operating points:")
+    print(optimal_points(summary).to_string())
+    if args.out:
+        summary.to_csv(args.out)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()
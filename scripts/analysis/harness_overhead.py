@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Report how much energy the measurement harness adds to each job.
+
+orchestrator.py logs, per job, the energy of the whole request window and of
+the workload alone to harness_overhead.csv. Over SSH the results include the
+SSH channel set-up and shell start-up; with the on-board agent they include
+only the workload. This script prints the mean overhead per board, OS and
+transport, and the overhead saved by the agent where both were measured.
+With a results database it also reports the CPU time the telemetry sampler
+(experiment/telemetry.py) used on each board, per run and as a share of one
+core.
+
+Usage:
+    python3 harness_overhead.py [--results-dir ../../results]
+"""
+
+import argparse
+import os
+import sqlite3
+
+import pandas as pd
+
+from results_index import db_path
+from results_loader import RESULTS_DIR
+
+HARNESS_FILE = "harness_overhead.csv"
+
+
+def overhead_summary(df):
+    """Mean window, workload and overhead energy per (RPi, OS, Transport)."""
+    summary = df.groupby(['RPi', 'OS', 'Transport']).agg(
+        jobs=('Overhead energy', 'size'),
+        window_energy=('Window energy', 'mean'),
+        workload_energy=('Workload energy', 'mean'),
+        overhead_energy=('Overhead energy', 'mean'),
+        overhead_duration=('Window duration', 'mean'),
+    )
+    summary['overhead_duration'] -= df.groupby(['RPi', 'OS', 'Transport'])['Workload duration'].mean()
+    summary['overhead_pct'] = 100 * summary['overhead_energy'] / summary['window_energy']
+    return summary
+
+
+def sampler_cost(path):
+    """Mean CPU seconds and share of one core the telemetry sampler used per run, per (RPi, OS)."""
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(
+            "SELECT r.rpi AS RPi, r.os AS OS, COUNT(*) AS runs, AVG(t.sampler_cpu) AS cpu_seconds, "
+            "100 * SUM(t.sampler_cpu) / SUM(t.sampler_wall) AS core_pct, AVG(t.interval) AS interval "
+            "FROM run_telemetry t JOIN runs r ON r.id = t.run_id GROUP BY r.rpi, r.os", conn
+        ).set_index(['RPi', 'OS'])
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the harness overhead logged by orchestrator.py')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding harness_overhead.csv')
+    args = parser.parse_args()
+
+    harness_file = os.path.join(args.results_dir, HARNESS_FILE)
+    if os.path.isfile(harness_file):
+        summary = overhead_summary(pd.read_csv(harness_file))
+        print(summary.round(5).to_string())
+
+        energy = summary['overhead_energy'].unstack('Transport')
+        if {'ssh', 'agent'} <= set(energy.columns):
+            saved = (energy['ssh'] - energy['agent']).dropna()
+            print("\nOverhead energy saved per job by the agent (J):")
+            print(saved.round(5).to_string())
+    else:
+        print(f"No {harness_file}")
+
+    path = db_path(args.results_dir)
+    if path:
+        cost = sampler_cost(path)
+        if not cost.empty:
+            print("\nTelemetry sampler cost per run:")
+            print(cost.round(5).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -8,56 +8,179 @@ This script performs a Kruskal-Wallis test followed by pairwise Mann-Whitney U t
     --factor python   Compare across Python versions
     --factor os       Compare across operating systems
     --factor rpi      Compare across Raspberry Pi models
+    --factor variant  Compare across interpreter build variants (JIT,
+                      free-threaded, non-PGO; see experiment/matrix.py)
+
+Optionally, --bootstrap N adds percentile bootstrap confidence intervals for the
+mean and median of every group, and --permutations N adds permutation-based
+(or exact, for small groups) p-values for the pairwise comparisons
+(see resampling.py).
+
+Batch mode (--batch) loads the data once, ranks it once and derives the
+Kruskal-Wallis and all pairwise U tests (with effect sizes) for every factor and
+every --within subset from the shared ranking (see rank_tests.py). With
+--interactions it adds an aligned-rank-transform ANOVA over the factors. The
+results are written as one JSON report, or as CSV tables.
 
 Usage:
-    python3 kruskal_test.py --factor <python|os|rpi>
+    python3 kruskal_test.py --factor <python|os|rpi|variant> [--bootstrap N] [--permutations N]
+    python3 kruskal_test.py --batch --within rpi os=Alpine --interactions --output report.json
+    python3 kruskal_test.py --factor python --throttled no
+    python3 kruskal_test.py --factor python --quarantined all
+    python3 kruskal_test.py --factor variant --python 3.13
+    python3 kruskal_test.py --batch --factors python os variant --within variant
+
+--throttled restricts the tests to runs whose telemetry shows (or does not
+show) throttling. Runs quarantined as anomalous during the experiment are
+left out; --quarantined all includes them and --quarantined yes tests them
+alone. Both need the results database.
+
+Only the default build is tested unless --variant names another build
+variant or 'all'; grouping by variant (--factor variant, or variant among
+--factors or --within) loads every variant. The JIT and free-threaded builds
+exist for Python 3.13 and later only, so --python 3.13 keeps the variant
+comparison within one version.
 
 Input:
-    - CSV files named as: results_<rpi>_<os>_python<version>.csv
+    - CSV files named as: results_<rpi>_<os>_python<version>[-<variant>].csv
     - Located in ../../results/
 
 Output:
     - Statistical test results printed to stdout
+    - Batch mode: kruskal_report.json (or <name>_kruskal/_pairwise/_art.csv)
 """
 
-import glob
-import os
-import re
 import argparse
+import json
+import os
 
 import numpy as np
 import pandas as pd
 from scipy.stats import kruskal, mannwhitneyu, rankdata
 from statsmodels.stats.multitest import multipletests
 
+from rank_tests import SharedRanks, aligned_rank_anova, factor_tests
+from resampling import DEFAULT_SEED, bootstrap_stats, percentile_ci, permutation_test
+from results_loader import load_results
+
+
+FACTORS = ['python', 'os', 'rpi', 'variant']
+DEFAULT_FACTORS = ['python', 'os', 'rpi']
+
+
+def _run_filter(args, factors=()):
+    where = {k: v for k, v in (('throttled', args.throttled), ('quarantined', args.quarantined),
+                                ('variant', args.variant), ('python', args.python)) if v}
+    if 'variant' in factors:
+        where.setdefault('variant', 'all')
+    return where or None
 
-def parse_filename(fname):
-    m = re.match(r"../../results/results_(.+?)_(.+?)_python(\d+\.\d+)\.csv$", fname)
-    return m.groups() if m else None
+
+def parse_subsets(specs, data):
+    """Expand --within specs (FACTOR or FACTOR=LEVEL) into (label, factor, mask) subsets."""
+    subsets = [('all', None, None)]
+    for spec in specs:
+        factor, _, level = spec.partition('=')
+        if factor not in FACTORS:
+            raise ValueError(f"Unknown factor '{factor}' in --within {spec}")
+        levels = [level] if level else sorted(data[factor].unique())
+        for lvl in levels:
+            mask = (data[factor] == lvl).to_numpy()
+            if not mask.any():
+                raise ValueError(f"No data for {factor}={lvl}")
+            subsets.append((f"{factor}={lvl}", factor, mask))
+    return subsets
+
+
+def run_batch(args):
+    factors = args.factors + [spec.partition('=')[0] for spec in args.within]
+    data = load_results(where=_run_filter(args, factors)).dropna(subset=['Energy consumption']).reset_index(drop=True)
+    if data.empty:
+        print("No data found")
+        return
+    shared = SharedRanks(data['Energy consumption'].to_numpy())
+
+    kruskal_rows = []
+    pairwise_rows = []
+    for subset, cond_factor, mask in parse_subsets(args.within, data):
+        for factor in args.factors:
+            if factor == cond_factor:
+                continue
+            levels = data[factor] if mask is None else data.loc[mask, factor]
+            if levels.nunique() < 2:
+                continue
+            kw, pairs = factor_tests(shared, data[factor].to_numpy(), mask)
+            kruskal_rows.append({'subset': subset, 'factor': factor, **kw})
+            reject, p_adj, _, _ = multipletests([pr['p'] for pr in pairs], method='bonferroni')
+            for pr, p1, rej in zip(pairs, p_adj, reject):
+                pairwise_rows.append({'subset': subset, 'factor': factor, **pr,
+                                      'p_adj': float(p1), 'significant': bool(rej)})
+
+    art = None
+    if args.interactions:
+        art = aligned_rank_anova(data, 'Energy consumption', args.factors)
+
+    if args.output.endswith('.json'):
+        report = {'kruskal': kruskal_rows, 'pairwise': pairwise_rows,
+                  'art_anova': art.to_dict('records') if art is not None else []}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=float)
+        print(f"Saved batch report to {args.output}")
+    else:
+        stem = os.path.splitext(args.output)[0]
+        kruskal_df = pd.DataFrame([{k: v for k, v in row.items() if k != 'groups'}
+                                   for row in kruskal_rows])
+        outputs = [(f"{stem}_kruskal.csv", kruskal_df),
+                   (f"{stem}_pairwise.csv", pd.DataFrame(pairwise_rows))]
+        if art is not None:
+            outputs.append((f"{stem}_art.csv", art))
+        for outfn, df in outputs:
+            df.to_csv(outfn, index=False)
+            print(f"Saved {outfn}")
 
 
 def main():
     parser = argparse.ArgumentParser(description='Kruskal-Wallis test for energy consumption data')
-    parser.add_argument('--factor', required=True,
-                        choices=['python', 'os', 'rpi'],
-                        help='Grouping factor: python, os, or rpi')
+    parser.add_argument('--factor',
+                        choices=FACTORS,
+                        help='Grouping factor: python, os, rpi or variant')
+    parser.add_argument('--batch', action='store_true',
+                        help='Test every factor and subset in one run and write a report')
+    parser.add_argument('--factors', nargs='+', choices=FACTORS, default=DEFAULT_FACTORS,
+                        help='Factors to test in batch mode')
+    parser.add_argument('--within', nargs='*', default=[], metavar='FACTOR[=LEVEL]',
+                        help='Batch mode: also test within each level (or the given level) of FACTOR')
+    parser.add_argument('--interactions', action='store_true',
+                        help='Batch mode: add an aligned-rank-transform ANOVA over --factors')
+    parser.add_argument('--output', default='kruskal_report.json',
+                        help='Batch report file (.json, or .csv for one CSV per table)')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help='Bootstrap confidence intervals for group means and medians from N resamples')
+    parser.add_argument('--permutations', type=int, default=0, metavar='N',
+                        help='Permutation p-values for the pairwise tests from N resamples')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Resampling seed')
+    parser.add_argument('--workers', type=int, default=None, help='Resampling worker processes')
+    parser.add_argument('--throttled', choices=['yes', 'no'],
+                        help='Only runs that were (or were not) throttled, according to their telemetry')
+    parser.add_argument('--quarantined', choices=['yes', 'no', 'all'],
+                        help='Runs quarantined as anomalous: left out (no, the default), only those, or all')
+    parser.add_argument('--variant',
+                        help='Build variant to test, e.g. jit, or all (default: the default build, '
+                             'or all when grouping by variant)')
+    parser.add_argument('--python', help='Only this Python version, e.g. 3.13')
     args = parser.parse_args()
+    if args.batch:
+        run_batch(args)
+        return
+    if not args.factor:
+        parser.error("--factor is required unless --batch is given")
     factor = args.factor
 
     # Collect data
-    records = []
-    for path in glob.glob("../../results/results_*_python*.csv"):
-        parsed = parse_filename(path)
-        if not parsed:
-            continue
-        pi, os_name, pyver = parsed
-        df = pd.read_csv(path)
-        values = df.iloc[:, -1]  # Energy consumption
-        label = {'python': pyver, 'os': os_name, 'rpi': pi}[factor]
-        for v in values.dropna():
-            records.append({'value': v, factor: label})
-
-    data = pd.DataFrame(records)
+    data = load_results(where=_run_filter(args, [factor]))[[factor, 'Energy consumption']]
+    data = data.rename(columns={'Energy consumption': 'value'})
+    data = data.dropna(subset=['value'])
     if data.empty:
         print(f"No data found for factor={factor}")
         return
@@ -96,6 +219,27 @@ def main():
         print(f"{n1} vs {n2}: U={u:.2f}, p_adj={p1:.4g}, significant={rej}, "
               f"mean_ranks=({n1}: {mr1:.2f}, {n2}: {mr2:.2f}), better={better}")
 
+    if args.permutations:
+        print(f"\n=== Pairwise Permutation Tests ({args.permutations} resamples, Bonferroni corrected) ===")
+        perm = []
+        for i in range(len(names)):
+            for j in range(i + 1, len(names)):
+                perm.append(permutation_test(groups[i], groups[j], args.permutations,
+                                             args.seed, args.workers))
+        reject, p_adj, _, _ = multipletests([p for p, _ in perm], method='bonferroni')
+        for (n1, n2, *_), (p0, exact), p1, rej in zip(comparisons, perm, p_adj, reject):
+            kind = 'exact' if exact else 'permutation'
+            print(f"{n1} vs {n2}: p_adj={p1:.4g} ({kind}), significant={rej}")
+
+    if args.bootstrap:
+        print(f"\n=== Bootstrap {args.confidence:.0%} Confidence Intervals ({args.bootstrap} resamples) ===")
+        for stat in ('mean', 'median'):
+            dist = bootstrap_stats(groups, stat, args.bootstrap, args.seed, args.workers)
+            lo, hi = percentile_ci(dist, args.confidence)
+            func = np.mean if stat == 'mean' else np.median
+            for name, vals, l, h in zip(names, groups, lo, hi):
+                print(f"{name}: {stat}={func(vals):.2f} J, CI=[{l:.2f}, {h:.2f}]")
+
 
 if __name__ == '__main__':
     main()
@@ -16,37 +16,20 @@ Output:
     - A PNG image saved as: ./figures/consumption_barplot_all_pis.png
 """
 
-import glob
-import os
-import re
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
 
+from results_loader import load_results
 
-def parse_filename(fname):
-    m = re.match(r"../../results/results_(.+?)_(.+?)_python(\d+\.\d+)\.csv$", fname)
-    return m.groups() if m else None
 
+def compute_avg_consumption(data):
+    """Mean energy consumption per (pi, distro, python) configuration."""
+    df = data.groupby(['rpi', 'os', 'python'], sort=False)['Energy consumption'].mean().reset_index()
+    return df.rename(columns={'rpi': 'pi', 'os': 'distro', 'Energy consumption': 'value'})
 
-def compute_avg_consumption(path):
-    df = pd.read_csv(path)
-    return df.iloc[:, -1].mean()  # Last column is energy consumption
-
-
-def main():
-    files = glob.glob("../../results/results_*_python*.csv")
-    records = []
-    for path in files:
-        parsed = parse_filename(path)
-        if not parsed:
-            continue
-        pi, distro, pyver = parsed
-        val = compute_avg_consumption(path)
-        records.append({'pi': pi, 'distro': distro, 'python': pyver, 'value': val})
-    df = pd.DataFrame(records)
 
+def plot_barplot(df, outfn):
     pis = sorted(df['pi'].unique())
     pythons = sorted(df['python'].unique(), key=lambda v: float(v))
     if '3.9' in pythons:
@@ -61,8 +44,12 @@ def main():
         'Manjaro': '#9900ff'
     }
 
+    # One row per (pi, python) bar group, one column per distro
+    table = df.pivot(index=['pi', 'python'], columns='distro', values='value')
+
     x_positions = []
     values = []
+    bar_distros = []
     x_groups = []
     current = 0
     gap = 1.0
@@ -71,14 +58,13 @@ def main():
     for pi in pis:
         for pv in pythons:
             distro_vals = []
-            for d in distros:
-                subset = df[(df['pi'] == pi) & (df['python'] == pv) & (df['distro'] == d)]
-                if not subset.empty:
-                    distro_vals.append((d, subset['value'].iloc[0]))
-            sorted_distros = [d for d, _ in sorted(distro_vals, key=lambda x: x[1], reverse=True)]
-            for d in sorted_distros:
+            if (pi, pv) in table.index:
+                row = table.loc[(pi, pv)]
+                distro_vals = [(d, row[d]) for d in distros if d in row.index and not np.isnan(row[d])]
+            for d, v in sorted(distro_vals, key=lambda x: x[1], reverse=True):
                 x_positions.append(current)
-                values.append(next(v for dd, v in distro_vals if dd == d))
+                values.append(v)
+                bar_distros.append(d)
                 x_groups.append((pi, pv))
                 current += 1
             current += 0.2
@@ -107,8 +93,7 @@ def main():
     dy = 0.2 * np.sin(angle_rad) * (ylim[1] / 10)
 
     for idx, xpos in enumerate(x_positions):
-        pi, pv = x_groups[idx]
-        d = df[(df['pi'] == pi) & (df['python'] == pv) & (df['value'] == values[idx])]['distro'].iloc[0]
+        d = bar_distros[idx]
         ax.bar(xpos, values[idx], width=width, color=colors[d], edgecolor='black')
         ax.annotate(f"{values[idx]:.2f}",
                     xy=(xpos + width / 2, values[idx]),
@@ -150,8 +135,14 @@ def main():
     ax.legend(handles=handles, title='OS', loc='upper center', bbox_to_anchor=(0.5, -0.2), ncol=4)
 
     plt.tight_layout()
-    outfn = "./figures/consumption_barplot_all_pis.png"
     fig.savefig(outfn, dpi=150)
+    plt.close(fig)
+
+
+def main():
+    df = compute_avg_consumption(load_results())
+    outfn = "./figures/consumption_barplot_all_pis.png"
+    plot_barplot(df, outfn)
     print(f"Saved combined bar plot to {outfn}")
 
 
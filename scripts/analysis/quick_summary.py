@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Print the cached summary statistics of the benchmark results.
+
+summary_stats_tables.py keeps the statistics (q₀–q₄, μ, σ) of every
+(pi, os, python, build variant) configuration in ../../results/.cache/summary_stats.json,
+each with the fingerprint of the results it was computed from. When every
+fingerprint still matches, this script prints the statistics straight from
+that file using only the standard library, so a quick query does not pay for
+importing numpy and pandas. Only when a configuration changed does it fall
+back to summary_stats_tables.py to recompute it (and refresh the cache).
+
+Usage:
+    python3 quick_summary.py
+    python3 quick_summary.py --rpi RPi4B --python 3.13 --metric consumption
+    python3 quick_summary.py --python 3.13 --variant all
+"""
+
+import argparse
+import json
+import os
+
+from results_index import CACHE_DIRNAME, DEFAULT_VARIANT, KEY_COLUMNS, RESULTS_DIR, source_fingerprints
+
+METRICS = ['duration', 'draw', 'consumption']
+STATS = ['q0', 'q1', 'q2', 'q3', 'q4', 'μ', 'σ']
+
+SUMMARY_CACHE = os.path.join(RESULTS_DIR, CACHE_DIRNAME, "summary_stats.json")
+SUMMARY_CACHE_VERSION = 2
+
+
+def load_summary_cache():
+    """Cached statistics per 'rpi|os|python|variant' label, or {} if missing or outdated."""
+    try:
+        with open(SUMMARY_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != SUMMARY_CACHE_VERSION:
+        return {}
+    return cache.get('groups', {})
+
+
+def fresh_summaries(variant=DEFAULT_VARIANT):
+    """{(rpi, os, python, variant): {metric: stats}} if the cache is up to date, else None."""
+    fingerprints = source_fingerprints(variant=variant)
+    cached = load_summary_cache()
+    summaries = {}
+    for key, fp in fingerprints.items():
+        entry = cached.get('|'.join(key))
+        if entry is None or entry['fingerprint'] != fp:
+            return None
+        summaries[key] = entry['stats']
+    return summaries
+
+
+def recomputed_summaries(variant=DEFAULT_VARIANT):
+    """Recompute the stale configurations with summary_stats_tables (imports pandas)."""
+    from summary_stats_tables import load_group_summaries
+
+    frame = load_group_summaries(variant=variant)
+    return {key: {m: [float(row[(m, stat)]) for stat in STATS] for m in METRICS}
+            for key, row in frame.iterrows()}
+
+
+def _version_key(python):
+    return tuple(int(p) if p.isdigit() else p for p in python.split('.'))
+
+
+def format_summaries(summaries, metrics=METRICS, filters=None):
+    filters = {k: v for k, v in (filters or {}).items() if v}
+    keys = [key for key in summaries
+            if all(key[KEY_COLUMNS.index(k)] == v for k, v in filters.items())]
+    keys.sort(key=lambda k: (k[0], _version_key(k[2]), k[3] != DEFAULT_VARIANT, k[3], k[1]))
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"{metric}")
+        lines.append(f"  {'rpi':<8} {'os':<10} {'python':<7} {'variant':<8} "
+                     + " ".join(f"{s:>11}" for s in STATS))
+        for key in keys:
+            values = " ".join(f"{v:>11.5g}" for v in summaries[key][metric])
+            lines.append(f"  {key[0]:<8} {key[1]:<10} {key[2]:<7} {key[3]:<8} {values}")
+        lines.append("")
+    if not keys:
+        lines = ["No configurations match"]
+    return "\n".join(lines).rstrip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print summary statistics, from the cache when it is fresh')
+    parser.add_argument('--rpi', help='Only this Pi model, e.g. RPi4B')
+    parser.add_argument('--os', help='Only this OS, e.g. Alpine')
+    parser.add_argument('--python', help='Only this Python version, e.g. 3.13')
+    parser.add_argument('--variant', default=DEFAULT_VARIANT,
+                        help='Only this build variant, e.g. jit, or all (default: the default build)')
+    parser.add_argument('--metric', choices=METRICS, help='Only this metric (default: all)')
+    args = parser.parse_args()
+
+    summaries = fresh_summaries(args.variant)
+    if summaries is None:
+        summaries = recomputed_summaries(args.variant)
+    metrics = [args.metric] if args.metric else METRICS
+    print(format_summaries(summaries, metrics, {'rpi': args.rpi, 'os': args.os, 'python': args.python}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Locations and fingerprints of the benchmark results, without heavy imports.
+
+Finding the results (CSV files or the results database) and deciding whether
+anything derived from them is stale only needs the standard library. Keeping
+that here lets quick commands such as 'pyenergy summary' answer from caches
+without importing numpy or pandas; results_loader.py builds on it.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+
+RESULTS_DIR = "../../results"
+RESULTS_PATTERN = "results_*_python*.csv"
+PHASES_PATTERN = "phases_*_python*.csv"
+CACHE_DIRNAME = ".cache"
+DB_NAME = "results.db"
+DEFAULT_VARIANT = "default"
+
+KEY_COLUMNS = ['rpi', 'os', 'python', 'variant']
+DB_FILTERS = ('rpi', 'os', 'python', 'variant', 'benchmarks', 'throttled', 'quarantined')
+# Runs whose telemetry shows throttling, under-voltage or a frequency cap at any point
+THROTTLED_RUN = "EXISTS (SELECT 1 FROM run_telemetry t WHERE t.run_id = {table}.id AND t.throttled > 0)"
+UNTHROTTLED_RUN = "EXISTS (SELECT 1 FROM run_telemetry t WHERE t.run_id = {table}.id AND t.throttled = 0)"
+# Runs flagged as anomalous by the orchestrators (experiment/anomaly.py)
+QUARANTINED_RUN = "{table}.id IN (SELECT run_id FROM quarantine)"
+ACCEPTED_RUN = "{table}.id NOT IN (SELECT run_id FROM quarantine)"
+
+
+def parse_filename(fname, prefix="results"):
+    """(rpi, os, python, variant) of a results file name (no -<variant> suffix: the default build)."""
+    m = re.match(prefix + r"_(.+?)_(.+?)_python(\d+\.\d+)(?:-(\w+))?\.csv$", os.path.basename(fname))
+    return m.groups(DEFAULT_VARIANT) if m else None
+
+
+def scan_sources(results_dir=RESULTS_DIR):
+    """Name, mtime, size and (rpi, os, python, variant) key of every results CSV file."""
+    sources = []
+    for path in sorted(glob.glob(os.path.join(results_dir, RESULTS_PATTERN))):
+        parsed = parse_filename(path)
+        if not parsed:
+            continue
+        st = os.stat(path)
+        sources.append({
+            'name': os.path.basename(path),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'key': list(parsed),
+        })
+    return sources
+
+
+def db_path(results_dir=RESULTS_DIR):
+    """Path of the results database, or None if the directory has none."""
+    path = os.path.join(results_dir, DB_NAME)
+    return path if os.path.isfile(path) else None
+
+
+def where_clause(where=None, table="r"):
+    """SQL condition and parameters selecting configurations of the runs table.
+
+    'throttled' selects runs by their telemetry: 'yes' for runs throttled at
+    some point, 'no' for runs with telemetry showing no throttling.
+    'quarantined' is 'no' (the default: runs flagged as anomalous are left
+    out), 'yes' (only those) or 'all'. 'variant' is the interpreter build
+    variant, DEFAULT_VARIANT unless given; 'all' selects every variant.
+    """
+    where = dict(where or {})
+    where.setdefault('variant', DEFAULT_VARIANT)
+    where.setdefault('quarantined', 'no')
+    if where['variant'] == 'all':
+        del where['variant']
+    unknown = set(where) - set(DB_FILTERS)
+    if unknown:
+        raise ValueError(f"Cannot filter on {sorted(unknown)}; use {DB_FILTERS}")
+    throttled = where.pop('throttled', None)
+    quarantined = where.pop('quarantined')
+    conditions = [f"{table}.{k} = ?" for k in where]
+    if throttled is not None:
+        if throttled not in ('yes', 'no'):
+            raise ValueError(f"throttled must be 'yes' or 'no', not {throttled!r}")
+        conditions.append((THROTTLED_RUN if throttled == 'yes' else UNTHROTTLED_RUN).format(table=table))
+    if quarantined not in ('yes', 'no', 'all'):
+        raise ValueError(f"quarantined must be 'yes', 'no' or 'all', not {quarantined!r}")
+    if quarantined != 'all':
+        conditions.append((QUARANTINED_RUN if quarantined == 'yes' else ACCEPTED_RUN).format(table=table))
+    return " AND ".join(conditions), list(where.values())
+
+
+def source_fingerprints(results_dir=RESULTS_DIR, variant=DEFAULT_VARIANT):
+    """Map each (rpi, os, python, variant) key to the mtime/size of its source CSV files.
+
+    Only stats the files, so it is cheap enough to decide whether anything
+    derived from a configuration has to be recomputed. With a results
+    database the fingerprint is the row count and last row id of the
+    configuration, from one indexed query. variant selects the build
+    variant as in where_clause.
+    """
+    path = db_path(results_dir)
+    if path:
+        clause, params = where_clause({'variant': variant})
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT r.rpi, r.os, r.python, r.variant, COUNT(*), MAX(r.id) FROM runs r "
+                                f"WHERE {clause} GROUP BY r.rpi, r.os, r.python, r.variant", params).fetchall()
+        finally:
+            conn.close()
+        return {tuple(row[:4]): f"{DB_NAME}:{row[4]}:{row[5]}" for row in rows}
+
+    fingerprints = {}
+    for s in scan_sources(results_dir):
+        if variant != 'all' and s['key'][3] != variant:
+            continue
+        fingerprints.setdefault(tuple(s['key']), []).append(
+            f"{s['name']}:{s['mtime_ns']}:{s['size']}")
+    return {key: "|".join(parts) for key, parts in fingerprints.items()}
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Shared loader for the Raspberry Pi benchmark results.
+
+This module reads every results CSV once and builds a single columnar dataset
+with one row per benchmark iteration:
+
+    rpi, os, python, variant, iteration, From, To, Offset, Sample rate,
+    Min, Max, Average, Duration, Energy consumption
+
+variant is the interpreter build variant (experiment/matrix.py). Only the
+default build is loaded unless where={'variant': ...} asks for another one,
+or 'all'; results files without a -<variant> suffix are the default build.
+
+The dataset is cached as memory-mapped .npy files (one per column) next to a
+JSON manifest recording the mtime and size of every source CSV. On the next
+load only CSV files whose mtime or size changed are parsed again; the rows of
+unchanged files are taken straight from the cache.
+
+When the results directory holds the results database written by the
+orchestrators (results.db, see experiment/results_db.py), the dataset is read
+from it with an indexed query instead, optionally restricted to some
+configurations, and the CSV files are not globbed at all:
+
+    data = load_results(where={'rpi': 'RPi4B', 'python': '3.13'})
+    data = load_results(where={'throttled': 'no'}, telemetry=True)
+
+Runs recorded with telemetry (experiment/telemetry.py) can be filtered or
+grouped by whether the Pi throttled during them. Runs the orchestrators
+quarantined as anomalous (experiment/anomaly.py) are left out unless
+where={'quarantined': 'yes'} or 'all' asks for them.
+
+Usage:
+    from results_loader import load_results
+    data = load_results()
+
+    python3 results_loader.py [--rebuild]
+
+Input:
+    - CSV files named: results_<rpi>_<os>_python<version>[-<variant>].csv
+    - Located in ../../results/
+
+Output:
+    - Cache written to ../../results/.cache/
+
+File discovery and source_fingerprints() live in results_index.py, which only
+needs the standard library.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from results_index import (CACHE_DIRNAME, DB_NAME, DEFAULT_VARIANT, KEY_COLUMNS, PHASES_PATTERN, RESULTS_DIR,
+                           db_path as _db_path, parse_filename, scan_sources as _scan,
+                           source_fingerprints, where_clause as _where)
+
+MANIFEST_NAME = "manifest.json"
+CACHE_VERSION = 2
+
+OTII_COLUMNS = [
+    "From", "To", "Offset", "Sample rate",
+    "Min", "Max", "Average", "Duration", "Energy consumption"
+]
+PHASE_COLUMNS = [
+    "Timestamp", "Benchmark", "Phase", "Windows", "Duration", "Average", "Energy consumption"
+]
+# Columns of the results database holding OTII_COLUMNS and PHASE_COLUMNS
+DB_COLUMNS = ["start", "end", "offset", "sample_rate", "min", "max", "average", "duration", "energy"]
+DB_PHASE_COLUMNS = ["r.timestamp", "p.benchmark", "p.phase", "p.windows", "p.duration", "p.average", "p.energy"]
+# Per-run telemetry summary (experiment/telemetry.py) added with telemetry=True
+TELEMETRY_COLUMNS = ["Max temperature", "Min frequency", "Mean frequency", "CPU busy"]
+DB_TELEMETRY_COLUMNS = ["rt.temp_max", "rt.freq_min", "rt.freq_mean", "rt.busy_mean"]
+THROTTLED_LABEL = ("CASE WHEN rt.throttled > 0 THEN 'yes' WHEN rt.throttled = 0 THEN 'no' "
+                   "ELSE 'unknown' END AS throttled")
+
+
+def _column_file(cache_dir, idx):
+    return os.path.join(cache_dir, f"col{idx}.npy")
+
+
+def _query(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def _read_csv(path):
+    df = pd.read_csv(path)
+    missing = [c for c in OTII_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {path}")
+    return {c: df[c].to_numpy(dtype=np.float64) for c in OTII_COLUMNS}
+
+
+def _load_cache(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if manifest.get('version') != CACHE_VERSION or manifest.get('columns') != OTII_COLUMNS:
+        return None, None
+    try:
+        arrays = [np.load(_column_file(cache_dir, i), mmap_mode='r')
+                  for i in range(len(OTII_COLUMNS))]
+    except (OSError, ValueError):
+        return None, None
+    return manifest, arrays
+
+
+def _write_cache(cache_dir, manifest, arrays):
+    os.makedirs(cache_dir, exist_ok=True)
+    for i, arr in enumerate(arrays):
+        tmp = _column_file(cache_dir, i) + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, arr)
+        os.replace(tmp, _column_file(cache_dir, i))
+    tmp = os.path.join(cache_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(cache_dir, MANIFEST_NAME))
+
+
+def _to_frame(manifest, arrays):
+    files = manifest['files']
+    lengths = np.array([f['stop'] - f['start'] for f in files], dtype=np.int64)
+    frame = {}
+    for k, name in enumerate(KEY_COLUMNS):
+        labels = np.array([f['key'][k] for f in files], dtype=object)
+        frame[name] = np.repeat(labels, lengths)
+    frame['iteration'] = np.concatenate(
+        [np.arange(n, dtype=np.int64) for n in lengths]) if len(files) else np.empty(0, np.int64)
+    for name, arr in zip(OTII_COLUMNS, arrays):
+        frame[name] = np.asarray(arr)
+    return pd.DataFrame(frame)
+
+
+def _load_db(db_path, where=None, telemetry=False):
+    clause, params = _where(where)
+    columns = ", ".join(f'r."{c}" AS "{name}"' for c, name in zip(DB_COLUMNS, OTII_COLUMNS))
+    joins = ""
+    if telemetry:
+        columns += ", " + ", ".join([THROTTLED_LABEL] + [f'{c} AS "{name}"' for c, name in
+                                                          zip(DB_TELEMETRY_COLUMNS, TELEMETRY_COLUMNS)])
+        joins = "LEFT JOIN run_telemetry rt ON rt.run_id = r.id "
+    if (where or {}).get('quarantined', 'no') != 'no':
+        columns += ", q.reason AS quarantine"
+        joins += "LEFT JOIN quarantine q ON q.run_id = r.id "
+    df = _query(db_path,
+                "SELECT r.rpi, r.os, r.python, r.variant, ROW_NUMBER() OVER "
+                "(PARTITION BY r.rpi, r.os, r.python, r.variant ORDER BY r.iteration, r.id) - 1 AS iteration, "
+                f"{columns} FROM runs r {joins}WHERE {clause} "
+                "ORDER BY r.rpi, r.os, r.python, r.variant, r.iteration, r.id",
+                params)
+    df[OTII_COLUMNS] = df[OTII_COLUMNS].astype(np.float64)
+    if telemetry:
+        df[TELEMETRY_COLUMNS] = df[TELEMETRY_COLUMNS].astype(np.float64)
+    return df
+
+
+def load_results(results_dir=RESULTS_DIR, rebuild=False, where=None, telemetry=False):
+    """Return all iterations of all configurations as one DataFrame.
+
+    where restricts the configurations (column -> value); filters other than
+    KEY_COLUMNS need the results database. {'throttled': 'yes'} or 'no'
+    selects runs by their telemetry. telemetry=True adds the per-run telemetry summary: a
+    'throttled' column ('yes', 'no' or 'unknown') and TELEMETRY_COLUMNS.
+    {'quarantined': 'yes'} or 'all' includes quarantined runs and adds a
+    'quarantine' column with the reasons (None for accepted runs).
+    {'variant': ...} selects the build variant (default DEFAULT_VARIANT, or
+    'all').
+    """
+    db_path = _db_path(results_dir)
+    if db_path:
+        return _load_db(db_path, where, telemetry)
+    where = dict(where or {})
+    where.setdefault('variant', DEFAULT_VARIANT)
+    if where['variant'] == 'all':
+        del where['variant']
+    if set(where) - set(KEY_COLUMNS) or telemetry:
+        raise ValueError(f"Filtering on {sorted(set(where) - set(KEY_COLUMNS))} and telemetry need the results "
+                         f"database {os.path.join(results_dir, DB_NAME)}")
+    data = _load_csv(results_dir, rebuild)
+    if not where:
+        return data
+    mask = np.logical_and.reduce([(data[k] == v).to_numpy() for k, v in where.items()])
+    return data[mask].reset_index(drop=True)
+
+
+def _load_csv(results_dir, rebuild=False):
+    cache_dir = os.path.join(results_dir, CACHE_DIRNAME)
+    sources = _scan(results_dir)
+
+    cached_manifest, cached_arrays = (None, None) if rebuild else _load_cache(cache_dir)
+    cached = {}
+    if cached_manifest is not None:
+        cached = {f['name']: f for f in cached_manifest['files']}
+
+    unchanged = all(
+        s['name'] in cached
+        and cached[s['name']]['mtime_ns'] == s['mtime_ns']
+        and cached[s['name']]['size'] == s['size']
+        for s in sources
+    )
+    if cached_manifest is not None and unchanged and len(cached) == len(sources):
+        return _to_frame(cached_manifest, cached_arrays)
+
+    pieces = {c: [] for c in OTII_COLUMNS}
+    files = []
+    offset = 0
+    for s in sources:
+        old = cached.get(s['name'])
+        if old is not None and old['mtime_ns'] == s['mtime_ns'] and old['size'] == s['size']:
+            cols = {c: cached_arrays[i][old['start']:old['stop']]
+                    for i, c in enumerate(OTII_COLUMNS)}
+        else:
+            cols = _read_csv(os.path.join(results_dir, s['name']))
+        n = len(cols[OTII_COLUMNS[0]])
+        for c in OTII_COLUMNS:
+            pieces[c].append(cols[c])
+        files.append(dict(s, start=offset, stop=offset + n))
+        offset += n
+
+    arrays = [np.concatenate(pieces[c]) if pieces[c] else np.empty(0, np.float64)
+              for c in OTII_COLUMNS]
+    manifest = {'version': CACHE_VERSION, 'columns': OTII_COLUMNS, 'files': files}
+    _write_cache(cache_dir, manifest, arrays)
+    return _to_frame(manifest, arrays)
+
+
+def load_phase_results(results_dir=RESULTS_DIR):
+    """Per-benchmark and per-phase energy rows written by run_benchmarks.py.
+
+    Reads phases_<rpi>_<os>_python<version>.csv, or the phases table of the
+    results database; one row per (iteration timestamp, benchmark, phase) of
+    the default build.
+    """
+    db_path = _db_path(results_dir)
+    if db_path:
+        clause, params = _where(None)
+        columns = ", ".join(f'{c} AS "{name}"' for c, name in zip(DB_PHASE_COLUMNS, PHASE_COLUMNS))
+        return _query(db_path, f"SELECT r.rpi, r.os, r.python, r.variant, {columns} FROM phases p "
+                               f"JOIN runs r ON r.id = p.run_id WHERE {clause} "
+                               "ORDER BY r.rpi, r.os, r.python, r.iteration, r.id, p.benchmark, p.phase", params)
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(results_dir, PHASES_PATTERN))):
+        parsed = parse_filename(path, prefix="phases")
+        if not parsed or parsed[3] != DEFAULT_VARIANT:
+            continue
+        df = pd.read_csv(path)
+        for name, value in zip(KEY_COLUMNS, parsed):
+            df.insert(KEY_COLUMNS.index(name), name, value)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS + PHASE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or refresh the cached results dataset')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the cache and re-read every CSV')
+    args = parser.parse_args()
+
+    data = load_results(rebuild=args.rebuild)
+    n_configs = len(data.groupby(KEY_COLUMNS))
+    print(f"Loaded {len(data)} iterations from {n_configs} configurations")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Report the multi-core scaling sweep: energy per unit of work and speedup per core count.
+
+experiment/scaling.py stores one row per measured point in the scaling table
+of the results database. For every board, OS, interpreter (version and build
+variant), workload and amount of work, this script prints per (cores,
+workers):
+
+    points       measured iterations
+    energy       mean energy of the workload window (J)
+    j_per_unit   mean energy per unit of work (J)
+    duration     mean duration of the workload window (s)
+    speedup      duration of the baseline (fewest cores, fewest workers)
+                 over this duration
+    efficiency   speedup per active core, relative to the baseline's cores
+    energy_ratio energy relative to the baseline
+
+followed by the most energy-efficient degree of parallelism (lowest joules per
+unit) of each board, interpreter and workload.
+
+Usage:
+    python3 scaling_report.py [--results-dir ../../results] [--out scaling_summary.csv]
+"""
+
+import argparse
+import sqlite3
+
+import pandas as pd
+
+from results_index import DEFAULT_VARIANT, db_path
+from results_loader import RESULTS_DIR
+
+GROUP_COLUMNS = ['rpi', 'os', 'python', 'workload', 'units', 'unit_size']
+POINT_COLUMNS = ['cores', 'workers']
+
+
+def load_scaling(path):
+    """Every point of the scaling table, with the variant folded into the python label (3.13t is 3.13-ft)."""
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scaling'").fetchone():
+            return pd.DataFrame()
+        df = pd.read_sql_query(
+            "SELECT rpi, os, python, variant, workload, cores, workers, units, unit_size, iteration, "
+            "duration, energy, seconds FROM scaling", conn)
+    finally:
+        conn.close()
+    df['python'] = df['python'] + ('-' + df['variant']).where(df['variant'] != DEFAULT_VARIANT, '')
+    return df.drop(columns='variant')
+
+
+def scaling_summary(df):
+    """Mean energy, energy per unit, duration, speedup and efficiency per group and (cores, workers)."""
+    summary = df.groupby(GROUP_COLUMNS + POINT_COLUMNS).agg(
+        points=('energy', 'size'),
+        energy=('energy', 'mean'),
+        duration=('duration', 'mean'),
+    ).reset_index()
+    summary['j_per_unit'] = summary['energy'] / summary['units']
+    # The baseline of a group is its point with the fewest cores, then the fewest workers
+    base = summary.sort_values(POINT_COLUMNS).groupby(GROUP_COLUMNS).first()
+    base = base[['cores', 'energy', 'duration']].add_prefix('base_')
+    summary = summary.join(base, on=GROUP_COLUMNS)
+    summary['speedup'] = summary['base_duration'] / summary['duration']
+    summary['efficiency'] = summary['speedup'] * summary['base_cores'] / summary['cores']
+    summary['energy_ratio'] = summary['energy'] / summary['base_energy']
+    columns = ['points', 'energy', 'j_per_unit', 'duration', 'speedup', 'efficiency', 'energy_ratio']
+    return summary.set_index(GROUP_COLUMNS + POINT_COLUMNS)[columns]
+
+
+def most_efficient(summary):
+    """The (cores, workers) with the lowest energy per unit of work in every group."""
+    best = summary.reset_index().sort_values('j_per_unit').groupby(GROUP_COLUMNS).first()
+    return best[POINT_COLUMNS + ['j_per_unit', 'speedup', 'energy_ratio']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the multi-core scaling sweep of scaling.py')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    parser.add_argument('--out', help='Also write the summary to this CSV file')
+    args = parser.parse_args()
+
+    path = db_path(args.results_dir)
+    df = load_scaling(path) if path else pd.DataFrame()
+    if df.empty:
+        print(f"No scaling points in {args.results_dir}")
+        return
+
+    summary = scaling_summary(df)
+    print(summary.round(5).to_string())
+    print("\nMost energy-efficient degree of parallelism:")
+    print(most_efficient(summary).round(5).to_string())
+    if args.out:
+        summary.to_csv(args.out)
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Streaming, bounded-memory summary statistics for large result sets.
+
+StreamingSummary keeps exact count, min, max, mean and standard deviation
+(Welford/Chan moments) and approximate quantiles through a merging t-digest.
+Memory is bounded by the digest size, independent of how many values are
+added. Accumulators are picklable and mergeable, so partial summaries can be
+built in worker processes and combined afterwards.
+
+The quantile error bound is given as a rank error: with rank_error=0.005 an
+estimated quartile lies within ±0.5 percentile points of the true one. Small
+inputs (fewer values than digest centroids) are kept exactly and reproduce
+np.percentile.
+
+Usage:
+    from streaming_stats import StreamingSummary, summarize_grouped
+    acc = StreamingSummary()
+    acc.update(values)
+    acc.summary()    # [q0, q1, q2, q3, q4, μ, σ]
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_RANK_ERROR = 0.005
+DEFAULT_CHUNK_SIZE = 1_000_000
+# Rows above which the analysis scripts switch to streaming accumulators
+STREAMING_THRESHOLD = 5_000_000
+
+
+class StreamingSummary:
+    """Mergeable accumulator for min/max/mean/std and approximate quantiles."""
+
+    def __init__(self, rank_error=DEFAULT_RANK_ERROR):
+        if not 0 < rank_error < 0.5:
+            raise ValueError(f"rank_error must be in (0, 0.5), got {rank_error}")
+        self.rank_error = rank_error
+        # With the arcsine scale function a centroid spans at most pi/delta of
+        # the rank space; interpolating inside it is off by at most half that.
+        self.compression = math.ceil(math.pi / (2 * rank_error))
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        vals = np.asarray(values, dtype=np.float64).ravel()
+        vals = vals[~np.isnan(vals)]
+        n = vals.size
+        if n == 0:
+            return self
+        mean = vals.mean()
+        m2 = np.square(vals - mean).sum()
+        self._combine_moments(n, vals.min(), vals.max(), mean, m2)
+        self._buffer.append(vals)
+        self._buffered += n
+        if self._buffered > 4 * self.compression:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        self._combine_moments(other.count, other.min, other.max, other.mean, other.m2)
+        other._compress()
+        self._compress(other._means, other._weights)
+        return self
+
+    def _combine_moments(self, n, vmin, vmax, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        means = [self._means] + self._buffer
+        weights = [self._weights] + [np.ones(b.size) for b in self._buffer]
+        if extra_means is not None:
+            means.append(extra_means)
+            weights.append(extra_weights)
+        self._buffer = []
+        self._buffered = 0
+
+        means = np.concatenate(means)
+        weights = np.concatenate(weights)
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        if means.size <= self.compression or total == 0:
+            self._means, self._weights = means, weights
+            return
+
+        # Assign each point to one unit of the k1 scale k(q) = delta/(2 pi) asin(2q - 1)
+        # and collapse every unit into a single centroid.
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        new_weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / new_weights
+        self._weights = new_weights
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def quantile(self, p):
+        """Approximate quantile(s) with np.percentile's linear interpolation."""
+        self._compress()
+        if self.count == 0:
+            return np.full(np.shape(p), np.nan) if np.ndim(p) else math.nan
+        # Rank of each centroid's centre, in the 0-based positions used by np.percentile
+        centres = np.cumsum(self._weights) - (self._weights + 1) / 2
+        means = self._means
+        if centres[0] > 0:
+            centres = np.r_[0.0, centres]
+            means = np.r_[self.min, means]
+        if centres[-1] < self.count - 1:
+            centres = np.r_[centres, self.count - 1.0]
+            means = np.r_[means, self.max]
+        result = np.interp(np.asarray(p, dtype=np.float64) * (self.count - 1), centres, means)
+        return result if np.ndim(p) else float(result)
+
+    def summary(self):
+        """[q0, q1, q2, q3, q4, μ, σ] in the order of quick_summary.STATS."""
+        q1, q2, q3 = self.quantile([0.25, 0.5, 0.75])
+        return [self.min, q1, q2, q3, self.max, self.mean, self.std]
+
+
+def _summarize_chunk(codes, values, n_groups, rank_error):
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    values = values[order]
+    bounds = np.searchsorted(codes, np.arange(n_groups + 1))
+    accs = {}
+    for g in range(n_groups):
+        lo, hi = bounds[g], bounds[g + 1]
+        if hi > lo:
+            accs[g] = StreamingSummary(rank_error).update(values[lo:hi])
+    return accs
+
+
+def summarize_grouped(codes, values, n_groups, rank_error=DEFAULT_RANK_ERROR,
+                      chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """Build one StreamingSummary per group code from (possibly memory-mapped) arrays.
+
+    The rows are split into chunks of at most chunk_size; each chunk is
+    summarized in a worker process and the partial accumulators are merged,
+    so no more than a few chunks are ever materialized at once.
+    """
+    n = len(values)
+    spans = [(lo, min(lo + chunk_size, n)) for lo in range(0, n, chunk_size)]
+    results = [StreamingSummary(rank_error) for _ in range(n_groups)]
+
+    def merge(partial):
+        for g, acc in partial.items():
+            results[g].merge(acc)
+
+    if workers == 1 or len(spans) <= 1:
+        for lo, hi in spans:
+            merge(_summarize_chunk(np.asarray(codes[lo:hi]), np.asarray(values[lo:hi]),
+                                   n_groups, rank_error))
+        return results
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep only a couple of chunks per worker in flight to bound memory
+        max_pending = 2 * workers
+        pending = []
+        for lo, hi in spans:
+            pending.append(pool.submit(_summarize_chunk, np.asarray(codes[lo:hi]),
+                                       np.asarray(values[lo:hi]), n_groups, rank_error))
+            if len(pending) >= max_pending:
+                merge(pending.pop(0).result())
+        for future in pending:
+            merge(future.result())
+    return results
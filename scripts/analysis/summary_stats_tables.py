@@ -13,88 +13,172 @@ CSV file summarizing all models and metrics.
 Usage:
     python3 summary_stats_tables.py RPi4B --metric consumption
     python3 summary_stats_tables.py RPi3B+ RPi4B --all
+    python3 summary_stats_tables.py RPi4B --metric consumption --variant all
 
 Input:
-    - CSV files named: results_<rpi>_<os>_python<version>.csv
+    - CSV files named: results_<rpi>_<os>_python<version>[-<variant>].csv
     - Located in ../../results/
     - Must contain columns: 'Duration' and 'Energy consumption'
+    - Read through the shared results cache (see results_loader.py)
+
+All metrics for all (pi, python, os, variant) groups are computed in a single
+groupby pass. Per-group results are cached in
+../../results/.cache/summary_stats.json and only groups whose results file
+changed are recomputed on the next run (use --no-cache to recompute
+everything). The cache covers every build variant; --variant picks the one
+tabulated (default: the default build) or 'all', which adds the variant to
+the labels (3.13-jit|Alpine). Above --streaming-threshold rows the quartiles
+are estimated with mergeable streaming accumulators (see streaming_stats.py)
+computed in parallel worker processes.
 
 Output:
     - Individual CSVs: summary_stats_<pi>_<metric>.csv
     - Or combined CSV: summary_stats_combined.csv
 """
 
-import glob
-import re
 import argparse
+import json
+import os
 
-import numpy as np
 import pandas as pd
 from packaging.version import parse as parse_version
 
-
-def parse_filename(fname):
-    m = re.match(r"../../results/results_(.+?)_(.+?)_python(\d+\.\d+)\.csv$", fname)
-    return m.groups() if m else None
-
-
-def compute_summary(vals):
-    arr = np.array(vals)
-    return [
-        np.min(arr),
-        np.percentile(arr, 25),
-        np.median(arr),
-        np.percentile(arr, 75),
-        np.max(arr),
-        np.mean(arr),
-        np.std(arr, ddof=1)
-    ]
-
-
-def build_table(pi_target, metric):
-    colmap = {
-        'draw': ('Energy consumption', 'Duration'),
-        'duration': 'Duration',
-        'consumption': 'Energy consumption'
+from quick_summary import (METRICS, STATS, SUMMARY_CACHE, SUMMARY_CACHE_VERSION,
+                           load_summary_cache as _load_summary_cache)
+from results_loader import DEFAULT_VARIANT, KEY_COLUMNS, load_results, source_fingerprints
+from streaming_stats import STREAMING_THRESHOLD, summarize_grouped
+
+COLMAP = {
+    'duration': 'Duration',
+    'draw': ('Energy consumption', 'Duration'),
+    'consumption': 'Energy consumption'
+}
+
+
+def metric_frame(data):
+    """Per-iteration values of every metric, keyed by configuration."""
+    frame = data[KEY_COLUMNS].copy()
+    for metric, col in COLMAP.items():
+        if isinstance(col, tuple):
+            col1, col2 = col
+            frame[metric] = data[col1] / data[col2]
+        else:
+            frame[metric] = data[col]
+    return frame
+
+
+def summarize_groups(data, streaming_threshold=STREAMING_THRESHOLD):
+    """Summary statistics of every metric for every configuration in one groupby pass.
+
+    Returns a DataFrame indexed by (rpi, os, python, variant) with a (metric, stat)
+    column MultiIndex. Above streaming_threshold rows the quartiles are
+    estimated with bounded-memory streaming accumulators instead.
+    """
+    if len(data) > streaming_threshold:
+        return summarize_groups_streaming(data)
+    grouped = metric_frame(data).groupby(KEY_COLUMNS, sort=False)[METRICS]
+    parts = {
+        'q0': grouped.min(),
+        'q1': grouped.quantile(0.25),
+        'q2': grouped.median(),
+        'q3': grouped.quantile(0.75),
+        'q4': grouped.max(),
+        'μ': grouped.mean(),
+        'σ': grouped.std(ddof=1),
     }
-
-    records = []
-    for path in glob.glob("../../results/results_*_python*.csv"):
-        parsed = parse_filename(path)
-        if not parsed:
-            continue
-        pi, os_name, pyver = parsed
-        if pi != pi_target:
-            continue
-        df = pd.read_csv(path)
-        if isinstance(colmap[metric], tuple):
-            col1, col2 = colmap[metric]
-            if col1 not in df.columns or col2 not in df.columns:
-                raise ValueError(f"Required columns not found in {path}")
-            vals = (df[col1] / df[col2]).dropna().tolist()
+    summary = pd.concat(parts, axis=1).swaplevel(axis=1)
+    return summary[[(m, stat) for m in METRICS for stat in STATS]]
+
+
+def summarize_groups_streaming(data, workers=None):
+    """Like summarize_groups, but with approximate quartiles and bounded memory."""
+    frame = metric_frame(data)
+    grouped = frame.groupby(KEY_COLUMNS, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    keys = list(grouped.groups)
+    rows = [[] for _ in keys]
+    for metric in METRICS:
+        accs = summarize_grouped(codes, frame[metric].to_numpy(), len(keys), workers=workers)
+        for row, acc in zip(rows, accs):
+            row.extend(acc.summary())
+    index = pd.MultiIndex.from_tuples(keys, names=KEY_COLUMNS)
+    columns = pd.MultiIndex.from_tuples([(m, stat) for m in METRICS for stat in STATS])
+    return pd.DataFrame(rows, index=index, columns=columns)
+
+
+def _save_summary_cache(groups):
+    os.makedirs(os.path.dirname(SUMMARY_CACHE), exist_ok=True)
+    tmp = SUMMARY_CACHE + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'version': SUMMARY_CACHE_VERSION, 'groups': groups}, f)
+    os.replace(tmp, SUMMARY_CACHE)
+
+
+def load_group_summaries(use_cache=True, streaming_threshold=STREAMING_THRESHOLD, variant=DEFAULT_VARIANT):
+    """Summary statistics per configuration, recomputing only changed configurations.
+
+    Each configuration's statistics are cached together with the mtime/size of
+    its source CSV, so appending an iteration to one results file only
+    recomputes that configuration. The cache holds every build variant;
+    only the configurations of variant (or of all, with 'all') are returned.
+    """
+    fingerprints = source_fingerprints(variant='all')
+    cached = _load_summary_cache() if use_cache else {}
+
+    groups = {}
+    dirty = []
+    for key, fp in fingerprints.items():
+        label = '|'.join(key)
+        entry = cached.get(label)
+        if entry is not None and entry['fingerprint'] == fp:
+            groups[label] = entry
         else:
-            if colmap[metric] not in df.columns:
-                raise ValueError(f"Column '{colmap[metric]}' not found in {path}")
-            vals = df[colmap[metric]].dropna().tolist()
-        records.append({'python': pyver, 'os': os_name, 'vals': vals})
-
-    if not records:
+            dirty.append(key)
+
+    if dirty:
+        data = load_results(where={'variant': 'all'})
+        data = data[data.set_index(KEY_COLUMNS).index.isin(dirty)]
+        summary = summarize_groups(data, streaming_threshold)
+        for key, row in summary.iterrows():
+            groups['|'.join(key)] = {
+                'fingerprint': fingerprints[key],
+                'stats': {m: [float(row[(m, stat)]) for stat in STATS] for m in METRICS},
+            }
+        print(f"Recomputed {len(dirty)} of {len(fingerprints)} configurations")
+
+    if use_cache and (dirty or len(groups) != len(cached)):
+        _save_summary_cache(groups)
+
+    index = pd.MultiIndex.from_tuples([tuple(k.split('|')) for k in groups], names=KEY_COLUMNS)
+    values = [[v for m in METRICS for v in entry['stats'][m]] for entry in groups.values()]
+    columns = pd.MultiIndex.from_tuples([(m, stat) for m in METRICS for stat in STATS])
+    summaries = pd.DataFrame(values, index=index, columns=columns)
+    if variant != 'all':
+        summaries = summaries[summaries.index.get_level_values('variant') == variant]
+    return summaries
+
+
+def _python_label(df):
+    """Python version, with the build variant unless it is the default build (3.13-jit)."""
+    suffix = ('-' + df['variant']).where(df['variant'] != DEFAULT_VARIANT, '')
+    return df['python'] + suffix
+
+
+def build_table(pi_target, metric, summaries=None):
+    if summaries is None:
+        summaries = load_group_summaries()
+    summaries = summaries[summaries.index.get_level_values('rpi') == pi_target]
+    if summaries.empty:
         raise ValueError(f"No data for Pi model {pi_target}")
 
-    grouped = {}
-    for rec in records:
-        key = (rec['python'], rec['os'])
-        grouped.setdefault(key, []).extend(rec['vals'])
-
-    rows = []
-    for (pyver, os_name), vals in grouped.items():
-        stats = compute_summary(vals)
-        rows.append([pyver, os_name] + stats)
-
-    cols = ['python','os','q0','q1','q2','q3','q4','μ','σ']
-    df = pd.DataFrame(rows, columns=cols)
-    df.sort_values(['python','os'], key=lambda col: col.map(lambda v: parse_version(v) if col.name=='python' else v), inplace=True)
-    return df
+    df = summaries[metric].reset_index()
+    df = df[['python', 'variant', 'os'] + STATS].copy()
+    # The default build first, then the other variants of the version
+    df['variant_order'] = df['variant'] != DEFAULT_VARIANT
+    df.sort_values(['python', 'variant_order', 'variant', 'os'],
+                   key=lambda col: col.map(lambda v: parse_version(v) if col.name=='python' else v), inplace=True)
+    df['python'] = _python_label(df)
+    return df.drop(columns=['variant', 'variant_order'])
 
 
 def save_table_to_csv(pi_model, df, metric):
@@ -105,13 +189,15 @@ def save_table_to_csv(pi_model, df, metric):
     print(f"Saved CSV for {pi_model} and metric {metric} to {outfn}")
 
 
-def save_combined_table_to_csv(pi_models, metrics):
+def save_combined_table_to_csv(pi_models, metrics, use_cache=True,
+                               streaming_threshold=STREAMING_THRESHOLD, variant=DEFAULT_VARIANT):
     all_rows = []
+    summaries = load_group_summaries(use_cache, streaming_threshold, variant)
 
     for pi_model in pi_models:
         for metric in metrics:
             try:
-                df = build_table(pi_model, metric)
+                df = build_table(pi_model, metric, summaries)
                 df['label'] = df['python'] + '|' + df['os']
                 stats_df = df.set_index('label')[['q0','q1','q2','q3','q4','μ','σ']].T
                 stats_df.index = [f"{metric}|{pi_model}|{idx}" for idx in stats_df.index]
@@ -134,17 +220,25 @@ def main():
     parser.add_argument('pi_models', nargs='*', help='Raspberry Pi models, e.g. RPi4B RPi3B+')
     parser.add_argument('--metric', choices=['duration', 'draw', 'consumption'], help='Metric to analyze')
     parser.add_argument('--all', action='store_true', help='Aggregate all metrics and Pi models into one CSV')
+    parser.add_argument('--variant', default=DEFAULT_VARIANT,
+                        help='Build variant to tabulate, e.g. jit, or all (default: the default build)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute every configuration instead of reusing cached summaries')
+    parser.add_argument('--streaming-threshold', type=int, default=STREAMING_THRESHOLD,
+                        help='Rows above which quartiles are estimated with streaming accumulators')
     args = parser.parse_args()
 
     if args.all:
         if not args.pi_models:
             args.pi_models = ['RPi3B+', 'RPi4B']
-        save_combined_table_to_csv(args.pi_models, ['duration', 'draw', 'consumption'])
+        save_combined_table_to_csv(args.pi_models, METRICS, not args.no_cache,
+                                   args.streaming_threshold, args.variant)
     else:
         if not args.metric:
             raise ValueError("Specify --metric when not using --all")
+        summaries = load_group_summaries(not args.no_cache, args.streaming_threshold, args.variant)
         for pi_model in args.pi_models:
-            df = build_table(pi_model, args.metric)
+            df = build_table(pi_model, args.metric, summaries)
             save_table_to_csv(pi_model, df, args.metric)
 
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Resident benchmark agent for the Raspberry Pi, and its client.
+
+Running run_benchmarks.sh through SSH puts the SSH handshake, the encrypted
+channel and the shell start-up inside the measured window. The agent is
+started once per batch, resolves the Python interpreters and the benchmark
+script up front, and then waits for run requests on a plain TCP socket. A
+request carries a start time on the Pi clock; the agent sleeps until then,
+runs the workload and reports when it actually started and finished, so the
+orchestrator can take the energy of exactly that window.
+
+Protocol: one JSON object per line in each direction, every request carrying
+the token the agent was started with. The token is read from a file only its
+owner can read, which the agent removes once read, so it never shows up on a
+command line (ps, /proc/<pid>/cmdline).
+
+    {"op": "time"}                          -> {"time": <epoch>}
+    {"op": "idle"}                          -> {"idle": <CPU idle share over 0.5 s>}
+    {"op": "prepare", "version": "python3.13",
+     "benchmarks": "2to3"}                  -> {"exit_status", "stdout", "stderr"}
+    {"op": "run", "version": "python3.13",
+     "benchmarks": "2to3", "start_at": t,
+     "telemetry": 0.1}                      -> {"exit_status", "started", "finished",
+                                                "stdout", "stderr", "telemetry", "pyperf"}
+    {"op": "shutdown"}                      -> {}
+Errors come back as {"error": "..."}. With a telemetry interval the run is
+sampled in-process (telemetry.py) and the samples come back with the reply.
+"pyperf" is the pyperf JSON the run wrote, or null if it wrote none.
+
+Only the standard library (and telemetry.py next to it) is used, so any
+Python on the Pi can run it:
+
+    (umask 077 && echo SECRET > .pyenergy_agent_token)
+    python3 agent.py --port 8765 --token-file .pyenergy_agent_token --versions python3.13 python3.12
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+
+from telemetry import Sampler, cpu_times
+
+PORT = 8765
+SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/run_benchmarks.sh"
+COMMAND = ["bash", SCRIPT, "{version}", "{benchmarks}"]
+PREPARE_COMMAND = ["bash", SCRIPT, "--prepare", "{version}", "{benchmarks}"]
+DEFAULT_BENCHMARKS = "2to3,chameleon,tornado_http"
+TOKEN_FILE = ".pyenergy_agent_token"
+
+
+class AgentError(Exception):
+    '''Error reported by the agent'''
+
+
+def cpu_idle(interval=0.5):
+    busy0, idle0 = cpu_times()
+    time.sleep(interval)
+    busy1, idle1 = cpu_times()
+    total = (busy1 - busy0) + (idle1 - idle0)
+    return (idle1 - idle0) / total if total else 1.0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            request = {}
+            try:
+                parsed = json.loads(line)
+                if not isinstance(parsed, dict):
+                    raise AgentError("request is not a JSON object")
+                request = parsed
+                if request.get("token") != self.server.token:
+                    raise AgentError("bad token")
+                reply = self.server.dispatch(request)
+            except Exception as error:
+                reply = {"error": str(error)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+            if request.get("op") == "shutdown":
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class AgentServer(socketserver.ThreadingTCPServer):
+    '''Runs one workload at a time on request'''
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, token, versions=(), command=COMMAND, idle_probe=cpu_idle,
+                 prepare_command=PREPARE_COMMAND):
+        super().__init__(address, _Handler)
+        self.token = token
+        self.command = list(command)
+        self.prepare_command = list(prepare_command)
+        self.idle_probe = idle_probe
+        self.run_lock = threading.Lock()
+        self.env = dict(os.environ)
+        self.interpreters = {v: shutil.which(v) for v in versions}
+        missing = [v for v, path in self.interpreters.items() if path is None]
+        if missing:
+            raise AgentError(f"not installed: {', '.join(missing)}")
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "time":
+            return {"time": time.time()}
+        if op == "idle":
+            return {"idle": self.idle_probe()}
+        if op == "prepare":
+            return self.prepare(request["version"], request.get("benchmarks") or DEFAULT_BENCHMARKS)
+        if op == "run":
+            return self.run(request["version"], request.get("benchmarks") or DEFAULT_BENCHMARKS,
+                            request.get("start_at"), request.get("telemetry"))
+        if op == "shutdown":
+            return {}
+        raise AgentError(f"unknown op {op!r}")
+
+    def _argv(self, command, version, benchmarks):
+        # The interpreter resolved at start-up; others are looked up by the script
+        return [arg.format(version=self.interpreters.get(version, version), benchmarks=benchmarks)
+                for arg in command]
+
+    def prepare(self, version, benchmarks):
+        '''Build the cached venv for a version and benchmark set (run_benchmarks.sh --prepare)'''
+        argv = self._argv(self.prepare_command, version, benchmarks)
+        with self.run_lock:
+            proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.env)
+        return {"exit_status": proc.returncode, "stdout": proc.stdout.decode(errors="replace"),
+                "stderr": proc.stderr.decode(errors="replace")}
+
+    def run(self, version, benchmarks, start_at=None, telemetry=None):
+        argv = self._argv(self.command, version, benchmarks)
+        with self.run_lock:
+            # pyperformance refuses to overwrite a previous result file
+            if os.path.exists(f"{version}.json"):
+                os.remove(f"{version}.json")
+            if start_at is not None:
+                time.sleep(max(0.0, start_at - time.time()))
+            sampler = Sampler(telemetry).start() if telemetry else None
+            started = time.time()
+            proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.env)
+            finished = time.time()
+            samples = sampler.stop() if sampler else None
+            pyperf = None
+            if os.path.exists(f"{version}.json"):
+                with open(f"{version}.json") as f:
+                    pyperf = json.load(f)
+                os.remove(f"{version}.json")
+        return {"exit_status": proc.returncode, "started": started, "finished": finished,
+                "stdout": proc.stdout.decode(errors="replace"), "stderr": proc.stderr.decode(errors="replace"),
+                "telemetry": samples, "pyperf": pyperf}
+
+
+class AgentClient:
+    '''Client side of the agent protocol, used by the orchestrator'''
+
+    def __init__(self, hostname, port=PORT, token="", timeout=None):
+        self.token = token
+        self._sock = socket.create_connection((hostname, port), timeout=10)
+        self._sock.settimeout(timeout)
+        self._file = self._sock.makefile("rwb")
+
+    def call(self, op, **params):
+        request = dict(params, op=op, token=self.token)
+        self._file.write((json.dumps(request) + "\n").encode())
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise AgentError("agent closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise AgentError(reply["error"])
+        return reply
+
+    def time(self):
+        return self.call("time")["time"]
+
+    def cpu_idle(self):
+        return self.call("idle")["idle"]
+
+    def prepare(self, version, benchmarks=None):
+        return self.call("prepare", version=version, benchmarks=benchmarks)
+
+    def run(self, version, benchmarks=None, start_at=None, telemetry=None):
+        return self.call("run", version=version, benchmarks=benchmarks, start_at=start_at, telemetry=telemetry)
+
+    def clock_offset(self, samples=3):
+        '''Offset (agent - local) of the Pi clock, from the fastest of a few round trips'''
+        best = None
+        for _ in range(samples):
+            t0 = time.time()
+            remote = self.time()
+            t1 = time.time()
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, remote - (t0 + t1) / 2)
+        return best[1]
+
+    def shutdown(self):
+        self.call("shutdown")
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+def read_token(path):
+    '''Shared secret from a file only its owner can read; the file is removed once read'''
+    if os.stat(path).st_mode & 0o077:
+        raise AgentError(f"{path} can be read by other users; create it with umask 077")
+    with open(path) as f:
+        token = f.read().strip()
+    os.remove(path)
+    if not token:
+        raise AgentError(f"{path} is empty")
+    return token
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve benchmark run requests on this board')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='Port to listen on')
+    parser.add_argument('--token-file', default=TOKEN_FILE,
+                        help='File (mode 0600) holding the shared secret every request must carry; '
+                             'removed once read')
+    parser.add_argument('--versions', nargs='*', default=[], help='Python executables to resolve at start-up')
+    args = parser.parse_args()
+
+    if not os.path.isfile(SCRIPT):
+        parser.error(f"{SCRIPT} not found; start the agent from the directory the orchestrator logs in to")
+    try:
+        token = read_token(args.token_file)
+    except (OSError, AgentError) as error:
+        parser.error(f"cannot read the token: {error}")
+    server = AgentServer((args.host, args.port), token, args.versions)
+    print(f"Agent listening on {args.host}:{args.port}", flush=True)
+    with server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Online outlier and drift detection for the measured iterations.
+
+Every new run is scored against the accepted runs of its configuration
+(board, OS, Python version, build variant) on its duration, average power
+and energy, with the robust z-score of Iglewicz and Hoaglin:
+
+    z = 0.6745 * (x - median) / MAD
+
+A run is an outlier if |z| > threshold (3.5) for any of the three, once the
+configuration has min_history (5) accepted runs. The MAD is floored at 0.1 %
+of the median, so a configuration that happens to measure nearly the same
+value every time does not flag differences far below the measurement noise.
+
+Slow drift, such as a room warming up over the batch, moves every run a
+little and escapes the per-run test. It is caught per board with a two-sided
+CUSUM of the energy z-scores of its runs, in the order they were measured,
+over all versions and variants:
+
+    S+ = max(0, S+ + z - k),  S- = max(0, S- - z - k)
+
+which flags the run at which S+ or S- exceeds h (k = 0.5, h = 5) and starts
+over. Runs whose telemetry (telemetry.py) shows throttling are flagged too.
+
+Flagged runs are quarantined in the results database with their reasons
+(results_db.py). They stay in the runs table but no longer count as
+completed iterations, so the orchestrators put the job back in the queue
+(up to max_attempts times). The analysis scripts leave quarantined runs out
+unless asked for them (results_loader.load_results(where={'quarantined': ...})).
+
+Usage:
+    python3 anomaly.py [--results-dir ../../results]   # list the quarantined runs
+"""
+
+import argparse
+import os
+import threading
+from statistics import median
+
+from results_csv import RESULT_HEADERS
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+
+RESULTS_DIR = "../../results"
+THRESHOLD = 3.5
+MIN_HISTORY = 5
+MIN_RELATIVE_MAD = 0.001
+DRIFT_SLACK = 0.5
+DRIFT_LIMIT = 5.0
+# (name, column of RESULT_HEADERS) of the scored metrics, in the order of ResultsDB.run_history
+METRICS = [("duration", "Duration"), ("average power", "Average"), ("energy", "Energy consumption")]
+
+
+def robust_z(value, history):
+    '''Robust z-score of value against history (median and MAD)'''
+    center = median(history)
+    mad = max(median(abs(x - center) for x in history), MIN_RELATIVE_MAD * abs(center))
+    return 0.6745 * (value - center) / mad if mad else 0.0
+
+
+class AnomalyDetector:
+    '''Scores every new run against its configuration's history and its board's drift'''
+
+    def __init__(self, threshold=THRESHOLD, min_history=MIN_HISTORY, drift_slack=DRIFT_SLACK,
+                 drift_limit=DRIFT_LIMIT):
+        self.threshold = threshold
+        self.min_history = min_history
+        self.drift_slack = drift_slack
+        self.drift_limit = drift_limit
+        self._lock = threading.Lock()
+        self._cusum = {}
+
+    def check(self, db, run_id, rpi, os_name, version, row, telemetry=None, variant=DEFAULT_VARIANT):
+        '''Quarantine a just-stored run if it is anomalous; return the reasons (empty if accepted)
+
+        row is its results row (RESULT_HEADERS order), telemetry its telemetry
+        summary if it has one.
+        '''
+        reasons = []
+        history = db.run_history(rpi, os_name, version, run_id, variant)
+        z = {}
+        if len(history) >= self.min_history:
+            for i, (name, column) in enumerate(METRICS):
+                z[name] = robust_z(row[RESULT_HEADERS.index(column)], [h[i] for h in history])
+                if abs(z[name]) > self.threshold:
+                    reasons.append(f"{name} outlier (z = {z[name]:+.1f})")
+        if telemetry and telemetry.get("throttled"):
+            reasons.append(f"throttled ({telemetry['throttled']:#x})")
+        # Outliers stay out of the drift statistic, they would trip it on their own
+        if "energy" in z and not reasons:
+            drift = self._drift((rpi, os_name), z["energy"])
+            if drift:
+                reasons.append(drift)
+        if reasons:
+            db.quarantine_run(run_id, reasons)
+        return reasons
+
+    def _drift(self, board_key, z):
+        with self._lock:
+            high, low = self._cusum.get(board_key, (0.0, 0.0))
+            high = max(0.0, high + z - self.drift_slack)
+            low = max(0.0, low - z - self.drift_slack)
+            if max(high, low) > self.drift_limit:
+                self._cusum[board_key] = (0.0, 0.0)
+                return f"drift {'up' if high > low else 'down'} (CUSUM {max(high, low):.1f})"
+            self._cusum[board_key] = (high, low)
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List the quarantined runs of the results database')
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    args = parser.parse_args()
+
+    runs = ResultsDB(os.path.join(args.results_dir, DB_NAME)).quarantined_runs()
+    for run_id, rpi, os_name, python, variant, timestamp, energy, reason in runs:
+        print(f"{run_id}: {rpi}|{os_name}|{python}|{variant} {timestamp} {energy} J: {reason}")
+    print(f"{len(runs)} quarantined runs")
+
+
+if __name__ == '__main__':
+    main()
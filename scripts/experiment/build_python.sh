@@ -0,0 +1,344 @@
+#!/bin/sh
+# Cached, parallel CPython builds for the install_python_* scripts (sourced by them).
+#
+# A PGO + LTO build of one version takes hours on an RPi3B+, so every build is
+# kept as an artifact: the installed prefix (make altinstall into a staging
+# DESTDIR), packed as a tarball and named after a hash of everything that
+# determines the binaries:
+#
+#     version, OS (os-release ID and VERSION_ID, or uname), libc (glibc or
+#     musl version), machine architecture, configure flags, prefix
+#
+#     $PYENERGY_PYTHON_BUILDS/python-<version>-<key>.tar.gz     the prefix
+#     $PYENERGY_PYTHON_BUILDS/python-<version>-<key>.tar.gz.sha256
+#     $PYENERGY_PYTHON_BUILDS/python-<version>-<key>.txt        the key inputs
+#
+# A board that finds the artifact of its key only unpacks it (minutes instead
+# of hours). Missing artifacts are built with ccache when it is installed, up
+# to --jobs versions at a time, each with its share of the CPUs; on a faster
+# machine of the same architecture, OS and libc, 'install_python_<os>.sh
+# --build-only --jobs N' fills the artifact directory, which is then copied to
+# (or mounted on) the boards. Source tarballs are taken from
+# $PYENERGY_TARBALLS when present and downloaded there otherwise; with
+# --offline nothing is downloaded, so tarballs and artifacts can come from a
+# USB stick or a local mirror.
+#
+# The sourcing script sets CONFIGURE_FLAGS and SUDO (empty when running as
+# root), defines install_dependencies, and calls
+#
+#     install_versions "$@" -- 3.9.22 3.10.17 ...
+#
+# with its command line before the '--':
+#
+#     [--build-only] [--jobs N] [--offline] [--artifacts DIR] [--tarballs DIR]
+#     [--variants LIST] [versions...]
+#
+# Versions given on the command line replace the default list.
+#
+# --variants default,jit,ft,nopgo builds interpreter build variants next to
+# the default PGO + LTO build (see matrix.py):
+#
+#     variant  configure                        prefix              executable
+#     default  CONFIGURE_FLAGS                  $PREFIX             python3.13
+#     jit      + --enable-experimental-jit      $VARIANT_ROOT/jit   python3.13-jit
+#     ft       + --disable-gil                  $VARIANT_ROOT/ft    python3.13t
+#     nopgo    - --enable-optimizations         $VARIANT_ROOT/nopgo python3.13-nopgo
+#              - --with-lto (plain make)
+#
+# Each variant has its own prefix, so its artifact has its own key, and its
+# executable is linked into $PREFIX/bin under the name in the last column,
+# which is what the orchestrators run. jit and ft are only built for 3.13 and
+# later; jit needs LLVM 18 on the build machine (Tools/jit/README.md in the
+# CPython sources).
+
+CACHE_ROOT=${PYENERGY_CACHE:-$HOME/.cache/pyenergy}
+ARTIFACTS=${PYENERGY_PYTHON_BUILDS:-$CACHE_ROOT/python-builds}
+TARBALLS=${PYENERGY_TARBALLS:-$CACHE_ROOT/python-sources}
+PREFIX=${PREFIX:-/usr/local}
+VARIANT_ROOT=${PYENERGY_VARIANT_ROOT:-/opt/pyenergy}
+# Bump when the artifact layout changes, so old artifacts are not reused
+CACHE_FORMAT=1
+JOBS=1
+BUILD_ONLY=0
+OFFLINE=0
+VARIANTS=default
+VARIANT=default
+MAKE_TARGET=profile-opt
+SUFFIX=
+
+if command -v gmake >/dev/null 2>&1; then
+    MAKE=${MAKE:-gmake}
+else
+    MAKE=${MAKE:-make}
+fi
+
+cpu_count() {
+    nproc 2>/dev/null || sysctl -n hw.ncpu 2>/dev/null || echo 1
+}
+
+sha256_of() {
+    if command -v sha256sum >/dev/null 2>&1; then
+        sha256sum "$1" | cut -d' ' -f1
+    else
+        sha256 -q "$1"
+    fi
+}
+
+sha256_of_text() {
+    if command -v sha256sum >/dev/null 2>&1; then
+        printf '%s' "$1" | sha256sum | cut -d' ' -f1
+    else
+        printf '%s' "$1" | sha256 -q
+    fi
+}
+
+os_id() {
+    if [ -r /etc/os-release ]; then
+        (. /etc/os-release && echo "$ID-$VERSION_ID")
+    else
+        uname -sr | tr ' ' '-'
+    fi
+}
+
+libc_id() {
+    if ldd --version 2>&1 | grep -qi musl; then
+        echo "musl-$(ldd --version 2>&1 | sed -n 's/^Version //p')"
+    elif getconf GNU_LIBC_VERSION >/dev/null 2>&1; then
+        getconf GNU_LIBC_VERSION | tr ' ' '-'
+    else
+        # FreeBSD's libc is versioned with the OS
+        echo "libc-$(uname -sr | tr ' ' '-')"
+    fi
+}
+
+# Set CONFIGURE_FLAGS, PREFIX, MAKE_TARGET and the executable SUFFIX for a build variant
+use_variant() {
+    VARIANT=$1
+    CONFIGURE_FLAGS=$BASE_FLAGS
+    PREFIX=$BASE_PREFIX
+    MAKE_TARGET=profile-opt
+    SUFFIX=
+    case $1 in
+        default) return 0 ;;
+        jit) CONFIGURE_FLAGS="$BASE_FLAGS --enable-experimental-jit"; SUFFIX=-jit ;;
+        ft) CONFIGURE_FLAGS="$BASE_FLAGS --disable-gil"; SUFFIX=t ;;
+        nopgo)
+            CONFIGURE_FLAGS=$(echo " $BASE_FLAGS " | sed 's/ --enable-optimizations / /; s/ --with-lto / /; s/^ *//; s/ *$//')
+            MAKE_TARGET=all
+            SUFFIX=-nopgo
+            ;;
+        *) echo "Unknown variant $1" >&2; return 2 ;;
+    esac
+    PREFIX=$VARIANT_ROOT/$1
+}
+
+# Whether a variant can be built for a version (jit and ft need 3.13)
+supports_variant() {
+    case $2 in
+        jit|ft) [ "${1%%.*}" -gt 3 ] || [ "$(echo "$1" | cut -d. -f2)" -ge 13 ] ;;
+        *) return 0 ;;
+    esac
+}
+
+# Tag of the variant in artifact and log names (none for the default build)
+variant_tag() {
+    [ "$VARIANT" = default ] || echo "-$VARIANT"
+}
+
+# Executable of a version in the variant's prefix (free-threaded builds add a t)
+python_bin() {
+    local version=$1
+    if [ "$VARIANT" = ft ]; then
+        echo "$PREFIX/bin/python${version%.*}t"
+    else
+        echo "$PREFIX/bin/python${version%.*}"
+    fi
+}
+
+# Inputs of the cache key of a version, one per line
+key_inputs() {
+    printf 'format %s\nversion %s\nos %s\nlibc %s\narch %s\nconfigure %s\nprefix %s\n' \
+        "$CACHE_FORMAT" "$1" "$(os_id)" "$(libc_id)" "$(uname -m)" "$CONFIGURE_FLAGS" "$PREFIX"
+}
+
+artifact_path() {
+    local key
+    key=$(sha256_of_text "$(key_inputs "$1")" | cut -c1-16)
+    echo "$ARTIFACTS/python-$1$(variant_tag)-$key.tar.gz"
+}
+
+# Local copy of the source tarball of a version, downloaded unless --offline
+fetch_tarball() {
+    local version=$1
+    local tarball="$TARBALLS/Python-$version.tgz"
+    if [ ! -f "$tarball" ]; then
+        if [ "$OFFLINE" = 1 ]; then
+            echo "No $tarball and --offline given" >&2
+            return 1
+        fi
+        mkdir -p "$TARBALLS"
+        local url="https://www.python.org/ftp/python/$version/Python-$version.tgz"
+        if command -v curl >/dev/null 2>&1; then
+            curl -fL -o "$tarball.tmp" "$url" || return 1
+        else
+            fetch -o "$tarball.tmp" "$url" || return 1
+        fi
+        mv "$tarball.tmp" "$tarball"
+    fi
+    echo "$tarball"
+}
+
+installed() {
+    local python_bin
+    python_bin=$(python_bin "$1")
+    [ -x "$python_bin" ] && [ "$($python_bin --version 2>&1)" = "Python $1" ]
+}
+
+# Build a version in the current variant into a staging prefix and store it as an artifact
+build_artifact() {
+    local version=$1
+    local make_jobs=$2
+    local artifact
+    artifact=$(artifact_path "$version")
+    local tarball
+    tarball=$(fetch_tarball "$version") || return 1
+    local work
+    work=$(mktemp -d "${TMPDIR:-/tmp}/pyenergy-build-$version$(variant_tag).XXXXXX")
+
+    tar -xzf "$tarball" -C "$work" || return 1
+    (
+        cd "$work/Python-$version" || exit 1
+        if command -v ccache >/dev/null 2>&1; then
+            export CC="ccache ${CC:-cc}"
+            export CCACHE_DIR=${CCACHE_DIR:-$CACHE_ROOT/ccache}
+        fi
+        # shellcheck disable=SC2086
+        ./configure --prefix="$PREFIX" $CONFIGURE_FLAGS &&
+            $MAKE -j "$make_jobs" "$MAKE_TARGET" &&
+            $MAKE altinstall DESTDIR="$work/stage"
+    ) || { rm -rf "$work"; return 1; }
+
+    mkdir -p "$ARTIFACTS"
+    # Relative paths, so unpacking into / leaves everything outside the prefix alone
+    tar -czf "$artifact.tmp" -C "$work/stage" "${PREFIX#/}" || { rm -rf "$work" "$artifact.tmp"; return 1; }
+    sha256_of "$artifact.tmp" > "$artifact.sha256"
+    key_inputs "$version" > "${artifact%.tar.gz}.txt"
+    mv "$artifact.tmp" "$artifact"
+    rm -rf "$work"
+    echo "Built $artifact"
+}
+
+# Build the missing artifacts of the given version:variant items, $JOBS at a time
+build_missing() {
+    local cpus
+    cpus=$(cpu_count)
+    local make_jobs=$((cpus / JOBS))
+    [ "$make_jobs" -ge 1 ] || make_jobs=1
+    local pids=""
+    local running=0
+    local failed=0
+    local item
+    local version
+    local log
+    mkdir -p "$ARTIFACTS"
+    for item in "$@"; do
+        version=${item%:*}
+        use_variant "${item#*:}" || return 1
+        [ -f "$(artifact_path "$version")" ] && continue
+        [ "$BUILD_ONLY" = 0 ] && installed "$version" && continue
+        log="$ARTIFACTS/build-$version$(variant_tag).log"
+        echo "Building Python $version $VARIANT (log: $log)..."
+        build_artifact "$version" "$make_jobs" > "$log" 2>&1 &
+        pids="$pids $!"
+        running=$((running + 1))
+        if [ "$running" -ge "$JOBS" ]; then
+            for pid in $pids; do
+                wait "$pid" || failed=1
+            done
+            pids=""
+            running=0
+        fi
+    done
+    for pid in $pids; do
+        wait "$pid" || failed=1
+    done
+    return $failed
+}
+
+# Unpack the artifact of a version into the prefix and make sure it has pip and pyperformance
+install_from_artifact() {
+    local version=$1
+    local python_bin
+    python_bin=$(python_bin "$version")
+    if installed "$version"; then
+        echo "Python $version $VARIANT is already installed."
+    else
+        local artifact
+        artifact=$(artifact_path "$version")
+        if [ "$(sha256_of "$artifact")" != "$(cat "$artifact.sha256")" ]; then
+            echo "Checksum mismatch for $artifact; delete it to rebuild" >&2
+            return 1
+        fi
+        echo "Installing Python $version $VARIANT from $artifact..."
+        $SUDO tar -xzf "$artifact" -C / || return 1
+        "$python_bin" -m ensurepip
+        "$python_bin" --version
+    fi
+    if [ "$VARIANT" != default ]; then
+        # Run as e.g. python3.13-jit, next to the default build
+        $SUDO ln -sf "$python_bin" "$BASE_PREFIX/bin/python${version%.*}$SUFFIX" || return 1
+    fi
+
+    if ! "$python_bin" -m pip show pyperformance >/dev/null 2>&1; then
+        echo "Installing pyperformance for $python_bin..."
+        "$python_bin" -m pip install --upgrade pip
+        "$python_bin" -m pip install pyperformance
+    else
+        echo "pyperformance is already installed for $python_bin."
+    fi
+}
+
+install_versions() {
+    local versions=""
+    while [ $# -gt 0 ] && [ "$1" != "--" ]; do
+        case $1 in
+            --build-only) BUILD_ONLY=1 ;;
+            --variants) VARIANTS=$2; shift ;;
+            --jobs) JOBS=$2; shift ;;
+            --offline) OFFLINE=1 ;;
+            --artifacts) ARTIFACTS=$2; shift ;;
+            --tarballs) TARBALLS=$2; shift ;;
+            -*) echo "Unknown option $1" >&2; return 2 ;;
+            *) versions="$versions $1" ;;
+        esac
+        shift
+    done
+    shift
+    [ -n "$versions" ] || versions="$*"
+
+    BASE_FLAGS=$CONFIGURE_FLAGS
+    BASE_PREFIX=$PREFIX
+    local items=""
+    local version
+    local variant
+    for variant in $(echo "$VARIANTS" | tr ',' ' '); do
+        use_variant "$variant" || return 2
+        for version in $versions; do
+            supports_variant "$version" "$variant" && items="$items $version:$variant"
+        done
+    done
+
+    install_dependencies
+    # shellcheck disable=SC2086
+    build_missing $items || { echo "Some builds failed, see $ARTIFACTS/build-*.log" >&2; return 1; }
+    if [ "$BUILD_ONLY" = 1 ]; then
+        echo "Artifacts are in $ARTIFACTS"
+        return 0
+    fi
+    local item
+    for item in $items; do
+        use_variant "${item#*:}"
+        install_from_artifact "${item%:*}" || return 1
+    done
+    echo "Installation complete!"
+}
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Read, pin and restore the CPU frequency policy of the Raspberry Pi.
+
+Run on the Pi by frequency_sweep.py, as root (sudo -n), before and after the
+recording:
+
+    python3 cpufreq.py status
+    python3 cpufreq.py set --governor powersave
+    python3 cpufreq.py set --freq 1200
+    python3 cpufreq.py restore
+
+On Linux the settings are written to every policy under
+/sys/devices/system/cpu/cpufreq: a governor is set with the frequency range
+opened to the hardware limits, a fixed frequency (MHz) by setting
+scaling_min_freq and scaling_max_freq to it under the performance governor.
+On FreeBSD a fixed frequency is set with sysctl dev.cpu.0.freq, with powerd
+stopped, and the "governors" are powerd's modes (adaptive, hiadaptive,
+minimum, maximum), run as powerd -a <mode> -b <mode> -n <mode>.
+
+The first set saves the settings found to --state, and later ones leave that
+file alone, so restore always goes back to the settings the OS image ships
+with, even after an interrupted sweep. Every command prints the resulting
+status as JSON: {"governor": ..., "min": MHz, "max": MHz, "governors": [...],
+"frequencies": [MHz, ...]}. Only the standard library is used.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+STATE_FILE = "cpufreq_state.json"
+POLICY_DIRS = "/sys/devices/system/cpu/cpufreq/policy*"
+# Governor under which a fixed frequency is held on Linux
+FIXED_GOVERNOR = "performance"
+POWERD_MODES = ["adaptive", "hiadaptive", "minimum", "maximum"]
+
+
+class CpufreqError(Exception):
+    '''The requested setting is not available on this board'''
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _write(path, value):
+    with open(path, "w") as f:
+        f.write(str(value))
+
+
+def _sysctl(*args):
+    return subprocess.check_output(["sysctl"] + list(args), text=True).strip()
+
+
+def _powerd_running():
+    return subprocess.call(["pgrep", "-x", "powerd"], stdout=subprocess.DEVNULL) == 0
+
+
+class LinuxPolicy:
+    '''cpufreq policies in sysfs; frequencies in kHz there, in MHz here'''
+
+    def __init__(self):
+        self.dirs = sorted(glob.glob(POLICY_DIRS))
+        if not self.dirs:
+            raise CpufreqError(f"no cpufreq policies in {os.path.dirname(POLICY_DIRS)}")
+
+    def _get(self, name, policy=None):
+        return _read(os.path.join(policy or self.dirs[0], name))
+
+    def status(self):
+        try:
+            frequencies = [int(f) // 1000 for f in self._get("scaling_available_frequencies").split()]
+        except FileNotFoundError:
+            frequencies = []
+        return {"governor": self._get("scaling_governor"),
+                "min": int(self._get("scaling_min_freq")) // 1000,
+                "max": int(self._get("scaling_max_freq")) // 1000,
+                "governors": self._get("scaling_available_governors").split(),
+                "frequencies": sorted(frequencies)}
+
+    def save(self):
+        return {policy: {name: self._get(name, policy)
+                         for name in ("scaling_governor", "scaling_min_freq", "scaling_max_freq")}
+                for policy in self.dirs}
+
+    def _set_range(self, policy, low, high):
+        # Move the bound that keeps min <= max first
+        if int(low) > int(self._get("scaling_max_freq", policy)):
+            _write(os.path.join(policy, "scaling_max_freq"), high)
+            _write(os.path.join(policy, "scaling_min_freq"), low)
+        else:
+            _write(os.path.join(policy, "scaling_min_freq"), low)
+            _write(os.path.join(policy, "scaling_max_freq"), high)
+
+    def set_governor(self, governor):
+        available = self.status()["governors"]
+        if governor not in available:
+            raise CpufreqError(f"governor {governor} not available: {' '.join(available)}")
+        for policy in self.dirs:
+            _write(os.path.join(policy, "scaling_governor"), governor)
+            self._set_range(policy, self._get("cpuinfo_min_freq", policy), self._get("cpuinfo_max_freq", policy))
+
+    def set_frequency(self, mhz):
+        available = self.status()["frequencies"]
+        if available and mhz not in available:
+            raise CpufreqError(f"{mhz} MHz not available: {' '.join(map(str, available))}")
+        for policy in self.dirs:
+            _write(os.path.join(policy, "scaling_governor"), FIXED_GOVERNOR)
+            self._set_range(policy, mhz * 1000, mhz * 1000)
+
+    def restore(self, state):
+        for policy, values in state.items():
+            _write(os.path.join(policy, "scaling_governor"), values["scaling_governor"])
+            self._set_range(policy, values["scaling_min_freq"], values["scaling_max_freq"])
+
+
+class FreeBSDPolicy:
+    '''dev.cpu.0.freq and powerd; frequencies in MHz'''
+
+    def status(self):
+        levels = [int(level.split("/")[0]) for level in _sysctl("-n", "dev.cpu.0.freq_levels").split()]
+        freq = int(_sysctl("-n", "dev.cpu.0.freq"))
+        return {"governor": "powerd" if _powerd_running() else "fixed", "min": freq, "max": freq,
+                "governors": POWERD_MODES, "frequencies": sorted(levels)}
+
+    def save(self):
+        return {"freq": int(_sysctl("-n", "dev.cpu.0.freq")), "powerd": _powerd_running()}
+
+    def _stop_powerd(self):
+        if _powerd_running():
+            subprocess.call(["service", "powerd", "onestop"], stdout=subprocess.DEVNULL)
+            subprocess.call(["pkill", "-x", "powerd"])
+
+    def set_governor(self, governor):
+        if governor not in POWERD_MODES:
+            raise CpufreqError(f"governor {governor} not available: {' '.join(POWERD_MODES)}")
+        self._stop_powerd()
+        subprocess.check_call(["powerd", "-a", governor, "-b", governor, "-n", governor])
+
+    def set_frequency(self, mhz):
+        available = self.status()["frequencies"]
+        if mhz not in available:
+            raise CpufreqError(f"{mhz} MHz not available: {' '.join(map(str, available))}")
+        self._stop_powerd()
+        _sysctl(f"dev.cpu.0.freq={mhz}")
+
+    def restore(self, state):
+        self._stop_powerd()
+        _sysctl(f"dev.cpu.0.freq={state['freq']}")
+        if state["powerd"]:
+            subprocess.call(["service", "powerd", "onestart"], stdout=subprocess.DEVNULL)
+
+
+def policy():
+    return FreeBSDPolicy() if sys.platform.startswith("freebsd") else LinuxPolicy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read, pin and restore the CPU frequency policy')
+    parser.add_argument('command', choices=['status', 'set', 'restore'])
+    parser.add_argument('--governor', help='Governor (powerd mode on FreeBSD) to set')
+    parser.add_argument('--freq', type=int, metavar='MHZ', help='Fixed frequency to set')
+    parser.add_argument('--state', default=STATE_FILE, help='File the original settings are kept in')
+    args = parser.parse_args()
+
+    try:
+        cpu = policy()
+        if args.command == 'set':
+            if (args.governor is None) == (args.freq is None):
+                parser.error("set needs either --governor or --freq")
+            if not os.path.exists(args.state):
+                with open(args.state, "w") as f:
+                    json.dump(cpu.save(), f)
+            if args.freq is not None:
+                cpu.set_frequency(args.freq)
+            else:
+                cpu.set_governor(args.governor)
+        elif args.command == 'restore' and os.path.exists(args.state):
+            with open(args.state) as f:
+                cpu.restore(json.load(f))
+            os.remove(args.state)
+        print(json.dumps(cpu.status()))
+    except (CpufreqError, OSError, subprocess.CalledProcessError) as error:
+        print(f"cpufreq: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
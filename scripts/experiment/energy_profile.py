@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Attribute the energy of a profiled benchmark run to functions and modules.
+
+profiler.py samples the stacks of every Python process of a run on the Pi,
+each sample weighted by the CPU time its process used since the previous
+one. attribute_profile() puts the samples on the Otii recording time axis,
+through the clock offset like the phase markers, and splits the workload
+window (between the 'benchmarks' and 'end' markers) into power windows of
+a fixed length. The energies of all power windows come from one pass over
+the 'mp' samples of the span, read in chunks from the raw trace when there is
+one and from the recording otherwise (window_energies), not from one Otii
+request per window. The energy of a power window is shared among the samples
+that fall into it in proportion to their CPU time, or equally if none used
+any. Windows
+without samples go to the stack "[no samples]". Every sample also gets the
+benchmark of the pyperf worker run it falls into (phases.benchmark_windows),
+or "harness" outside of them.
+
+The result is the energy per (benchmark, folded stack). It is stored in the
+profile table of the results database, and analysis/energy_flamegraph.py
+draws energy flame graphs and differential flame graphs from it.
+"""
+
+import bisect
+
+import numpy as np
+
+from trace_store import DEFAULT_CHUNK_SIZE, load_trace
+
+DEFAULT_WINDOW = 0.1
+NO_SAMPLES = "[no samples]"
+HARNESS = "harness"
+
+
+class BenchmarkLookup:
+    '''Benchmark of a Pi clock time, from the worker runs of benchmark_windows()'''
+
+    def __init__(self, windows):
+        runs = sorted((start, end, name) for name, phase, start, end in windows if phase != "setup")
+        self._starts = [start for start, _, _ in runs]
+        self._runs = runs
+
+    def __call__(self, t):
+        i = bisect.bisect_right(self._starts, t) - 1
+        if i >= 0 and t <= self._runs[i][1]:
+            return self._runs[i][2]
+        return HARNESS
+
+
+def window_energies(recording, device_id, times, trace=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Trapezoidal energy (J) of the 'mp' channel between consecutive recording times, in one pass'''
+    if trace is not None:
+        samples, meta = load_trace(trace[0])
+        timestamp, interval, count = meta["timestamp"], meta["interval"], meta["count"]
+
+        def read(index, n):
+            return samples[index:index + n]
+    else:
+        count = recording.get_channel_data_count(device_id, 'mp')
+        first = recording.get_channel_data(device_id, 'mp', 0, 1) if count else None
+        timestamp, interval = (first["timestamp"], first["interval"]) if first else (0.0, 0.0)
+
+        def read(index, n):
+            return recording.get_channel_data(device_id, 'mp', index, n)["values"]
+    if count < 2 or not interval:
+        return [0.0] * (len(times) - 1)
+    indices = np.clip(np.rint((np.asarray(times) - timestamp) / interval).astype(np.int64), 0, count - 1)
+    # Integral from the first sample of the span up to every index, in samples x interval
+    integral = np.zeros(len(indices))
+    total, last, index = 0.0, None, int(indices[0])
+    while index <= indices[-1]:
+        values = np.asarray(read(index, min(chunk_size, int(indices[-1]) + 1 - index)), dtype=np.float64)
+        if not values.size:
+            break
+        if last is not None:
+            total += (last + values[0]) / 2
+        running = np.concatenate([[total], total + np.cumsum((values[1:] + values[:-1]) / 2)])
+        inside = (indices >= index) & (indices < index + values.size)
+        integral[inside] = running[indices[inside] - index]
+        total, last = running[-1], values[-1]
+        index += values.size
+    integral[indices >= index] = total
+    return list(np.diff(integral) * interval)
+
+
+def attribute_profile(recording, device_id, info, profile, span, windows, to_recording_time,
+                      window=DEFAULT_WINDOW, trace=None):
+    '''Energy of the workload span (Pi clock) per (benchmark, stack): {key: [samples, cpu seconds, energy]}'''
+    start = min(max(to_recording_time(span[0]), info["from"]), info["to"])
+    end = min(max(to_recording_time(span[1]), info["from"]), info["to"])
+    count = max(1, int((end - start) / window + 0.5))
+    length = (end - start) / count
+    benchmark = BenchmarkLookup(windows)
+
+    # Samples of every power window: (benchmark, stack, cpu seconds)
+    binned = [[] for _ in range(count)]
+    for t, cpu, stack, _ in profile["samples"]:
+        i = int((to_recording_time(t) - start) / length) if length > 0 else -1
+        if 0 <= i < count:
+            binned[i].append((benchmark(t), profile["stacks"][stack], cpu))
+
+    energies = window_energies(recording, device_id, [start + i * length for i in range(count + 1)], trace)
+    totals = {}
+    for samples, energy in zip(binned, energies):
+        if not samples:
+            samples = [(HARNESS, NO_SAMPLES, 0.0)]
+        cpu_total = sum(cpu for _, _, cpu in samples)
+        for name, stack, cpu in samples:
+            share = cpu / cpu_total if cpu_total > 0 else 1 / len(samples)
+            total = totals.setdefault((name, stack), [0, 0.0, 0.0])
+            if stack != NO_SAMPLES:
+                total[0] += 1
+            total[1] += cpu
+            total[2] += energy * share
+    return totals
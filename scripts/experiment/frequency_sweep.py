@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+CPU governor and frequency sweep of the benchmarks.
+
+The benchmark runs happen under whatever cpufreq governor the OS image ships
+with, so the frequency policy differs between the OSes and confounds their
+comparison. This sweep runs the benchmarks (run_benchmarks.sh) on every board
+at a list of operating points:
+
+    --governors     cpufreq governors (powerd modes on FreeBSD), with the
+                    frequency range open to the hardware limits
+    --frequencies   fixed frequencies in MHz, with scaling_min_freq and
+                    scaling_max_freq both set to them
+
+Before the recording starts, the worker pins its Pi to the operating point
+with cpufreq.py (run with sudo -n, so the board's user needs passwordless
+sudo for it); the first change saves the original settings on the Pi, and
+they are restored when the worker is done, even after failures. Each run is
+measured like an orchestrator job over SSH: the energy is that of the
+workload window between the PHASE markers. With --telemetry, the mean
+frequency and throttling flags sampled during it are stored with it, so runs
+where the board did not hold the operating point show up.
+
+Runs go to the frequency_runs table of the results database (results_db.py),
+apart from the benchmark runs; runs already in it are skipped, so an
+interrupted sweep resumes where it stopped. analysis/frequency_report.py
+reports energy, duration, energy-delay product (EDP) and ED²P per operating
+point, and the energy-optimal and EDP-optimal operating points per board, OS
+and Python version.
+
+Usage:
+    python3 frequency_sweep.py --matrix matrix.json --frequencies 600 1000 1500 [--simulate]
+    python3 frequency_sweep.py --boards boards.json --versions python3.13 \\
+        --governors ondemand powersave performance --frequencies 600 1200 1500
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+from matrix import VARIANTS, configurations, interpreter, load_matrix
+from orchestrator import (RESULTS_DIR, AppException, JobQueue, SSHTransport, SharedRecording, configure_boards,
+                          paramiko_client, reconnectable, wait_recorded, window_stats)
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+from telemetry import DEFAULT_INTERVAL as TELEMETRY_INTERVAL, summarize
+
+CPUFREQ_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/cpufreq.py"
+# Governor column of the runs at a fixed frequency
+FIXED = "fixed"
+
+
+class FrequencyJob(namedtuple("FrequencyJob", ["rpi", "os", "version", "variant", "governor", "frequency",
+                                               "iteration", "benchmarks"])):
+    '''One benchmark run of the sweep at an operating point on one board'''
+
+    __slots__ = ()
+
+    @property
+    def interpreter(self):
+        return interpreter(self.version, self.variant)
+
+    @property
+    def operating_point(self):
+        return (self.governor, self.frequency)
+
+    def __str__(self):
+        return (f"{self.interpreter} at {operating_point_label(self.governor, self.frequency)}, "
+                f"iteration {self.iteration}")
+
+
+def operating_point_label(governor, frequency):
+    return f"{frequency} MHz" if governor == FIXED else governor
+
+
+def operating_points(governors, frequencies):
+    '''(governor, frequency) of every operating point; the frequency is None under a governor'''
+    return [(g, None) for g in governors] + [(FIXED, f) for f in frequencies]
+
+
+def sweep(entries, versions, variants, points, iterations, benchmarks=None):
+    '''Every run of the sweep, grouped by operating point within an iteration so each board changes its
+    settings once per operating point and iteration'''
+    configs = configurations({"versions": versions, "variants": variants})
+    return [FrequencyJob(e["rpi"], e["os"], version, variant, governor, frequency, i + 1, benchmarks)
+            for i in range(iterations) for governor, frequency in points for version, variant in configs
+            for e in entries]
+
+
+def remaining(db, jobs):
+    '''The runs whose iteration is not yet in the results database'''
+    return [j for j in jobs
+            if db.count_frequency_runs(j.rpi, j.os, j.version, j.variant, j.benchmarks, j.governor,
+                                       j.frequency) < j.iteration]
+
+
+def cpufreq(board, ssh_client, args):
+    '''Run cpufreq.py on the board as root; return the status it prints'''
+    stdin, stdout, stderr = ssh_client.exec_command(f"sudo -n {board.agent_python} {CPUFREQ_SCRIPT} {args}")
+    if stdout.channel.recv_exit_status() != 0:
+        raise AppException(f"{board}: cpufreq.py {args} failed: {stderr.read().decode().strip()}")
+    return json.loads(stdout.read().decode())
+
+
+def set_operating_point(board, ssh_client, governor, frequency):
+    if governor == FIXED:
+        return cpufreq(board, ssh_client, f"set --freq {frequency}")
+    return cpufreq(board, ssh_client, f"set --governor {governor}")
+
+
+def run_point(board, job, transport, shared, otii_lock, db):
+    '''Run the benchmarks once at the board's current operating point and store the run; return its energy,
+    duration, telemetry summary and idle wait'''
+    idle_wait = transport.wait_idle()
+    transport.prepare(job)
+    recording, recording_start = shared.acquire()
+    try:
+        execution = transport.execute(job)
+    finally:
+        shared.release()
+    try:
+        if execution.exit_status != 0:
+            raise AppException(f"{board}: benchmark exited with status {execution.exit_status}: "
+                               f"{execution.stderr.strip()}")
+        if execution.workload is None:
+            raise AppException(f"{board}: benchmark printed no PHASE markers")
+        info = wait_recorded(recording, board.device.id, execution.workload, recording_start, otii_lock)
+        with otii_lock:
+            start, end, statistics = window_stats(recording, board.device.id, info, execution.workload,
+                                                  recording_start)
+    finally:
+        shared.finished(recording)
+    summary = summarize(execution.telemetry["samples"]) if execution.telemetry else None
+    db.insert_frequency_run(job.rpi, job.os, job.version, job.variant, job.benchmarks, job.governor,
+                            job.frequency, job.iteration, start, end, statistics["average"], summary)
+    return statistics["average"] * (end - start), end - start, summary, idle_wait
+
+
+def worker(board, jobs, shared, otii_lock, ssh_factory, failures, db, recover, telemetry):
+    def connect():
+        client = ssh_factory()
+        client.connect(board.hostname, username=board.username, password=board.password)
+        return SSHTransport(board, client, telemetry)
+
+    transport = connect()
+    current = None
+    try:
+        while True:
+            job = jobs.get(board.key)
+            if job is None:
+                return
+            try:
+                if job.operating_point != current:
+                    current = None
+                    status = set_operating_point(board, transport.ssh_client, job.governor, job.frequency)
+                    current = job.operating_point
+                    print(f"[{board}] {operating_point_label(*current)}: governor {status['governor']}, "
+                          f"{status['min']}-{status['max']} MHz")
+                energy, duration, summary, idle_wait = run_point(board, job, transport, shared, otii_lock, db)
+                held = f", mean {summary['freq_mean']:.0f} MHz" if summary and summary["freq_mean"] else ""
+                print(f"[{board}] {job}: {energy:.5f} J in {duration:.2f} s{held} "
+                      f"(waited {idle_wait:.1f} s for the Pi to idle)")
+            except Exception as error:
+                print(f"[{board}] {job}: something went wrong: {error}. Skipping run.")
+                failures.append((board.key, job, str(error)))
+                try:
+                    transport.close()
+                except Exception:
+                    pass
+                recover(board)
+                transport = connect()
+                current = None
+    finally:
+        try:
+            status = cpufreq(board, transport.ssh_client, "restore")
+            print(f"[{board}] Restored governor {status['governor']}, {status['min']}-{status['max']} MHz")
+        except Exception as error:
+            print(f"[{board}] Restoring the frequency settings failed, run cpufreq.py restore on the Pi: {error}")
+        transport.close()
+
+
+def run_sweep(otii, entries, jobs, ssh_factory, results_dir=RESULTS_DIR, recover=reconnectable,
+              telemetry=None):
+    '''Drive every board in its own thread until all runs are measured; return the failures'''
+    os.makedirs(results_dir, exist_ok=True)
+    db = ResultsDB(os.path.join(results_dir, DB_NAME))
+    queue = JobQueue(remaining(db, jobs))
+    print(f"{len(queue)} of {len(jobs)} runs to measure")
+    otii_lock = threading.RLock()
+    with otii_lock:
+        boards = configure_boards(otii, entries)
+        project = otii.get_active_project()
+    shared = SharedRecording(project, otii_lock)
+    failures = []
+    threads = [threading.Thread(target=worker, name=str(board),
+                                args=(board, queue, shared, otii_lock, ssh_factory, failures, db, recover,
+                                      telemetry))
+               for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmarks at a set of CPU governors and frequencies')
+    parser.add_argument('--matrix', help='Matrix spec file; replaces --boards, --versions and --variants')
+    parser.add_argument('--boards', default='boards.json', help='Board configuration file')
+    parser.add_argument('--versions', nargs='+', help='Python executables, e.g. python3.13')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=[DEFAULT_VARIANT],
+                        help='Interpreter build variants to measure of every version (see matrix.py)')
+    parser.add_argument('--governors', nargs='+', default=[], metavar='GOVERNOR',
+                        help='cpufreq governors (powerd modes on FreeBSD) to run under, e.g. ondemand powersave')
+    parser.add_argument('--frequencies', nargs='+', type=int, default=[], metavar='MHZ',
+                        help='Fixed CPU frequencies to run at')
+    parser.add_argument('--iterations', type=int, default=5, help='Iterations per operating point and version')
+    parser.add_argument('--telemetry', type=float, nargs='?', const=TELEMETRY_INTERVAL, default=0, metavar='SECONDS',
+                        help='Sample the CPU frequency, temperature and throttling at this interval '
+                             f'(default {TELEMETRY_INTERVAL}) during every run. Off unless given: the sampler runs '
+                             'on the Pi inside the measured window')
+    parser.add_argument('--results-dir', default=None,
+                        help=f'Directory holding results.db (default {RESULTS_DIR}, '
+                             'or a temporary directory with --simulate)')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Use local stand-ins for the Otii server and the boards')
+    args = parser.parse_args()
+    if not args.governors and not args.frequencies:
+        parser.error("give at least one of --governors and --frequencies")
+
+    if args.simulate:
+        from stand_ins import StandInOtii, StandInSSHClient
+        results_dir = args.results_dir or tempfile.mkdtemp(prefix="simulated_results_")
+        recover = lambda board: 0.0
+    else:
+        from otii_tcp_client import otii_client
+        results_dir = args.results_dir
+        recover = reconnectable
+
+    benchmarks = None
+    if args.matrix:
+        spec = load_matrix(args.matrix)
+        entries, versions, variants = spec["boards"], spec["versions"], spec["variants"]
+        benchmarks = spec["benchmarks"]
+        results_dir = results_dir or spec["results_dir"]
+    elif args.versions:
+        with open(args.boards) as f:
+            entries = json.load(f)
+        versions, variants = args.versions, args.variants
+    else:
+        parser.error("--versions is required without --matrix")
+    results_dir = results_dir or RESULTS_DIR
+    jobs = sweep(entries, versions, variants, operating_points(args.governors, args.frequencies),
+                 args.iterations, benchmarks)
+
+    if args.simulate:
+        connection, ssh_factory = StandInOtii(len(entries)), StandInSSHClient
+    else:
+        connection, ssh_factory = otii_client.OtiiClient().connect(), paramiko_client
+
+    print(f"Writing results to {results_dir}")
+    with connection as otii:
+        failures = run_sweep(otii, entries, jobs, ssh_factory, results_dir, recover, args.telemetry)
+    for board_key, job, error in failures:
+        print(f"Failed: {board_key} {job}: {error}")
+    print(f"Report: python3 ../analysis/frequency_report.py --results-dir {results_dir}")
+
+
+if __name__ == '__main__':
+    main()
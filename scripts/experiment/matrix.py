@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Declarative experiment matrix and a resumable, checkpointed job queue.
+
+A matrix spec (JSON) lists the boards, Python versions, iterations and
+benchmark set of an experiment:
+
+    {
+        "boards": [{"device": "Arc1", "rpi": "RPi4B", "os": "Alpine",
+                    "hostname": "...", "username": "...", "password": "..."}],
+        "versions": ["python3.13", "python3.12", "python3.11", "python3.10", "python3.9"],
+        "variants": ["default", "jit", "ft", "nopgo"],
+        "iterations": 11,
+        "benchmarks": "2to3,chameleon,tornado_http",
+        "order": "interleaved",
+        "seed": 0,
+        "max_attempts": 3
+    }
+
+Each board is one Pi with the OS currently flashed on it; to measure another
+OS, change the board's "os" and run the spec again. Board entries without
+credentials take them from credentials.json. Optional keys: "results_dir"
+(default ../../results) and "checkpoint" (default <spec>.state.json).
+
+"variants" (default ["default"]) adds the interpreter build variant as a
+dimension of the matrix:
+
+    default  the PGO + LTO build the results were measured with so far
+    jit      default build with the experimental JIT (--enable-experimental-jit)
+    ft       free-threaded build (--disable-gil)
+    nopgo    plain build, without PGO and LTO
+
+install_python_<os>.sh --variants builds them; the executable of a variant is
+the version's name with a suffix (python3.13-jit, python3.13t,
+python3.13-nopgo), and is what the benchmarks are run with. The JIT and
+free-threaded builds need Python 3.13, so older versions only get the
+variants they support. The variant is stored with every run and is part of
+the configuration, like the version.
+
+With an "adaptive" section the number of iterations per configuration is no
+longer fixed (see stopping.py):
+
+    "adaptive": {"target": 0.02, "confidence": 0.95,
+                 "min_iterations": 5, "max_iterations": 21}
+
+After every iteration the confidence interval of the configuration's mean
+energy is recomputed from the results database; once its relative half-width
+is at most "target" (after at least "min_iterations"), the configuration's
+remaining jobs are stopped. Each board keeps the budget of the fixed design,
+"iterations" times the number of (version, variant) configurations, and
+spends what stable configurations leave over on the noisy ones, up to
+"max_iterations" each (default "iterations"). The rule, the precision reached and why each
+configuration stopped are stored in the stopping table of the results
+database.
+
+The spec expands into one job per (board, version, variant, iteration). Job
+states are kept in the checkpoint file, which is rewritten atomically on every
+change, so an interrupted run continues where it stopped: jobs that were
+running are run again and iterations already present in the results database
+(or, without one, in the results CSVs) are skipped. A failed job is put back
+at the end of the queue until it has failed max_attempts times. So is a job
+whose run was quarantined as anomalous (anomaly.py): quarantined runs do not
+count as completed iterations.
+
+Run order:
+    sequential   every iteration of a version before the next version
+    interleaved  round-robin over the versions, one iteration at a time
+    random       seeded shuffle, reproducible from "seed"
+Interleaving or shuffling spreads thermal drift and time-of-day effects over
+all versions instead of favouring the ones measured first.
+
+Usage:
+    python3 matrix.py matrix.json            # show the state of the matrix
+    python3 orchestrator.py --matrix matrix.json
+    python3 run_benchmarks.py --matrix matrix.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import threading
+from collections import Counter, namedtuple
+
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+from stopping import StoppingRule
+
+RESULTS_DIR = "../../results"
+RESULTS_FILE = "results_{rpi}_{os}_{version}.csv"
+CREDENTIALS = "credentials.json"
+ORDERS = ("sequential", "interleaved", "random")
+STATES = ("pending", "running", "done", "failed", "stopped")
+
+# Suffix of the executable of each interpreter build variant (install_python_<os>.sh --variants)
+VARIANTS = {DEFAULT_VARIANT: "", "jit": "-jit", "ft": "t", "nopgo": "-nopgo"}
+# Oldest version (major, minor) each variant can be built for
+MIN_VERSIONS = {"jit": (3, 13), "ft": (3, 13)}
+
+
+class Job(namedtuple("Job", ["rpi", "os", "version", "iteration", "benchmarks", "variant"],
+                     defaults=(None, DEFAULT_VARIANT))):
+    '''One iteration of a (board, version, variant) configuration'''
+
+    @property
+    def interpreter(self):
+        return interpreter(self.version, self.variant)
+
+
+class MatrixError(Exception):
+    '''Invalid matrix spec'''
+
+
+def interpreter(version, variant=DEFAULT_VARIANT):
+    '''Executable of a build variant of a version, e.g. python3.13t for ("python3.13", "ft")'''
+    return version + VARIANTS[variant]
+
+
+def supports(version, variant):
+    '''Whether the variant can be built for the version'''
+    m = re.search(r"(\d+)\.(\d+)", version)
+    return not m or (int(m.group(1)), int(m.group(2))) >= MIN_VERSIONS.get(variant, (0, 0))
+
+
+def job_key(job):
+    # Jobs of the default variant keep the keys of checkpoints written before variants existed
+    key = f"{job.rpi}|{job.os}|{job.version}|{job.iteration}"
+    return key if job.variant == DEFAULT_VARIANT else f"{key}|{job.variant}"
+
+
+def results_path(results_dir, rpi, os_name, version, variant=DEFAULT_VARIANT):
+    # Named like the files results_db.py export writes
+    name = version if variant == DEFAULT_VARIANT else f"{version}-{variant}"
+    return os.path.join(results_dir, RESULTS_FILE.format(rpi=rpi, os=os_name, version=name))
+
+
+def load_matrix(path):
+    '''Read and validate a matrix spec, filling in the defaults'''
+    with open(path) as f:
+        spec = json.load(f)
+    for key in ("boards", "versions", "iterations"):
+        if key not in spec:
+            raise MatrixError(f"{path}: missing '{key}'")
+    spec.setdefault("benchmarks", None)
+    spec.setdefault("order", "interleaved")
+    spec.setdefault("seed", 0)
+    spec.setdefault("max_attempts", 3)
+    spec.setdefault("results_dir", RESULTS_DIR)
+    spec.setdefault("checkpoint", os.path.splitext(path)[0] + ".state.json")
+    spec.setdefault("adaptive", None)
+    spec.setdefault("variants", [DEFAULT_VARIANT])
+    unknown = set(spec["variants"]) - set(VARIANTS)
+    if unknown:
+        raise MatrixError(f"{path}: unknown variants {sorted(unknown)}; use {', '.join(VARIANTS)}")
+    if spec["adaptive"] is not None:
+        try:
+            StoppingRule.from_spec(spec["adaptive"], spec["iterations"])
+        except ValueError as error:
+            raise MatrixError(f"{path}: adaptive: {error}")
+    if spec["order"] not in ORDERS:
+        raise MatrixError(f"{path}: order must be one of {', '.join(ORDERS)}")
+    if spec["max_attempts"] < 1:
+        raise MatrixError(f"{path}: max_attempts must be at least 1")
+
+    credentials = None
+    for board in spec["boards"]:
+        if "hostname" not in board:
+            if credentials is None:
+                with open(os.path.join(os.path.dirname(path), CREDENTIALS)) as f:
+                    credentials = json.load(f)
+            for key in ("hostname", "username", "password"):
+                board.setdefault(key, credentials[key])
+    return spec
+
+
+def configurations(spec):
+    '''(version, variant) of every configuration a board measures'''
+    return [(v, variant) for v in spec["versions"] for variant in spec["variants"] if supports(v, variant)]
+
+
+def expand(spec):
+    '''All jobs of a matrix spec in run order'''
+    configs = configurations(spec)
+    rule = stopping_rule(spec)
+    iterations = range(1, (rule.max_iterations if rule else spec["iterations"]) + 1)
+    jobs = []
+    for board in spec["boards"]:
+        if spec["order"] == "sequential":
+            triples = [(v, variant, i) for v, variant in configs for i in iterations]
+        else:
+            triples = [(v, variant, i) for i in iterations for v, variant in configs]
+        jobs.extend(Job(board["rpi"], board["os"], v, i, spec["benchmarks"], variant) for v, variant, i in triples)
+    if spec["order"] == "random":
+        random.Random(spec["seed"]).shuffle(jobs)
+    return jobs
+
+
+def stopping_rule(spec):
+    return StoppingRule.from_spec(spec["adaptive"], spec["iterations"]) if spec.get("adaptive") else None
+
+
+def completed_energies(results_dir, rpi, os_name, version, variant=DEFAULT_VARIANT):
+    '''Energy of every run of a configuration in the results database, or in its CSV without one'''
+    db_path = os.path.join(results_dir, DB_NAME)
+    if os.path.isfile(db_path):
+        return ResultsDB(db_path).run_energies(rpi, os_name, version, variant)
+    try:
+        with open(results_path(results_dir, rpi, os_name, version, variant), newline="") as f:
+            return [float(row[-1]) for row in list(csv.reader(f))[1:] if row]
+    except FileNotFoundError:
+        return []
+
+
+def completed_iterations(results_dir, rpi, os_name, version, variant=DEFAULT_VARIANT):
+    '''Number of runs of a configuration in the results database, or rows in its CSV without one'''
+    return len(completed_energies(results_dir, rpi, os_name, version, variant))
+
+
+class CheckpointedJobQueue:
+    '''Job queue whose job states survive interruption of the orchestrator
+
+    With a stopping rule, the jobs of a configuration are stopped once its
+    energy estimate is precise enough, and a board gets no more jobs once
+    it has used its budget of iterations.
+    '''
+
+    def __init__(self, jobs, checkpoint, results_dir=RESULTS_DIR, max_attempts=3, rule=None, budgets=None):
+        self.checkpoint = checkpoint
+        self.results_dir = results_dir
+        self.max_attempts = max_attempts
+        self.rule = rule
+        self.budgets = dict(budgets or {})
+        self._lock = threading.Lock()
+        self._jobs = list(jobs)
+        self._state = {}
+        try:
+            with open(checkpoint) as f:
+                self._state = json.load(f)
+        except FileNotFoundError:
+            pass
+
+        self._energies = {}
+        self._decisions = {}
+        for job in self._jobs:
+            config = _config(job)
+            if config not in self._energies:
+                self._energies[config] = completed_energies(results_dir, *config)
+                if rule:
+                    self._decisions[config] = rule.decide(self._energies[config])
+            state = self._state.setdefault(job_key(job), {"status": "pending", "attempts": 0})
+            if job.iteration <= len(self._energies[config]):
+                state["status"] = "done"
+            elif state["status"] in ("running", "stopped"):
+                # Stopped jobs are re-evaluated below, so a tighter rule reopens them
+                state["status"] = "pending"
+        self._pending = [job for job in self._jobs if self._status(job) == "pending"]
+        for config in self._decisions:
+            self._apply_decision(config)
+        for board_key in self.budgets:
+            self._apply_budget(board_key)
+        self._save()
+
+    def _status(self, job):
+        return self._state[job_key(job)]["status"]
+
+    def _save(self):
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.checkpoint)
+
+    def _stop_pending(self, select, reason):
+        keep = []
+        for job in self._pending:
+            if select(job):
+                self._state[job_key(job)].update(status="stopped", error=reason)
+            else:
+                keep.append(job)
+        self._pending = keep
+
+    def _apply_decision(self, config):
+        stop, reason, _ = self._decisions[config]
+        if stop:
+            self._stop_pending(lambda job: _config(job) == config, reason)
+
+    def _apply_budget(self, board_key):
+        '''Stop the board's remaining jobs once its runs (done or running) use up its budget'''
+        used = sum(len(energies) for config, energies in self._energies.items() if config[:2] == board_key)
+        used += sum(1 for job in self._jobs if (job.rpi, job.os) == board_key and self._status(job) == "running")
+        if used < self.budgets[board_key]:
+            return
+        self._stop_pending(lambda job: (job.rpi, job.os) == board_key, "budget used up")
+        for config, (stop, _, estimate) in list(self._decisions.items()):
+            if config[:2] == board_key and not stop:
+                self._decisions[config] = (True, "budget used up", estimate)
+
+    def get(self, board_key=None):
+        '''Next pending job (for a board, if given), or None when there is none'''
+        with self._lock:
+            for i, job in enumerate(self._pending):
+                if board_key is None or (job.rpi, job.os) == tuple(board_key):
+                    del self._pending[i]
+                    self._state[job_key(job)]["status"] = "running"
+                    if (job.rpi, job.os) in self.budgets:
+                        self._apply_budget((job.rpi, job.os))
+                    self._save()
+                    return job
+            return None
+
+    def done(self, job):
+        with self._lock:
+            self._state[job_key(job)].update(status="done", error=None)
+            if self.rule:
+                self._update_estimate(_config(job))
+            self._save()
+
+    def _update_estimate(self, config):
+        '''Re-read the configuration's energies, apply the stopping rule and record it'''
+        self._energies[config] = completed_energies(self.results_dir, *config)
+        self._decisions[config] = self.rule.decide(self._energies[config])
+        self._apply_decision(config)
+        changed = {config}
+        if config[:2] in self.budgets:
+            self._apply_budget(config[:2])
+            # Including configurations stopped by the budget when another job started
+            changed.update(c for c, (_, reason, _) in self._decisions.items()
+                           if c[:2] == config[:2] and reason == "budget used up")
+        db_path = os.path.join(self.results_dir, DB_NAME)
+        if os.path.isfile(db_path):
+            db = ResultsDB(db_path)
+            for rpi, os_name, version, variant in sorted(changed):
+                _, reason, estimate = self._decisions[(rpi, os_name, version, variant)]
+                db.record_stopping(rpi, os_name, version, self.rule, estimate, reason, variant)
+
+    def decisions(self):
+        '''{(rpi, os, version, variant): (stop, reason, precision)} under the stopping rule'''
+        with self._lock:
+            return dict(self._decisions)
+
+    def failed(self, job, error):
+        '''Record a failure; return True if the job was put back in the queue'''
+        with self._lock:
+            state = self._state[job_key(job)]
+            state["attempts"] += 1
+            state["error"] = error
+            retry = state["attempts"] < self.max_attempts
+            state["status"] = "pending" if retry else "failed"
+            if retry:
+                self._pending.append(job)
+            self._save()
+            return retry
+
+    def quarantined(self, job, reason):
+        '''Record that the job's run was quarantined; return True if the job was put back in the queue'''
+        with self._lock:
+            state = self._state[job_key(job)]
+            state["quarantined"] = state.get("quarantined", 0) + 1
+            state["error"] = f"quarantined: {reason}"
+            retry = state["quarantined"] < self.max_attempts
+            state["status"] = "pending" if retry else "failed"
+            if retry:
+                self._pending.append(job)
+            self._save()
+            return retry
+
+    def counts(self):
+        with self._lock:
+            return Counter(self._status(job) for job in self._jobs)
+
+    def failures(self):
+        '''(job, attempts, last error) of every job that has given up'''
+        with self._lock:
+            return [(job, self._state[job_key(job)]["attempts"], self._state[job_key(job)].get("error"))
+                    for job in self._jobs if self._status(job) == "failed"]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+def _config(job):
+    return (job.rpi, job.os, job.version, job.variant)
+
+
+def matrix_queue(spec):
+    rule = stopping_rule(spec)
+    # Adaptive runs keep the cost of the fixed design per board
+    budgets = None
+    if rule:
+        budgets = {(b["rpi"], b["os"]): spec["iterations"] * len(configurations(spec)) for b in spec["boards"]}
+    return CheckpointedJobQueue(expand(spec), spec["checkpoint"], spec["results_dir"], spec["max_attempts"],
+                                rule, budgets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the progress of an experiment matrix')
+    parser.add_argument('matrix', help='Matrix spec file')
+    parser.add_argument('--reset-failed', action='store_true',
+                        help='Give failed jobs another max_attempts attempts and quarantines')
+    args = parser.parse_args()
+
+    spec = load_matrix(args.matrix)
+    if args.reset_failed and os.path.isfile(spec["checkpoint"]):
+        with open(spec["checkpoint"]) as f:
+            state = json.load(f)
+        for job_state in state.values():
+            if job_state["status"] == "failed":
+                job_state.update(status="pending", attempts=0, quarantined=0)
+        with open(spec["checkpoint"], "w") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+
+    queue = matrix_queue(spec)
+    counts = queue.counts()
+    print(f"{sum(counts.values())} jobs: " + ", ".join(f"{counts[s]} {s}" for s in STATES))
+    for job, attempts, error in queue.failures():
+        print(f"Failed after {attempts} attempts: {job_key(job)}: {error}")
+    for (rpi, os_name, version, variant), (stop, reason, estimate) in sorted(queue.decisions().items()):
+        print(f"{rpi}|{os_name}|{interpreter(version, variant)}: {estimate.n} iterations, "
+              f"±{100 * estimate.relative:.2f} % at {100 * queue.rule.confidence:g} % confidence ({reason})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+Run the benchmarks on several (Otii device, Raspberry Pi) pairs at the same time.
+
+Every board gets its own worker thread and SSH session and is measured on its
+own Otii device channel. Workers take jobs for their board from one shared job
+queue. The Otii project records all devices in one recording, so the recording
+is started when the first worker begins measuring and stopped when the last
+one finishes; each job's energy comes from get_channel_statistics over its own
+time window on its own device. All calls into the Otii client go through one
+lock, as the client talks over a single TCP connection. Results go to the
+results database (results_db.py), which takes inserts from all workers. The
+pyperf JSON of every job is fetched from the board and the job's energy is
+split per benchmark and phase (phases.py) as in run_benchmarks.py.
+
+There are no fixed pauses between iterations: a job starts once its Pi is idle
+again, and after a failure the worker waits for the Pi to accept SSH
+connections and reconnects (see settle.py). The waits are logged per
+iteration in overhead.csv in the results directory.
+
+Before the recording starts, every job makes sure the board has a cached
+pyperformance venv for its interpreter and benchmark set
+(run_benchmarks.sh --prepare), so venv creation and dependency installs stay
+out of the measurements. --prepare builds all of them up front and exits.
+
+With --transport agent the workload is not started through SSH but by a
+resident agent on the Pi (agent.py), launched over SSH once per batch, so the
+SSH handshake and shell start-up stay out of the measured window. Both
+transports log the energy of the request window and of the workload window
+of every job to harness_overhead.csv (report: analysis/harness_overhead.py).
+
+With --telemetry, the Pi samples its CPU frequency, temperature, throttling
+flags and load during every run (telemetry.py; in-process with the agent, as
+a wrapper of run_benchmarks.sh over SSH). The samples are fetched after the
+run, put on the Otii time axis and stored with the run in the results
+database, together with the sampler's own CPU time. It is off by default, as
+the sampler runs inside the measured window; runs with telemetry are the ones
+with rows in run_telemetry.
+
+Every stored run is checked for outliers against the earlier runs of its
+configuration, for drift over the batch and for throttling (anomaly.py).
+Flagged runs are quarantined in the results database and their job is put
+back in the queue.
+
+With --archive-recordings DIR, every recording is exported to compressed
+files once all jobs measured in it have their statistics, and archived
+recordings are deleted from the Otii project except the newest
+--keep-recordings and those holding quarantined runs (recording_archive.py).
+
+Usage:
+    python3 orchestrator.py --matrix matrix.json [--simulate]
+    python3 orchestrator.py --boards boards.json --versions python3.13 python3.12 --iterations 11
+    python3 orchestrator.py --boards boards.json --versions python3.13 --simulate
+    python3 orchestrator.py --boards boards.json --versions python3.13 --variants default jit ft
+
+Jobs of a build variant other than the default (--variants or the matrix's
+"variants", see matrix.py) run the variant's executable, e.g. python3.13t,
+and their runs are stored with the variant.
+
+With --matrix the jobs come from a matrix spec and their states are
+checkpointed, so an interrupted run resumes where it stopped (see matrix.py).
+
+boards.json holds one entry per board:
+    [{"device": "Arc1", "rpi": "RPi4B", "os": "Alpine",
+      "hostname": "...", "username": "...", "password": "..."}]
+"device" is the Otii device name; without it devices are assigned in order.
+Optional "agent_port" and "agent_python" set how the agent is started.
+"""
+
+import argparse
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+
+from agent import PORT as AGENT_PORT, TOKEN_FILE as AGENT_TOKEN_FILE, AgentClient
+from anomaly import THRESHOLD as OUTLIER_THRESHOLD, AnomalyDetector
+from recording_archive import DEFAULT_CHANNELS as ARCHIVE_CHANNELS, KEEP_LAST, RecordingArchiver
+
+from matrix import VARIANTS, Job, configurations, interpreter, load_matrix, matrix_queue
+from phases import attribute_energy, benchmark_windows, estimate_clock_offset, parse_markers
+from results_csv import (HARNESS_FILE, HARNESS_HEADERS, OVERHEAD_FILE, OVERHEAD_HEADERS, append_result_row,
+                         harness_row, overhead_row, result_row)
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+from settle import FINALIZE_TIMEOUT, ssh_reachable, wait_pi_idle, wait_ssh_reachable, wait_until
+from telemetry import DEFAULT_INTERVAL as TELEMETRY_INTERVAL, describe_telemetry, store_telemetry
+
+COMMAND = "bash Python_Application_Energy_Consumption/scripts/experiment/run_benchmarks.sh "
+RESULTS_DIR = "../../results"
+AGENT_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/agent.py"
+# Seconds between a run request and the agreed start of the workload
+AGENT_LEAD = 0.5
+AGENT_START_TIMEOUT = 30
+TELEMETRY_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/telemetry.py"
+TELEMETRY_FILE = "telemetry.json"
+
+
+class AppException(Exception):
+    '''Application Exception'''
+
+
+class Board:
+    '''One Raspberry Pi and the Otii device measuring it'''
+
+    def __init__(self, device, rpi, os, hostname, username, password,
+                 agent_port=AGENT_PORT, agent_python="python3"):
+        self.device = device
+        self.rpi = rpi
+        self.os = os
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.agent_port = agent_port
+        self.agent_python = agent_python
+
+    @property
+    def key(self):
+        return (self.rpi, self.os)
+
+    def __str__(self):
+        return f"{self.rpi}/{self.os}@{self.hostname}"
+
+
+class JobQueue:
+    '''Shared queue of jobs, handed out per board'''
+
+    def __init__(self, jobs=(), max_attempts=3):
+        self._jobs = list(jobs)
+        self._cond = threading.Condition()
+        self.max_attempts = max_attempts
+        self._quarantined = Counter()
+
+    def put(self, job):
+        with self._cond:
+            self._jobs.append(job)
+            self._cond.notify_all()
+
+    def get(self, board_key):
+        '''Next job for a board, or None when the queue holds none for it'''
+        with self._cond:
+            for i, job in enumerate(self._jobs):
+                if (job.rpi, job.os) == board_key:
+                    return self._jobs.pop(i)
+            return None
+
+    def done(self, job):
+        pass
+
+    def failed(self, job, error):
+        '''Record a failure; return True if the job was put back in the queue'''
+        return False
+
+    def quarantined(self, job, reason):
+        '''Put a job whose run was quarantined back in the queue, up to max_attempts times'''
+        with self._cond:
+            self._quarantined[job] += 1
+            if self._quarantined[job] >= self.max_attempts:
+                return False
+            self._jobs.append(job)
+            self._cond.notify_all()
+            return True
+
+    def __len__(self):
+        with self._cond:
+            return len(self._jobs)
+
+
+class SharedRecording:
+    '''Reference-counted Otii recording shared by all workers
+
+    With an archiver, a recording is archived and pruned from the project once
+    every job measured in it has called finished().
+    '''
+
+    def __init__(self, project, otii_lock, archiver=None, device_ids=()):
+        self._project = project
+        self._otii_lock = otii_lock
+        self._archiver = archiver
+        self._device_ids = list(device_ids)
+        self._lock = threading.Lock()
+        self._users = 0
+        self._recording = None
+        self._start = None
+        # recording -> [jobs not finished with it, run ids measured in it]
+        self._jobs = {}
+
+    def acquire(self):
+        '''Make sure a recording is running; return it and its local start time'''
+        with self._lock:
+            if self._users == 0:
+                with self._otii_lock:
+                    self._project.start_recording()
+                    self._start = time.time()
+                    self._recording = self._project.get_last_recording()
+                self._jobs[self._recording] = [0, []]
+            self._users += 1
+            self._jobs[self._recording][0] += 1
+            return self._recording, self._start
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0:
+                with self._otii_lock:
+                    self._project.stop_recording()
+
+    def finished(self, recording, run_id=None):
+        '''A job is done reading the recording; archive the recording once no job needs it any more'''
+        with self._lock:
+            entry = self._jobs[recording]
+            entry[0] -= 1
+            if run_id is not None:
+                entry[1].append(run_id)
+            if entry[0] > 0:
+                return
+            del self._jobs[recording]
+        if self._archiver is None:
+            return
+        name = f"recording_{time.strftime('%Y%m%dT%H%M%S')}"
+        try:
+            path, deleted = self._archiver.archive_and_prune(recording, name, self._device_ids, entry[1],
+                                                              self._otii_lock)
+            print(f"Archived the recording of runs {entry[1]} to {path}, "
+                  f"deleted {deleted} archived recordings from the project")
+        except Exception as error:
+            print(f"Archiving the recording of runs {entry[1]} failed, it stays in the project: {error}")
+
+
+def paramiko_client():
+    import paramiko
+    ssh_client = paramiko.SSHClient()
+    ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    return ssh_client
+
+
+Execution = namedtuple("Execution", ["exit_status", "stderr", "request", "workload", "telemetry", "windows"],
+                       defaults=(None, None))
+
+
+class SSHTransport:
+    '''Runs run_benchmarks.sh through an SSH exec channel during the recording
+
+    The measured window spans the whole exec_command call, including the SSH
+    channel set-up and the shell start-up. The workload window is taken from
+    the PHASE markers the script prints, the benchmark windows from them and
+    the pyperf JSON fetched over SFTP after the run. With a telemetry interval
+    the script runs under telemetry.py, and the samples are fetched after the run.
+    '''
+
+    name = "ssh"
+
+    def __init__(self, board, ssh_client, telemetry=None):
+        self.board = board
+        self.ssh_client = ssh_client
+        self.telemetry = telemetry
+        self.clock_offset = 0.0
+
+    def wait_idle(self):
+        return wait_pi_idle(self.ssh_client)
+
+    def prepare(self, job):
+        prepare_venv(self.ssh_client, job.interpreter, job.benchmarks)
+        stdin, stdout, stderr = self.ssh_client.exec_command(f"rm -f {job.interpreter}.json")
+        stdout.channel.recv_exit_status()
+        self.clock_offset = estimate_clock_offset(self.ssh_client, job.interpreter)
+
+    def execute(self, job):
+        t0 = time.time()
+        command = COMMAND + job.interpreter + (f" {job.benchmarks}" if job.benchmarks else "")
+        if self.telemetry:
+            command = (f"{self.board.agent_python} {TELEMETRY_SCRIPT} --interval {self.telemetry} "
+                       f"--out {TELEMETRY_FILE} -- {command}")
+        stdin, stdout, stderr = self.ssh_client.exec_command(command)
+        exit_status = stdout.channel.recv_exit_status()
+        t1 = time.time()
+        markers, utc_offset = parse_markers(stdout.read().decode().splitlines())
+        workload = None
+        begin = markers.get("setup", markers.get("benchmarks"))
+        if begin is not None and "end" in markers:
+            workload = (begin - self.clock_offset, markers["end"] - self.clock_offset)
+        pyperf = self.fetch_pyperf(job) if exit_status == 0 else None
+        windows = benchmark_windows(pyperf, markers, utc_offset) if pyperf else None
+        return Execution(exit_status, stderr.read().decode(), (t0, t1), workload, self.fetch_telemetry(), windows)
+
+    def fetch_pyperf(self, job):
+        '''The pyperf JSON of the run, removed from the board; None if the run wrote none'''
+        with self.ssh_client.open_sftp() as sftp:
+            try:
+                with sftp.open(f"{job.interpreter}.json") as f:
+                    pyperf = json.loads(f.read())
+            except IOError as error:
+                print(f"[{self.board}] No pyperf results: {error}")
+                return None
+            sftp.remove(f"{job.interpreter}.json")
+        return pyperf
+
+    def fetch_telemetry(self):
+        if not self.telemetry:
+            return None
+        stdin, stdout, stderr = self.ssh_client.exec_command(f"cat {TELEMETRY_FILE} && rm -f {TELEMETRY_FILE}")
+        if stdout.channel.recv_exit_status() != 0:
+            print(f"[{self.board}] No telemetry: {stderr.read().decode().strip()}")
+            return None
+        return json.loads(stdout.read().decode())
+
+    def measured(self, execution):
+        return execution.request
+
+    def close(self):
+        self.ssh_client.close()
+
+
+class AgentTransport(SSHTransport):
+    '''Runs the workload through the resident agent on the Pi (agent.py)
+
+    The agent starts the workload at an agreed time and reports when it
+    started and finished, so only the workload lies in the measured window.
+    The pyperf JSON of the run comes back with the reply.
+    '''
+
+    name = "agent"
+
+    def __init__(self, board, ssh_client, agent, telemetry=None):
+        super().__init__(board, ssh_client, telemetry)
+        self.agent = agent
+
+    def wait_idle(self):
+        return wait_pi_idle(self.agent, probe=lambda agent: agent.cpu_idle())
+
+    def prepare(self, job):
+        reply = self.agent.prepare(job.interpreter, job.benchmarks)
+        if reply["exit_status"] != 0:
+            raise AppException(f"preparing the venv for {job.interpreter} failed: {reply['stderr'].strip()}")
+        self.clock_offset = self.agent.clock_offset()
+
+    def execute(self, job):
+        # The request window starts at the agreed start, leaving out the deliberate lead
+        start_at = time.time() + AGENT_LEAD
+        reply = self.agent.run(job.interpreter, job.benchmarks, start_at=start_at + self.clock_offset,
+                               telemetry=self.telemetry)
+        t1 = time.time()
+        workload = (reply["started"] - self.clock_offset, reply["finished"] - self.clock_offset)
+        markers, utc_offset = parse_markers(reply["stdout"].splitlines())
+        windows = benchmark_windows(reply["pyperf"], markers, utc_offset) if reply.get("pyperf") else None
+        return Execution(reply["exit_status"], reply["stderr"], (start_at, t1), workload, reply.get("telemetry"),
+                         windows)
+
+    def measured(self, execution):
+        return execution.workload
+
+    def close(self):
+        try:
+            self.agent.shutdown()
+            self.agent.close()
+        finally:
+            super().close()
+
+
+def prepare_venv(ssh_client, version, benchmarks=None):
+    '''Build the cached pyperformance venv on the board unless it exists; return its path'''
+    command = COMMAND + "--prepare " + version + (f" {benchmarks}" if benchmarks else "")
+    stdin, stdout, stderr = ssh_client.exec_command(command)
+    if stdout.channel.recv_exit_status() != 0:
+        raise AppException(f"preparing the venv for {version} failed: {stderr.read().decode().strip()}")
+    for line in stdout.read().decode().splitlines():
+        if line.startswith("VENV "):
+            return line[len("VENV "):]
+    return None
+
+
+def prepare_boards(entries, versions, benchmarks, ssh_factory):
+    '''Prepare the venvs of every version on every board, one thread per board'''
+    errors = []
+
+    def prepare(entry):
+        ssh_client = ssh_factory()
+        ssh_client.connect(entry["hostname"], username=entry["username"], password=entry["password"])
+        try:
+            for version in versions:
+                try:
+                    venv = prepare_venv(ssh_client, version, benchmarks)
+                    print(f"[{entry['rpi']}/{entry['os']}] {version}: {venv}")
+                except AppException as error:
+                    errors.append(str(error))
+                    print(f"[{entry['rpi']}/{entry['os']}] {error}")
+        finally:
+            ssh_client.close()
+
+    threads = [threading.Thread(target=prepare, args=(entry,)) for entry in entries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def launch_agent(board, ssh_client, token, versions=()):
+    '''Start agent.py on the board over SSH and connect to it'''
+    # The token goes through stdin into a file only the user can read, never on a command line
+    stdin, stdout, stderr = ssh_client.exec_command(f"umask 077 && cat > {AGENT_TOKEN_FILE}")
+    stdin.write(token)
+    stdin.flush()
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise AppException(f"{board}: writing the agent token failed: {stderr.read().decode().strip()}")
+    command = (f"nohup {board.agent_python} {AGENT_SCRIPT} --port {board.agent_port} "
+               f"--token-file {AGENT_TOKEN_FILE} --versions {' '.join(versions)} > agent.log 2>&1 &")
+    stdin, stdout, stderr = ssh_client.exec_command(command)
+    stdout.channel.recv_exit_status()
+    ok, _ = wait_until(lambda: ssh_reachable(board.hostname, board.agent_port), AGENT_START_TIMEOUT)
+    if not ok:
+        raise AppException(f"{board}: agent did not start, see agent.log on the board")
+    return AgentClient(board.hostname, board.agent_port, token)
+
+
+def wait_recorded(recording, device_id, window, recording_start, otii_lock, timeout=FINALIZE_TIMEOUT):
+    '''Poll the channel info until the recording reaches the end of a local-time window; return the info'''
+    latest = {}
+
+    def recorded():
+        with otii_lock:
+            latest["info"] = info = recording.get_channel_info(device_id, 'mp')
+        return info["to"] >= window[1] - recording_start + info["from"]
+
+    ok, _ = wait_until(recorded, timeout)
+    if not ok:
+        raise AppException(f"the recording did not reach the end of the window after {timeout} s")
+    return latest["info"]
+
+
+def window_stats(recording, device_id, info, window, recording_start):
+    '''Map a local-time window onto the recording; return (start, end, statistics)'''
+    start = max(info["from"], window[0] - recording_start + info["from"])
+    end = window[1] - recording_start + info["from"]
+    if end > info["to"]:
+        raise AppException(f"the window ends {end - info['to']:.3f} s after the recorded data")
+    return start, end, recording.get_channel_statistics(device_id, 'mp', start, end)
+
+
+def run_job(board, job, transport, shared, otii_lock, results_dir, db, detector=None):
+    '''Run one benchmark iteration on a board; return its results row, the idle wait and the
+    reasons the run was quarantined (empty if it was accepted)'''
+    idle_wait = transport.wait_idle()
+    transport.prepare(job)
+    recording, recording_start = shared.acquire()
+    try:
+        execution = transport.execute(job)
+    finally:
+        shared.release()
+    run_id = None
+    try:
+        row, reasons, run_id = measure_job(board, job, transport, execution, recording, recording_start,
+                                           otii_lock, results_dir, db, detector)
+    finally:
+        shared.finished(recording, run_id)
+    return row, idle_wait, reasons
+
+
+def measure_job(board, job, transport, execution, recording, recording_start, otii_lock, results_dir, db,
+                detector=None):
+    '''Take the energy of a finished job from the recording and store it; return its results row,
+    the reasons it was quarantined and its run id'''
+    if execution.exit_status != 0:
+        raise AppException(f"{board}: benchmark exited with status {execution.exit_status}: "
+                           f"{execution.stderr.strip()}")
+
+    # The request window ends last; the recording may still be catching up with it
+    info = wait_recorded(recording, board.device.id, execution.request, recording_start, otii_lock)
+    with otii_lock:
+        start, end, statistics_mp = window_stats(recording, board.device.id, info,
+                                                 transport.measured(execution), recording_start)
+        harness = None
+        if execution.workload is not None:
+            harness = (window_stats(recording, board.device.id, info, execution.request, recording_start),
+                       window_stats(recording, board.device.id, info, execution.workload, recording_start))
+        # Per-benchmark and per-phase energy; the harness phase is the rest of the measured window
+        totals = None
+        if execution.windows:
+            totals = attribute_energy(recording, board.device.id, dict(info, **{"from": start, "to": end}),
+                                      execution.windows,
+                                      lambda t: t - transport.clock_offset - recording_start + info["from"])
+
+    duration = end - start
+    window = dict(info, **{"from": round(start, 5), "to": round(end, 5)})
+    row = result_row(window, statistics_mp, duration, statistics_mp["average"] * duration)
+    run_id = db.insert_run(job.rpi, job.os, job.version, row, job.benchmarks, job.variant)
+    if totals:
+        db.insert_phases(run_id, totals)
+    summary = None
+    if execution.telemetry:
+        summary = store_telemetry(db, run_id, execution.telemetry,
+                                  lambda t: t - transport.clock_offset - recording_start + info["from"])
+        print(f"[{board}] telemetry: {describe_telemetry(summary, execution.telemetry)}")
+    reasons = (detector.check(db, run_id, job.rpi, job.os, job.version, row, summary, job.variant)
+               if detector else [])
+    if harness is not None:
+        (r0, r1, request_stats), (w0, w1, workload_stats) = harness
+        append_result_row(os.path.join(results_dir, HARNESS_FILE),
+                          harness_row(board.rpi, board.os, job.interpreter, transport.name,
+                                      r1 - r0, request_stats["average"] * (r1 - r0),
+                                      w1 - w0, workload_stats["average"] * (w1 - w0)),
+                          HARNESS_HEADERS)
+    return row, reasons, run_id
+
+
+def worker(board, jobs, shared, otii_lock, ssh_factory, failures, results_dir, recover, transport_factory, db,
+           detector=None):
+    def connect():
+        client = ssh_factory()
+        client.connect(board.hostname, username=board.username, password=board.password)
+        return transport_factory(board, client)
+
+    overhead_file = os.path.join(results_dir, os.path.basename(OVERHEAD_FILE))
+    transport = connect()
+    try:
+        while True:
+            job = jobs.get(board.key)
+            if job is None:
+                return
+            print(f"[{board}] {job.interpreter} iteration {job.iteration}")
+            try:
+                row, idle_wait, reasons = run_job(board, job, transport, shared, otii_lock, results_dir, db,
+                                                  detector)
+                if reasons:
+                    reason = "; ".join(reasons)
+                    if jobs.quarantined(job, reason):
+                        print(f"[{board}] {job.interpreter} iteration {job.iteration}: {row[-1]} J quarantined "
+                              f"({reason}). Retrying later.")
+                    else:
+                        print(f"[{board}] {job.interpreter} iteration {job.iteration}: {row[-1]} J quarantined "
+                              f"({reason}). Skipping iteration.")
+                        failures.append((board.key, job, f"quarantined: {reason}"))
+                else:
+                    jobs.done(job)
+                    print(f"[{board}] {job.interpreter} iteration {job.iteration}: {row[-1]} J "
+                          f"(waited {idle_wait:.1f} s for the Pi to idle)")
+                append_result_row(overhead_file, overhead_row(board.rpi, board.os, job.interpreter, idle_wait),
+                                  OVERHEAD_HEADERS)
+            except Exception as error:
+                if jobs.failed(job, str(error)):
+                    print(f"[{board}] Something went wrong: {error}. Retrying later.")
+                else:
+                    print(f"[{board}] Something went wrong: {error}. Skipping iteration.")
+                    failures.append((board.key, job, str(error)))
+                try:
+                    transport.close()
+                except Exception:
+                    pass
+                recovery_wait = recover(board)
+                append_result_row(overhead_file, overhead_row(board.rpi, board.os, job.interpreter,
+                                                              recovery_wait=recovery_wait), OVERHEAD_HEADERS)
+                transport = connect()
+    finally:
+        transport.close()
+
+
+def configure_boards(otii, entries):
+    '''Pair each boards.json entry with its Otii device and configure the device'''
+    devices = otii.get_devices()
+    if len(devices) < len(entries):
+        raise AppException(f"{len(entries)} boards configured but {len(devices)} Otii devices connected")
+    by_name = {d.name: d for d in devices}
+    boards = []
+    for i, entry in enumerate(entries):
+        device = by_name[entry["device"]] if "device" in entry else devices[i]
+        device.set_main_voltage(5.1)
+        device.set_exp_voltage(4.9)
+        device.set_max_current(2.5)
+        device.enable_channel('mp', True)
+        device.enable_channel('mc', True)
+        boards.append(Board(device, entry["rpi"], entry["os"],
+                            entry["hostname"], entry["username"], entry["password"],
+                            entry.get("agent_port", AGENT_PORT), entry.get("agent_python", "python3")))
+    return boards
+
+
+def reconnectable(board):
+    '''Wait until the board accepts SSH connections; return the seconds waited'''
+    return wait_ssh_reachable(board.hostname)
+
+
+def run_parallel(otii, entries, jobs, ssh_factory, results_dir=RESULTS_DIR, recover=reconnectable,
+                 transport_factory=SSHTransport, outlier_threshold=OUTLIER_THRESHOLD, archiver=None):
+    '''Drive every board in its own thread until the job queue is drained'''
+    os.makedirs(results_dir, exist_ok=True)
+    db = ResultsDB(os.path.join(results_dir, DB_NAME))
+    detector = AnomalyDetector(outlier_threshold) if outlier_threshold else None
+    otii_lock = threading.RLock()
+    with otii_lock:
+        boards = configure_boards(otii, entries)
+        project = otii.get_active_project()
+    shared = SharedRecording(project, otii_lock, archiver, [board.device.id for board in boards])
+    failures = []
+    threads = [threading.Thread(target=worker, name=str(board),
+                                args=(board, jobs, shared, otii_lock, ssh_factory, failures,
+                                      results_dir, recover, transport_factory, db, detector))
+               for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failures
+
+
+def build_jobs(entries, versions, iterations, variants=(DEFAULT_VARIANT,)):
+    '''Jobs for every board, interleaving versions so boards finish together'''
+    configs = configurations({"versions": versions, "variants": variants})
+    return JobQueue(Job(e["rpi"], e["os"], version, i + 1, variant=variant)
+                    for i in range(iterations) for version, variant in configs for e in entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmarks on several boards in parallel')
+    parser.add_argument('--matrix',
+                        help='Matrix spec file; replaces --boards, --versions, --variants and --iterations')
+    parser.add_argument('--boards', default='boards.json', help='Board configuration file')
+    parser.add_argument('--versions', nargs='+', help='Python executables, e.g. python3.13')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=[DEFAULT_VARIANT],
+                        help='Interpreter build variants to measure of every version (see matrix.py)')
+    parser.add_argument('--iterations', type=int, default=11, help='Iterations per board and version')
+    parser.add_argument('--results-dir', default=None,
+                        help=f'Directory for the results CSVs (default {RESULTS_DIR}, '
+                             'or a temporary directory with --simulate)')
+    parser.add_argument('--prepare', action='store_true',
+                        help='Only build the cached pyperformance venvs on every board, then exit')
+    parser.add_argument('--transport', choices=['ssh', 'agent'], default='ssh',
+                        help='Start the workload over SSH or through the on-board agent')
+    parser.add_argument('--telemetry', type=float, nargs='?', const=TELEMETRY_INTERVAL, default=0, metavar='SECONDS',
+                        help='Sample CPU frequency, temperature, throttling and load on the Pi at this interval '
+                             f'(default {TELEMETRY_INTERVAL}) during every run. Off unless given: the sampler runs '
+                             'on the Pi inside the measured window')
+    parser.add_argument('--outlier-threshold', type=float, default=OUTLIER_THRESHOLD, metavar='Z',
+                        help='Quarantine and re-run iterations whose robust z-score exceeds Z, that drift '
+                             'or that were throttled (0 disables, see anomaly.py)')
+    parser.add_argument('--archive-recordings', metavar='DIR',
+                        help='Export every finished Otii recording to compressed files in DIR '
+                             '(e.g. ../../results/recordings) and prune archived ones from the project')
+    parser.add_argument('--archive-channels', nargs='+', default=ARCHIVE_CHANNELS, metavar='CHANNEL',
+                        help='Channels to archive (default: mp mc)')
+    parser.add_argument('--keep-recordings', type=int, default=KEEP_LAST, metavar='N',
+                        help='Archived recordings to keep in the Otii project, besides those with '
+                             'quarantined runs')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Use local stand-ins for the Otii server and the boards')
+    args = parser.parse_args()
+
+    if args.simulate:
+        from stand_ins import StandInOtii, StandInSSHClient, start_stand_in_agent
+        results_dir = args.results_dir or tempfile.mkdtemp(prefix="simulated_results_")
+        os.makedirs(results_dir, exist_ok=True)
+        recover = lambda board: 0.0
+    else:
+        from otii_tcp_client import otii_client
+        results_dir = args.results_dir
+        recover = reconnectable
+
+    if args.matrix:
+        spec = load_matrix(args.matrix)
+        if results_dir is not None:
+            spec["results_dir"] = results_dir
+        if args.simulate:
+            spec["checkpoint"] = os.path.join(results_dir, os.path.basename(spec["checkpoint"]))
+        results_dir = spec["results_dir"]
+        entries = spec["boards"]
+        jobs = matrix_queue(spec)
+        versions = [interpreter(v, variant) for v, variant in configurations(spec)]
+        benchmarks = spec["benchmarks"]
+        counts = jobs.counts()
+        print(f"Matrix: {len(jobs)} jobs to run, {counts['done']} done, {counts['failed']} failed")
+    elif args.versions:
+        with open(args.boards) as f:
+            entries = json.load(f)
+        jobs = build_jobs(entries, args.versions, args.iterations, args.variants)
+        versions = [interpreter(v, variant) for v, variant in configurations(vars(args))]
+        benchmarks = None
+    else:
+        parser.error("--versions is required without --matrix")
+    results_dir = results_dir or RESULTS_DIR
+
+    if args.simulate:
+        connection, ssh_factory = StandInOtii(len(entries)), StandInSSHClient
+    else:
+        connection, ssh_factory = otii_client.OtiiClient().connect(), paramiko_client
+
+    if args.prepare:
+        errors = prepare_boards(entries, versions, benchmarks, ssh_factory)
+        raise SystemExit(1 if errors else 0)
+
+    def transport_factory(board, ssh_client):
+        return SSHTransport(board, ssh_client, args.telemetry)
+
+    if args.transport == 'agent':
+        token = secrets.token_hex(16)
+        start_agent = start_stand_in_agent if args.simulate else launch_agent
+
+        def transport_factory(board, ssh_client):
+            return AgentTransport(board, ssh_client, start_agent(board, ssh_client, token, versions),
+                                  args.telemetry)
+
+    archiver = None
+    if args.archive_recordings:
+        os.makedirs(results_dir, exist_ok=True)
+        archiver = RecordingArchiver(args.archive_recordings, ResultsDB(os.path.join(results_dir, DB_NAME)),
+                                     args.archive_channels, args.keep_recordings)
+
+    print(f"Writing results to {results_dir}")
+    with connection as otii:
+        failures = run_parallel(otii, entries, jobs, ssh_factory, results_dir, recover, transport_factory,
+                                args.outlier_threshold, archiver)
+    for board_key, job, error in failures:
+        print(f"Failed: {board_key} {job.interpreter} iteration {job.iteration}: {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Per-benchmark and per-phase energy attribution for a pyperformance run.
+
+run_benchmarks.sh prints phase markers on stdout while it runs:
+
+    PHASE <name> <epoch seconds> <utc offset seconds>
+
+for the phases 'setup' (benchmark venv creation and dependency install, only
+when no venv was prepared beforehand), 'benchmarks' (pyperformance run) and
+'end'. The pyperf JSON written by
+pyperformance records the start date and duration of every worker process
+run of every benchmark, plus its warmup and measured values.
+
+From these, benchmark_windows() derives time windows on the Pi clock for
+    - setup                       (from the markers)
+    - <benchmark>/warmup          (warmup loops of each worker run)
+    - <benchmark>/values          (measured loops of each worker run)
+    - <benchmark>/overhead        (process start-up and teardown of each run)
+    - harness                     (everything else inside the recording)
+Warmups and values are assumed to run back to back at the end of each worker
+run, so their windows are estimates from loops x value.
+
+The windows are mapped onto the Otii recording time axis through the offset
+between the Pi clock and the orchestrator clock, and their energy is taken
+from get_channel_statistics on the sub-ranges or from a stored raw trace.
+"""
+
+import datetime
+import json
+import time
+
+PHASE_HEADERS = [
+    "Timestamp", "Benchmark", "Phase", "Windows", "Duration", "Average", "Energy consumption"
+]
+
+
+def parse_markers(lines):
+    '''Return ({phase: epoch}, utc offset in seconds) from PHASE lines of the remote output'''
+    markers = {}
+    utc_offset = 0
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3 and parts[0] == "PHASE":
+            markers[parts[1]] = float(parts[2])
+            if len(parts) >= 4:
+                utc_offset = int(parts[3])
+    return markers, utc_offset
+
+
+def estimate_clock_offset(ssh_client, python_bin, samples=3):
+    '''Offset (remote - local) of the Pi clock, from the fastest of a few round trips'''
+    best = None
+    for _ in range(samples):
+        t0 = time.time()
+        stdin, stdout, stderr = ssh_client.exec_command(f"{python_bin} -c 'import time; print(time.time())'")
+        remote = float(stdout.read().decode().strip())
+        t1 = time.time()
+        if best is None or t1 - t0 < best[0]:
+            best = (t1 - t0, remote - (t0 + t1) / 2)
+    return best[1]
+
+
+def _run_loops(run, bench_meta, common_meta):
+    meta = dict(common_meta, **bench_meta, **run.get("metadata", {}))
+    return meta.get("loops", 1) * meta.get("inner_loops", 1)
+
+
+def _epoch(date, utc_offset):
+    naive = datetime.datetime.fromisoformat(date)
+    tz = datetime.timezone(datetime.timedelta(seconds=utc_offset))
+    return naive.replace(tzinfo=tz).timestamp()
+
+
+def benchmark_windows(pyperf, markers, utc_offset):
+    '''List of (benchmark, phase, start, end) windows on the Pi clock'''
+    windows = []
+    if "setup" in markers and "benchmarks" in markers:
+        windows.append(("all", "setup", markers["setup"], markers["benchmarks"]))
+
+    common_meta = pyperf.get("metadata", {})
+    for bench in pyperf.get("benchmarks", []):
+        bench_meta = bench.get("metadata", {})
+        name = bench_meta.get("name", common_meta.get("name", "unknown"))
+        for run in bench.get("runs", []):
+            run_meta = run.get("metadata", {})
+            if "date" not in run_meta or "duration" not in run_meta:
+                continue
+            start = _epoch(run_meta["date"], utc_offset)
+            end = start + run_meta["duration"]
+            loops = _run_loops(run, bench_meta, common_meta)
+            inner = dict(common_meta, **bench_meta, **run_meta).get("inner_loops", 1)
+            warmup = sum(w_loops * inner * value for w_loops, value in run.get("warmups", []))
+            values = sum(loops * value for value in run.get("values", []))
+            measured_start = max(start, end - warmup - values)
+            windows.append((name, "overhead", start, measured_start))
+            if warmup:
+                windows.append((name, "warmup", measured_start, measured_start + warmup))
+            if values:
+                windows.append((name, "values", end - values, end))
+    return windows
+
+
+def window_energy(recording, device_id, start, end, trace=None):
+    '''(average power, energy) of the 'mp' channel between two recording times'''
+    if trace is not None:
+        from trace_store import trace_energy
+        path, meta = trace
+        lo = max(0, int(round((start - meta["timestamp"]) / meta["interval"])))
+        hi = min(meta["count"], int(round((end - meta["timestamp"]) / meta["interval"])) + 1)
+        if hi - lo < 2:
+            return 0.0, 0.0
+        energy = trace_energy(path, lo, hi)
+        return energy / (end - start), energy
+    stats = recording.get_channel_statistics(device_id, 'mp', start, end)
+    return stats["average"], stats["average"] * (end - start)
+
+
+def attribute_energy(recording, device_id, info, windows, to_recording_time, trace=None):
+    '''Sum duration and energy of the windows per (benchmark, phase)'''
+    totals = {}
+    covered = 0.0
+    for name, phase, start, end in windows:
+        start = min(max(to_recording_time(start), info["from"]), info["to"])
+        end = min(max(to_recording_time(end), info["from"]), info["to"])
+        if end <= start:
+            continue
+        _, energy = window_energy(recording, device_id, start, end, trace)
+        total = totals.setdefault((name, phase), [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += end - start
+        total[2] += energy
+        covered += end - start
+
+    duration = info["to"] - info["from"]
+    _, energy = window_energy(recording, device_id, info["from"], info["to"], trace)
+    attributed = sum(t[2] for t in totals.values())
+    totals[("all", "harness")] = [1, max(duration - covered, 0.0), max(energy - attributed, 0.0)]
+    return totals
+
+
+def load_pyperf(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Sampling stack profiler for the Python processes of a benchmark run on the Pi.
+
+Like telemetry.py, it wraps the workload:
+
+    python3 profiler.py --interval 0.01 --out profile.json -- bash run_benchmarks.sh python3.12
+
+The command runs with a generated sitecustomize.py first on PYTHONPATH, so
+every Python process it starts (pyperformance, its pyperf worker processes
+and the benchmarks in them; run_benchmarks.sh passes the variables on with
+--inherit-environ) loads this file and starts a sampler thread. Every
+--interval seconds the sampler takes the stack of the process's main thread
+from sys._current_frames() and stamps it with the Pi clock and with the CPU
+time the process used since the previous sample, so samples of a process
+that is only waiting (the pyperf master) carry no weight. A stack is folded
+root first, one "module:function" frame per level, joined by ';'. Forked
+children restart the sampler. At exit each process writes its samples to the
+profile directory, and the wrapper merges them into --out:
+
+    {"interval": s, "processes": n, "cpu": sampler CPU s, "stacks": [folded, ...],
+     "samples": [[time, cpu seconds, stack index, pid], ...]}
+
+The sampler threads measure their own CPU time, reported as "cpu". The
+energy they cost is measured by comparing a profiled run with an unprofiled
+one (run_benchmarks.py --profile). A sitecustomize module of the OS's Python
+is shadowed while profiling. Only the standard library is used;
+energy_profile.py attributes the samples to the Otii recording on the
+orchestrator side.
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.01
+MAX_DEPTH = 128
+ENV_DIR = "PYENERGY_PROFILE"
+ENV_INTERVAL = "PYENERGY_PROFILE_INTERVAL"
+ENV_PROFILER = "PYENERGY_PROFILER"
+# Loads this file by path, so the experiment directory does not end up on the benchmarks' sys.path
+SITECUSTOMIZE = """\
+import importlib.util, os
+_spec = importlib.util.spec_from_file_location("_pyenergy_profiler", os.environ["{profiler}"])
+_profiler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_profiler)
+_profiler.start_from_environ()
+"""
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def fold(frame):
+    '''The folded stack of a frame, root first'''
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    '''Samples the main thread's stack of the current process in a background thread'''
+
+    def __init__(self, interval, out_dir):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.stacks = {}
+        self.samples = []
+        self.cpu = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        main = threading.main_thread().ident
+        last = time.process_time()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(main)
+            now, cpu = time.time(), time.process_time()
+            if frame is None:
+                continue
+            folded = fold(frame)
+            # The process is exiting and writing its samples
+            if folded.startswith(__name__ + ":"):
+                continue
+            stack = self.stacks.setdefault(folded, len(self.stacks))
+            self.samples.append([now, cpu - last, stack])
+            last = cpu
+        self.cpu = time.thread_time()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="pyenergy-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self):
+        if self._stop.is_set():
+            return
+        self.stop()
+        if not self.samples:
+            return
+        path = os.path.join(self.out_dir, f"{os.getpid()}.json")
+        with open(path, "w") as f:
+            json.dump({"pid": os.getpid(), "cpu": self.cpu, "stacks": sorted(self.stacks, key=self.stacks.get),
+                       "samples": self.samples}, f)
+
+
+_sampler = None
+
+
+def start(interval, out_dir):
+    '''Sample this process (and forked children) until it exits'''
+    global _sampler
+    _sampler = Sampler(interval, out_dir).start()
+
+
+def _restart_in_child():
+    start(_sampler.interval, _sampler.out_dir)
+    # multiprocessing ends the processes it forks with os._exit(), skipping atexit, and clears the
+    # finalizers inherited from the parent before running its after-fork callbacks
+    util = sys.modules.get("multiprocessing.util")
+    if util is not None:
+        util.register_after_fork(_sampler, lambda sampler: util.Finalize(None, _write, exitpriority=0))
+
+
+def _write():
+    _sampler.write()
+
+
+def start_from_environ():
+    '''Entry point of the generated sitecustomize.py'''
+    out_dir = os.environ.get(ENV_DIR)
+    if not out_dir or _sampler is not None:
+        return
+    start(float(os.environ.get(ENV_INTERVAL, DEFAULT_INTERVAL)), out_dir)
+    atexit.register(_write)
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def merge(profile_dir, interval):
+    '''Merge the per-process sample files into one profile, with stacks shared between processes'''
+    stacks = {}
+    samples = []
+    cpu = 0.0
+    files = sorted(glob.glob(os.path.join(profile_dir, "*.json")))
+    for path in files:
+        with open(path) as f:
+            process = json.load(f)
+        index = [stacks.setdefault(stack, len(stacks)) for stack in process["stacks"]]
+        samples.extend([t, weight, index[stack], process["pid"]] for t, weight, stack in process["samples"])
+        cpu += process["cpu"]
+    samples.sort()
+    return {"interval": interval, "processes": len(files), "cpu": cpu,
+            "stacks": sorted(stacks, key=stacks.get), "samples": samples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a command while sampling the stacks of its Python processes')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between samples')
+    parser.add_argument('--out', default='profile.json', help='File the merged profile is written to afterwards')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='Command to run, after --')
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error("no command given")
+
+    work_dir = tempfile.mkdtemp(prefix="pyenergy_profile_")
+    try:
+        site_dir = os.path.join(work_dir, "site")
+        profile_dir = os.path.join(work_dir, "samples")
+        os.makedirs(site_dir)
+        os.makedirs(profile_dir)
+        with open(os.path.join(site_dir, "sitecustomize.py"), "w") as f:
+            f.write(SITECUSTOMIZE.format(profiler=ENV_PROFILER))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [site_dir, env.get("PYTHONPATH")]))
+        env.update({ENV_DIR: profile_dir, ENV_INTERVAL: str(args.interval),
+                    ENV_PROFILER: os.path.abspath(__file__)})
+        status = subprocess.call(command, env=env)
+        with open(args.out, "w") as f:
+            json.dump(merge(profile_dir, args.interval), f)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Archive finished Otii recordings locally and prune them from the Otii project.
+
+Each iteration leaves a full recording (mp and mc at 50 kHz) in the active
+Otii project. Over a long campaign the project grows to many gigabytes, and
+get_last_recording and the Otii app slow down. After the statistics of a
+recording have been extracted, RecordingArchiver
+
+    1. streams the requested channels of every device out of the recording in
+       bounded-size chunks into gzip-compressed float32 files:
+
+           <archive dir>/<name>/<device id>_<channel>.f32.gz
+           <archive dir>/<name>/recording.json   (channel info, sample interval,
+                                                  sample count, runs measured in it)
+
+       written under <name>.tmp and renamed once complete;
+    2. adds an index entry to the recordings table of the results database,
+       linked to the runs measured in the recording;
+    3. deletes archived recordings from the project, keeping the newest
+       keep_last of them and every recording holding a run that was
+       quarantined as anomalous (anomaly.py), so those can still be inspected
+       in the Otii app.
+
+A recording is only deleted from the project once its archive is complete.
+All calls into the Otii client go through the lock passed in, one call at a
+time, so the orchestrator's other workers are not held up by an export.
+
+ArchivedRecording reads an archive back with the part of the Otii recording
+API the scripts use (get_channel_info, get_channel_statistics,
+get_channel_data_count, get_channel_data), so phases.attribute_energy and
+trace_store.download_trace work on it without the Otii app.
+
+Usage:
+    python3 recording_archive.py list [--results-dir ../../results]
+    python3 recording_archive.py extract <archive> <device id> [--channel mp] --out <trace path>
+"""
+
+import argparse
+import contextlib
+import gzip
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from results_db import DB_NAME, ResultsDB
+from trace_store import DEFAULT_CHUNK_SIZE, SAMPLE_DTYPE, download_trace
+
+RESULTS_DIR = "../../results"
+DEFAULT_CHANNELS = ["mp", "mc"]
+KEEP_LAST = 10
+COMPRESS_LEVEL = 6
+INDEX_FILE = "recording.json"
+
+
+def _channel_file(device_id, channel):
+    return f"{device_id}_{channel}.f32.gz"
+
+
+class RecordingArchiver:
+    '''Export finished recordings to compressed files and prune them from the Otii project'''
+
+    def __init__(self, archive_dir, db, channels=DEFAULT_CHANNELS, keep_last=KEEP_LAST,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.archive_dir = archive_dir
+        self.db = db
+        self.channels = list(channels)
+        self.keep_last = keep_last
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        # (recording, index id) of the archived recordings still in the project, oldest first
+        self._in_project = []
+
+    def archive(self, recording, name, device_ids, run_ids=(), otii_lock=None):
+        '''Export the channels of a finished recording and index it; return the archive path'''
+        otii = otii_lock or contextlib.nullcontext()
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, name)
+        with self._lock:
+            suffix = 1
+            while os.path.exists(path) or os.path.exists(path + ".tmp"):
+                suffix += 1
+                path = os.path.join(self.archive_dir, f"{name}_{suffix}")
+            os.makedirs(path + ".tmp")
+        try:
+            channels = []
+            for device_id in device_ids:
+                for channel in self.channels:
+                    meta = self._export_channel(recording, device_id, channel, path + ".tmp", otii)
+                    if meta:
+                        channels.append(meta)
+            meta = {"name": os.path.basename(path), "archived": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    "runs": list(run_ids), "channels": channels}
+            with open(os.path.join(path + ".tmp", INDEX_FILE), "w") as f:
+                json.dump(meta, f, indent=2)
+            os.replace(path + ".tmp", path)
+        except BaseException:
+            shutil.rmtree(path + ".tmp", ignore_errors=True)
+            raise
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        recording_id = self.db.insert_recording(meta["name"], path, channels, size, run_ids)
+        with self._lock:
+            self._in_project.append((recording, recording_id))
+        return path
+
+    def _export_channel(self, recording, device_id, channel, directory, otii):
+        with otii:
+            count = recording.get_channel_data_count(device_id, channel)
+        if not count:
+            return None
+        with otii:
+            info = recording.get_channel_info(device_id, channel)
+        first = None
+        path = os.path.join(directory, _channel_file(device_id, channel))
+        with gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL) as f:
+            index = 0
+            while index < count:
+                with otii:
+                    chunk = recording.get_channel_data(device_id, channel, index,
+                                                       min(self.chunk_size, count - index))
+                if not chunk["values"]:
+                    break
+                first = first or chunk
+                f.write(np.asarray(chunk["values"], dtype=SAMPLE_DTYPE).tobytes())
+                index += len(chunk["values"])
+        if first is None:
+            os.remove(path)
+            return None
+        return {"device_id": device_id, "channel": channel, "file": _channel_file(device_id, channel),
+                "dtype": SAMPLE_DTYPE, "count": index, "interval": first["interval"],
+                "timestamp": first["timestamp"], "info": info}
+
+    def prune(self, otii_lock=None):
+        '''Delete archived recordings from the project, keeping the newest keep_last and the flagged ones;
+        return how many were deleted'''
+        otii = otii_lock or contextlib.nullcontext()
+        with self._lock:
+            flagged = {rid for _, rid in self._in_project if self.db.recording_has_quarantined_runs(rid)}
+            candidates = [entry for entry in self._in_project if entry[1] not in flagged]
+            doomed = candidates[:max(0, len(candidates) - self.keep_last)]
+            for recording, recording_id in doomed:
+                with otii:
+                    recording.delete()
+                self.db.recording_removed(recording_id)
+                self._in_project.remove((recording, recording_id))
+        return len(doomed)
+
+    def archive_and_prune(self, recording, name, device_ids, run_ids=(), otii_lock=None):
+        path = self.archive(recording, name, device_ids, run_ids, otii_lock)
+        deleted = self.prune(otii_lock)
+        return path, deleted
+
+
+class ArchivedRecording:
+    '''An archived recording, read through the subset of the Otii recording API used by the scripts'''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.meta = json.load(f)
+        self.name = self.meta["name"]
+        self._channels = {(c["device_id"], c["channel"]): c for c in self.meta["channels"]}
+        self._samples = {}
+
+    def channels(self):
+        '''(device id, channel) of every archived channel'''
+        return list(self._channels)
+
+    def samples(self, device_id, channel):
+        '''All samples of a channel, decompressed on first use'''
+        key = (device_id, channel)
+        if key not in self._samples:
+            meta = self._channels[key]
+            with gzip.open(os.path.join(self.path, meta["file"]), "rb") as f:
+                self._samples[key] = np.frombuffer(f.read(), dtype=meta["dtype"])
+        return self._samples[key]
+
+    def is_running(self):
+        return False
+
+    def get_channel_info(self, device_id, channel):
+        return dict(self._channels[(device_id, channel)]["info"])
+
+    def get_channel_data_count(self, device_id, channel):
+        return self._channels[(device_id, channel)]["count"]
+
+    def get_channel_data(self, device_id, channel, index, count):
+        meta = self._channels[(device_id, channel)]
+        values = self.samples(device_id, channel)[index:index + count]
+        return {"timestamp": meta["timestamp"] + index * meta["interval"], "interval": meta["interval"],
+                "values": values.astype(np.float64).tolist()}
+
+    def get_channel_statistics(self, device_id, channel, from_time, to_time):
+        meta = self._channels[(device_id, channel)]
+        lo = max(0, math.ceil((from_time - meta["timestamp"]) / meta["interval"] - 1e-9))
+        hi = min(meta["count"], math.floor((to_time - meta["timestamp"]) / meta["interval"] + 1e-9) + 1)
+        values = self.samples(device_id, channel)[lo:hi].astype(np.float64)
+        if values.size == 0:
+            raise ValueError(f"No samples of {device_id} {channel} between {from_time} and {to_time}")
+        average = float(values.mean())
+        return {"min": float(values.min()), "max": float(values.max()), "average": average,
+                "energy": average * (to_time - from_time)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List archived Otii recordings or extract one of their channels')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    listing = subparsers.add_parser('list', help='Archived recordings in the results database')
+    listing.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    extract = subparsers.add_parser('extract', help='Write an archived channel as a raw trace (trace_store.py)')
+    extract.add_argument('archive', help='Archive directory of the recording')
+    extract.add_argument('device_id', help='Otii device id')
+    extract.add_argument('--channel', default='mp', help='Channel to extract')
+    extract.add_argument('--out', required=True, help='Trace path, without the .f32/.json extension')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        recordings = ResultsDB(os.path.join(args.results_dir, DB_NAME)).recordings()
+        for recording_id, name, path, archived, size, in_project, runs in recordings:
+            print(f"{recording_id}: {name} archived {archived}, {size / 1e6:.1f} MB, {runs} runs, "
+                  f"{'still in the Otii project' if in_project else 'deleted from the Otii project'}: {path}")
+        print(f"{len(recordings)} archived recordings")
+    else:
+        recording = ArchivedRecording(args.archive)
+        meta = download_trace(recording, args.device_id, args.channel, args.out,
+                              metadata={"archive": os.path.abspath(args.archive)})
+        print(f"Wrote {meta['count']} samples to {args.out}.f32 ({meta['energy']:.5f} J)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Layout of the per-configuration results CSV files written by the orchestrators."""
+import csv
+import os
+import threading
+import time
+
+# Column headers (must match order of data)
+RESULT_HEADERS = [
+    "From", "To", "Offset", "Sample rate",
+    "Min", "Max", "Average", "Duration", "Energy consumption"
+]
+
+# Dead time around each iteration (settle.py), in seconds
+OVERHEAD_FILE = "../../results/overhead.csv"
+OVERHEAD_HEADERS = [
+    "Timestamp", "RPi", "OS", "Python", "Idle wait", "Finalize wait", "Recovery wait", "Total"
+]
+
+# Energy of the whole request window vs. the workload alone, per job (orchestrator.py)
+HARNESS_FILE = "harness_overhead.csv"
+HARNESS_HEADERS = [
+    "Timestamp", "RPi", "OS", "Python", "Transport", "Window duration", "Window energy",
+    "Workload duration", "Workload energy", "Overhead energy"
+]
+
+# One lock per results file, so several orchestrator workers can append safely
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def _file_lock(file_path):
+    with _file_locks_guard:
+        return _file_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+
+def result_row(info, statistics_mp, duration, energy_joules):
+    '''Row of a results CSV for one recording'''
+    return [
+        info["from"],
+        info["to"],
+        info["offset"],
+        info["sample_rate"],
+        round(statistics_mp["min"], 5),
+        round(statistics_mp["max"], 5),
+        round(statistics_mp["average"], 5),
+        round(duration, 5),
+        round(energy_joules, 5)
+    ]
+
+def overhead_row(rpi, os_name, version, idle_wait=0.0, finalize_wait=0.0, recovery_wait=0.0):
+    '''Row of the overhead log for one iteration'''
+    waits = [round(idle_wait, 3), round(finalize_wait, 3), round(recovery_wait, 3)]
+    return [time.strftime('%Y-%m-%dT%H:%M:%S'), rpi, os_name, version] + waits + [round(sum(waits), 3)]
+
+def harness_row(rpi, os_name, version, transport, window_duration, window_energy,
+                workload_duration, workload_energy):
+    '''Row of the harness overhead log for one job'''
+    return [
+        time.strftime('%Y-%m-%dT%H:%M:%S'), rpi, os_name, version, transport,
+        round(window_duration, 5), round(window_energy, 5),
+        round(workload_duration, 5), round(workload_energy, 5),
+        round(window_energy - workload_energy, 5)
+    ]
+
+def append_result_row(file_path, row, headers=RESULT_HEADERS):
+    '''Append a row to a results CSV, writing the header if the file is new'''
+    with _file_lock(file_path):
+        # Check if file exists
+        file_exists = os.path.isfile(file_path)
+
+        # Open the file in append mode
+        with open(file_path, mode="a", newline="") as file:
+            writer = csv.writer(file)
+
+            # Write header if file is new
+            if not file_exists:
+                writer.writerow(headers)
+
+            # Write the data row
+            writer.writerow(row)
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+SQLite results store shared by the orchestrators and the analysis scripts.
+
+One database (../../results/results.db) in WAL mode replaces the
+per-configuration CSV files as the place results are written to:
+
+    runs      one row per measured iteration: board, OS, Python version,
+              build variant, benchmark set, timestamp, iteration and the
+              Otii statistics of the RESULT_HEADERS columns
+    phases    per-benchmark and per-phase energy of a run (phases.py)
+    traces    metadata of the raw trace stored for a run (trace_store.py)
+    telemetry CPU frequency, temperature, throttling flags and load sampled on
+              the Pi during a run (telemetry.py), on the Otii time axis
+    run_telemetry
+              per-run summary of the telemetry and the sampler's CPU cost
+    stopping  per configuration: the adaptive stopping rule it was measured
+              under, the precision reached and why it stopped (stopping.py)
+    quarantine
+              runs flagged as outliers, drifting or throttled, with the reasons
+              (anomaly.py); they stay in runs but no longer count as completed
+              iterations and are left out of the exported CSV files
+    recordings
+              Otii recordings exported to the recording archive and whether
+              they are still in the Otii project (recording_archive.py)
+    recording_runs
+              the runs measured in each archived recording
+    scaling   one row per point of the multi-core scaling sweep (scaling.py):
+              board, OS, Python version, build variant, workload, active
+              cores, workers, units of work and the Otii statistics of the
+              workload window; kept apart from runs, which only hold the
+              benchmark runs
+    frequency_runs
+              one row per benchmark run of the CPU frequency sweep
+              (frequency_sweep.py): board, OS, Python version, build variant,
+              benchmark set, the governor or fixed frequency the Pi was
+              pinned to, the Otii statistics of the workload window and the
+              mean frequency and throttling flags sampled during it; also
+              kept apart from runs
+    profiled_runs
+              runs measured under the sampling profiler (profiler.py, with
+              run_benchmarks.py --profile): configuration, the unprofiled run
+              measured just before it as the reference for the profiler's
+              overhead, sampling interval, samples and the samplers' CPU
+              time; apart from runs, as profiling costs energy
+    profile   energy per benchmark and folded stack of a profiled run
+              (energy_profile.py)
+
+Every thread gets its own connection, writes happen in short IMMEDIATE
+transactions and waiting writers retry for up to busy_timeout, so several
+orchestrator workers (and processes) can insert at the same time.
+
+The legacy layout is still available: 'export' writes
+results_<rpi>_<os>_python<version>.csv and phases_*.csv from the database
+(with a -<variant> suffix for build variants other than the default, see
+matrix.py), and 'import' loads existing CSV files into it; files without
+the suffix are the default variant.
+
+Usage:
+    python3 results_db.py import [--results-dir ../../results]
+    python3 results_db.py export [--results-dir ../../results] [--out DIR]
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from phases import PHASE_HEADERS
+from results_csv import RESULT_HEADERS
+
+RESULTS_DIR = "../../results"
+DB_NAME = "results.db"
+DEFAULT_VARIANT = "default"
+BUSY_TIMEOUT_MS = 30000
+
+# Database columns of RESULT_HEADERS, in the same order
+RESULT_COLUMNS = [
+    "start", "end", "offset", "sample_rate", "min", "max", "average", "duration", "energy"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    rpi TEXT NOT NULL,
+    os TEXT NOT NULL,
+    python TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT 'default',
+    benchmarks TEXT,
+    timestamp TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    start REAL, "end" REAL, offset REAL, sample_rate REAL,
+    min REAL, max REAL, average REAL, duration REAL, energy REAL
+);
+CREATE INDEX IF NOT EXISTS runs_config ON runs (rpi, os, python, variant, iteration);
+CREATE INDEX IF NOT EXISTS runs_benchmarks ON runs (benchmarks);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    benchmark TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    windows INTEGER,
+    duration REAL,
+    average REAL,
+    energy REAL
+);
+CREATE INDEX IF NOT EXISTS phases_run ON phases (run_id);
+CREATE INDEX IF NOT EXISTS phases_benchmark ON phases (benchmark, phase);
+
+CREATE TABLE IF NOT EXISTS traces (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    path TEXT NOT NULL,
+    channel TEXT,
+    sample_count INTEGER,
+    interval REAL,
+    first_timestamp REAL,
+    energy REAL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS traces_run ON traces (run_id);
+
+CREATE TABLE IF NOT EXISTS telemetry (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    t REAL NOT NULL,
+    freq REAL,
+    temp REAL,
+    throttled INTEGER,
+    busy REAL
+);
+CREATE INDEX IF NOT EXISTS telemetry_run ON telemetry (run_id, t);
+
+CREATE TABLE IF NOT EXISTS run_telemetry (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id),
+    samples INTEGER,
+    interval REAL,
+    freq_min REAL,
+    freq_mean REAL,
+    temp_max REAL,
+    throttled INTEGER,
+    busy_mean REAL,
+    sampler_cpu REAL,
+    sampler_wall REAL
+);
+
+CREATE TABLE IF NOT EXISTS stopping (
+    rpi TEXT NOT NULL,
+    os TEXT NOT NULL,
+    python TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT 'default',
+    rule TEXT NOT NULL,
+    iterations INTEGER,
+    mean REAL,
+    half_width REAL,
+    relative REAL,
+    status TEXT,
+    updated TEXT,
+    PRIMARY KEY (rpi, os, python, variant)
+);
+
+CREATE TABLE IF NOT EXISTS quarantine (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id),
+    reason TEXT NOT NULL,
+    flagged TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    archived TEXT NOT NULL,
+    channels TEXT,
+    size INTEGER,
+    in_project INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS recording_runs (
+    recording_id INTEGER NOT NULL REFERENCES recordings (id),
+    run_id INTEGER NOT NULL REFERENCES runs (id)
+);
+CREATE INDEX IF NOT EXISTS recording_runs_recording ON recording_runs (recording_id);
+CREATE INDEX IF NOT EXISTS recording_runs_run ON recording_runs (run_id);
+
+CREATE TABLE IF NOT EXISTS scaling (
+    id INTEGER PRIMARY KEY,
+    rpi TEXT NOT NULL,
+    os TEXT NOT NULL,
+    python TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT 'default',
+    workload TEXT NOT NULL,
+    cores INTEGER NOT NULL,
+    workers INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    unit_size INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    start REAL, "end" REAL, average REAL, duration REAL, energy REAL,
+    seconds REAL,
+    gil INTEGER
+);
+CREATE INDEX IF NOT EXISTS scaling_config ON scaling (rpi, os, python, variant, workload, cores, workers);
+
+CREATE TABLE IF NOT EXISTS frequency_runs (
+    id INTEGER PRIMARY KEY,
+    rpi TEXT NOT NULL,
+    os TEXT NOT NULL,
+    python TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT 'default',
+    benchmarks TEXT,
+    governor TEXT NOT NULL,
+    frequency INTEGER,
+    timestamp TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    start REAL, "end" REAL, average REAL, duration REAL, energy REAL,
+    freq_mean REAL,
+    throttled INTEGER
+);
+CREATE INDEX IF NOT EXISTS frequency_runs_config ON frequency_runs (rpi, os, python, variant, governor, frequency);
+
+CREATE TABLE IF NOT EXISTS profiled_runs (
+    id INTEGER PRIMARY KEY,
+    rpi TEXT NOT NULL,
+    os TEXT NOT NULL,
+    python TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT 'default',
+    benchmarks TEXT,
+    timestamp TEXT NOT NULL,
+    reference_run_id INTEGER REFERENCES runs (id),
+    interval REAL,
+    samples INTEGER,
+    processes INTEGER,
+    sampler_cpu REAL,
+    duration REAL,
+    energy REAL
+);
+CREATE INDEX IF NOT EXISTS profiled_runs_config ON profiled_runs (rpi, os, python, variant);
+
+CREATE TABLE IF NOT EXISTS profile (
+    profiled_run_id INTEGER NOT NULL REFERENCES profiled_runs (id),
+    benchmark TEXT NOT NULL,
+    stack TEXT NOT NULL,
+    samples INTEGER,
+    cpu REAL,
+    energy REAL
+);
+CREATE INDEX IF NOT EXISTS profile_run ON profile (profiled_run_id, benchmark);
+"""
+# Runs that are not quarantined
+ACCEPTED = "id NOT IN (SELECT run_id FROM quarantine)"
+
+
+def python_label(version):
+    '''"python3.13" -> "3.13", the form used in the results file names'''
+    return version[len("python"):] if version.startswith("python") else version
+
+
+class ResultsDB:
+    '''Thread-safe handle on the results database'''
+
+    def __init__(self, path=os.path.join(RESULTS_DIR, DB_NAME)):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        return _Transaction(self.connection())
+
+    def insert_run(self, rpi, os_name, version, row, benchmarks=None, variant=DEFAULT_VARIANT,
+                   iteration=None, timestamp=None):
+        '''Insert a results row (RESULT_HEADERS order); return its run id
+
+        Without an explicit iteration the run is numbered after the last one of
+        its configuration, inside the same transaction.
+        '''
+        python = python_label(version)
+        timestamp = timestamp or time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self.transaction() as conn:
+            if iteration is None:
+                iteration = conn.execute(
+                    "SELECT COALESCE(MAX(iteration), 0) + 1 FROM runs "
+                    "WHERE rpi = ? AND os = ? AND python = ? AND variant = ?",
+                    (rpi, os_name, python, variant)).fetchone()[0]
+            cursor = conn.execute(
+                f"INSERT INTO runs (rpi, os, python, variant, benchmarks, timestamp, iteration, "
+                f"{', '.join(_quoted(RESULT_COLUMNS))}) VALUES ({', '.join('?' * (7 + len(RESULT_COLUMNS)))})",
+                [rpi, os_name, python, variant, benchmarks, timestamp, iteration] + list(row))
+            return cursor.lastrowid
+
+    def insert_phases(self, run_id, totals):
+        '''Store the (benchmark, phase) totals of attribute_energy for a run'''
+        rows = [(run_id, name, phase, count, duration, energy / duration if duration else 0.0, energy)
+                for (name, phase), (count, duration, energy) in sorted(totals.items())]
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO phases VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def insert_trace(self, run_id, path, meta):
+        '''Store the sidecar metadata of a raw trace (trace_store.py) for a run'''
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (run_id, path, meta.get("channel"), meta.get("count"), meta.get("interval"),
+                          meta.get("timestamp"), meta.get("energy"), json.dumps(meta)))
+
+    def insert_telemetry(self, run_id, samples, summary, interval, cpu, wall):
+        '''Store the telemetry samples of a run (times on the Otii axis) and their summary'''
+        with self.transaction() as conn:
+            conn.executemany("INSERT INTO telemetry VALUES (?, ?, ?, ?, ?, ?)",
+                             [[run_id] + list(sample) for sample in samples])
+            conn.execute("INSERT INTO run_telemetry VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (run_id, summary["samples"], interval, summary["freq_min"], summary["freq_mean"],
+                          summary["temp_max"], summary["throttled"], summary["busy_mean"], cpu, wall))
+
+    def run_energies(self, rpi, os_name, version, variant=DEFAULT_VARIANT):
+        '''Energy of every accepted run of a configuration, in iteration order'''
+        return [energy for (energy,) in self.connection().execute(
+            f"SELECT energy FROM runs WHERE rpi = ? AND os = ? AND python = ? AND variant = ? AND {ACCEPTED} "
+            "ORDER BY iteration, id", (rpi, os_name, python_label(version), variant))]
+
+    def run_history(self, rpi, os_name, version, before, variant=DEFAULT_VARIANT):
+        '''(duration, average, energy) of the accepted runs of a configuration stored before run id before'''
+        return self.connection().execute(
+            f"SELECT duration, average, energy FROM runs WHERE rpi = ? AND os = ? AND python = ? "
+            f"AND variant = ? AND {ACCEPTED} AND id < ? ORDER BY id",
+            (rpi, os_name, python_label(version), variant, before)).fetchall()
+
+    def quarantine_run(self, run_id, reasons):
+        '''Flag a run so that it no longer counts as a completed iteration'''
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO quarantine VALUES (?, ?, ?)",
+                         (run_id, "; ".join(reasons), time.strftime('%Y-%m-%dT%H:%M:%S')))
+
+    def quarantined_runs(self):
+        '''(run id, rpi, os, python, variant, timestamp, energy, reason) of every quarantined run'''
+        return self.connection().execute(
+            "SELECT r.id, r.rpi, r.os, r.python, r.variant, r.timestamp, r.energy, q.reason "
+            "FROM quarantine q JOIN runs r ON r.id = q.run_id ORDER BY r.id").fetchall()
+
+    def record_stopping(self, rpi, os_name, version, rule, precision, status, variant=DEFAULT_VARIANT):
+        '''Store the stopping rule of a configuration and the precision reached so far'''
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO stopping VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (rpi, os_name, python_label(version), variant, json.dumps(rule._asdict()),
+                          precision.n, precision.mean, _finite(precision.half_width),
+                          _finite(precision.relative), status, time.strftime('%Y-%m-%dT%H:%M:%S')))
+
+    def insert_recording(self, name, path, channels, size, run_ids=()):
+        '''Index an archived recording and the runs measured in it; return its id'''
+        with self.transaction() as conn:
+            recording_id = conn.execute(
+                "INSERT INTO recordings (name, path, archived, channels, size) VALUES (?, ?, ?, ?, ?)",
+                (name, path, time.strftime('%Y-%m-%dT%H:%M:%S'), json.dumps(channels), size)).lastrowid
+            conn.executemany("INSERT INTO recording_runs VALUES (?, ?)",
+                             [(recording_id, run_id) for run_id in run_ids])
+            return recording_id
+
+    def recording_removed(self, recording_id):
+        '''Note that an archived recording was deleted from the Otii project'''
+        with self.transaction() as conn:
+            conn.execute("UPDATE recordings SET in_project = 0 WHERE id = ?", (recording_id,))
+
+    def recording_has_quarantined_runs(self, recording_id):
+        return self.connection().execute(
+            "SELECT EXISTS (SELECT 1 FROM recording_runs rr JOIN quarantine q ON q.run_id = rr.run_id "
+            "WHERE rr.recording_id = ?)", (recording_id,)).fetchone()[0] == 1
+
+    def recordings(self):
+        '''(id, name, path, archived, size, in project, number of runs) of every archived recording'''
+        return self.connection().execute(
+            "SELECT r.id, r.name, r.path, r.archived, r.size, r.in_project, COUNT(rr.run_id) "
+            "FROM recordings r LEFT JOIN recording_runs rr ON rr.recording_id = r.id "
+            "GROUP BY r.id ORDER BY r.id").fetchall()
+
+    def insert_scaling(self, rpi, os_name, version, variant, workload, cores, workers, units, unit_size,
+                       iteration, start, end, average, result):
+        '''Store one point of the scaling sweep, with the result line of scaling_workload.py; return its id'''
+        duration = end - start
+        with self.transaction() as conn:
+            return conn.execute(
+                "INSERT INTO scaling (rpi, os, python, variant, workload, cores, workers, units, unit_size, "
+                "timestamp, iteration, start, \"end\", average, duration, energy, seconds, gil) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rpi, os_name, python_label(version), variant, workload, cores, workers, units, unit_size,
+                 time.strftime('%Y-%m-%dT%H:%M:%S'), iteration, start, end, average, duration,
+                 average * duration, result.get("seconds"), result.get("gil"))).lastrowid
+
+    def count_scaling(self, rpi, os_name, version, variant, workload, cores, workers, units, unit_size):
+        '''Points of the scaling sweep already measured for one setting'''
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM scaling WHERE rpi = ? AND os = ? AND python = ? AND variant = ? "
+            "AND workload = ? AND cores = ? AND workers = ? AND units = ? AND unit_size = ?",
+            (rpi, os_name, python_label(version), variant, workload, cores, workers, units,
+             unit_size)).fetchone()[0]
+
+    def insert_frequency_run(self, rpi, os_name, version, variant, benchmarks, governor, frequency, iteration,
+                             start, end, average, telemetry=None):
+        '''Store one run of the frequency sweep, with its telemetry summary (telemetry.py); return its id'''
+        duration = end - start
+        telemetry = telemetry or {}
+        with self.transaction() as conn:
+            return conn.execute(
+                "INSERT INTO frequency_runs (rpi, os, python, variant, benchmarks, governor, frequency, timestamp, "
+                "iteration, start, \"end\", average, duration, energy, freq_mean, throttled) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rpi, os_name, python_label(version), variant, benchmarks, governor, frequency,
+                 time.strftime('%Y-%m-%dT%H:%M:%S'), iteration, start, end, average, duration,
+                 average * duration, telemetry.get("freq_mean"), telemetry.get("throttled"))).lastrowid
+
+    def count_frequency_runs(self, rpi, os_name, version, variant, benchmarks, governor, frequency):
+        '''Runs of the frequency sweep already measured at one operating point'''
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM frequency_runs WHERE rpi = ? AND os = ? AND python = ? AND variant = ? "
+            "AND benchmarks IS ? AND governor = ? AND frequency IS ?",
+            (rpi, os_name, python_label(version), variant, benchmarks, governor, frequency)).fetchone()[0]
+
+    def insert_profiled_run(self, rpi, os_name, version, variant, benchmarks, reference_run_id, profile, duration,
+                            energy, totals):
+        '''Store a profiled run and its energy per (benchmark, stack) from attribute_profile; return its id'''
+        with self.transaction() as conn:
+            profiled_run_id = conn.execute(
+                "INSERT INTO profiled_runs (rpi, os, python, variant, benchmarks, timestamp, reference_run_id, "
+                "interval, samples, processes, sampler_cpu, duration, energy) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rpi, os_name, python_label(version), variant, benchmarks, time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 reference_run_id, profile["interval"], len(profile["samples"]), profile["processes"],
+                 profile["cpu"], duration, energy)).lastrowid
+            conn.executemany("INSERT INTO profile VALUES (?, ?, ?, ?, ?, ?)",
+                             [(profiled_run_id, benchmark, stack, samples, cpu, stack_energy)
+                              for (benchmark, stack), (samples, cpu, stack_energy) in sorted(totals.items())])
+            return profiled_run_id
+
+    def last_run_id(self, rpi, os_name, version, variant=DEFAULT_VARIANT):
+        '''Id of the latest run of a configuration, or None'''
+        return self.connection().execute(
+            "SELECT MAX(id) FROM runs WHERE rpi = ? AND os = ? AND python = ? AND variant = ?",
+            (rpi, os_name, python_label(version), variant)).fetchone()[0]
+
+    def count_runs(self, rpi, os_name, version, variant=DEFAULT_VARIANT):
+        return self.connection().execute(
+            f"SELECT COUNT(*) FROM runs WHERE rpi = ? AND os = ? AND python = ? AND variant = ? AND {ACCEPTED}",
+            (rpi, os_name, python_label(version), variant)).fetchone()[0]
+
+    def import_csv(self, results_dir=RESULTS_DIR):
+        '''Load results_*.csv files into an empty database; return the number of rows'''
+        if self.connection().execute("SELECT COUNT(*) FROM runs").fetchone()[0]:
+            raise ValueError(f"{self.path} already holds runs; import only into a new database")
+        total = 0
+        for path in sorted(glob.glob(os.path.join(results_dir, "results_*_python*.csv"))):
+            m = re.match(r"results_(.+?)_(.+?)_python(\d+\.\d+)(?:-(\w+))?\.csv$", os.path.basename(path))
+            if not m:
+                continue
+            with open(path, newline="") as f:
+                rows = [row for row in csv.reader(f) if row][1:]
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(os.path.getmtime(path)))
+            with self.transaction() as conn:
+                conn.executemany(
+                    f"INSERT INTO runs (rpi, os, python, variant, timestamp, iteration, "
+                    f"{', '.join(_quoted(RESULT_COLUMNS))}) VALUES ({', '.join('?' * (6 + len(RESULT_COLUMNS)))})",
+                    [list(m.groups(DEFAULT_VARIANT)) + [timestamp, i + 1] + [float(v) for v in row]
+                     for i, row in enumerate(rows)])
+            total += len(rows)
+        return total
+
+    def export_csv(self, out_dir=RESULTS_DIR):
+        '''Write the legacy results and phases CSV files of the accepted runs; return their paths'''
+        conn = self.connection()
+        written = []
+        configs = conn.execute("SELECT DISTINCT rpi, os, python, variant FROM runs ORDER BY 1, 2, 3, 4")
+        for rpi, os_name, python, variant in configs.fetchall():
+            suffix = "" if variant == DEFAULT_VARIANT else f"-{variant}"
+            name = f"{rpi}_{os_name}_python{python}{suffix}.csv"
+            where = f"WHERE rpi = ? AND os = ? AND python = ? AND variant = ? AND {ACCEPTED}"
+            params = (rpi, os_name, python, variant)
+            rows = conn.execute(f"SELECT {', '.join(_quoted(RESULT_COLUMNS))} FROM runs {where} "
+                                "ORDER BY iteration, id", params).fetchall()
+            written.append(_write_csv(os.path.join(out_dir, "results_" + name), RESULT_HEADERS, rows))
+            phases = conn.execute(
+                "SELECT r.timestamp, p.benchmark, p.phase, p.windows, p.duration, p.average, p.energy "
+                "FROM phases p JOIN runs r ON r.id = p.run_id "
+                f"WHERE r.rpi = ? AND r.os = ? AND r.python = ? AND r.variant = ? AND r.{ACCEPTED} "
+                "ORDER BY r.iteration, r.id, p.benchmark, p.phase", params).fetchall()
+            if phases:
+                written.append(_write_csv(os.path.join(out_dir, "phases_" + name), PHASE_HEADERS, phases))
+        return written
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _finite(value):
+    return value if value is not None and value != float("inf") else None
+
+
+def _quoted(columns):
+    return [f'"{c}"' for c in columns]
+
+
+def _format(value):
+    '''Numbers as the orchestrators wrote them: rounded to 5 decimals, integral values without .0'''
+    if isinstance(value, float):
+        value = round(value, 5)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def _write_csv(path, headers, rows):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(headers)
+        writer.writerows([_format(v) for v in row] for row in rows)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import results CSVs into, or export them from, the results database')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help='Directory holding results.db')
+    parser.add_argument('--out', help='Directory for exported CSV files (default: the results directory)')
+    args = parser.parse_args()
+
+    db = ResultsDB(os.path.join(args.results_dir, DB_NAME))
+    if args.command == 'import':
+        print(f"Imported {db.import_csv(args.results_dir)} runs into {db.path}")
+    else:
+        out = args.out or args.results_dir
+        os.makedirs(out, exist_ok=True)
+        for path in db.export_csv(out):
+            print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
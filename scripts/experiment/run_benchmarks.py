@@ -1,17 +1,62 @@
 #!/usr/bin/env python3
 import paramiko
 import time
-import csv
 import os
 import json
+import argparse
 from otii_tcp_client import otii_client
+from trace_store import download_trace
+from energy_profile import DEFAULT_WINDOW as PROFILE_WINDOW, attribute_profile
+from phases import attribute_energy, benchmark_windows, estimate_clock_offset, load_pyperf, parse_markers
+from results_csv import OVERHEAD_FILE, OVERHEAD_HEADERS, append_result_row, overhead_row, result_row
+from settle import wait_pi_idle, wait_recording_finalized, wait_ssh_reachable
+from matrix import configurations, interpreter, load_matrix, matrix_queue
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+from telemetry import DEFAULT_INTERVAL as TELEMETRY_INTERVAL, describe_telemetry, store_telemetry
+from anomaly import THRESHOLD as OUTLIER_THRESHOLD, AnomalyDetector
+from recording_archive import DEFAULT_CHANNELS as ARCHIVE_CHANNELS, KEEP_LAST, RecordingArchiver
+from profiler import DEFAULT_INTERVAL as PROFILE_INTERVAL
+
+PYPERF_DIR = "../../results/pyperf"
+RESULTS_DB = os.path.join("../../results", DB_NAME)
+TELEMETRY_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/telemetry.py"
+PROFILER_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/profiler.py"
 
 class AppException(Exception):
     '''Application Exception'''
 
-def run_benchmarks(otii, device, project, rpi, linux, version, hostname, username, password):
+class StoredRunError(AppException):
+    '''Failure after the run was stored, so measuring it again would store it twice'''
+
+def run_benchmarks(otii, device, project, rpi, linux, version, hostname, username, password, trace_dir=None,
+                   benchmarks=None, telemetry=None, detector=None, archiver=None, variant=DEFAULT_VARIANT,
+                   profile=None, profile_window=PROFILE_WINDOW, reference_run_id=None):
+    '''Measure one iteration and store it; return the reasons it was quarantined (empty if accepted)
+
+    With a profile interval the run is profiled (profiler.py) and stored as a
+    profiled run, with its energy per function, instead of as a run.
+    '''
+    # Executable of the build variant, e.g. python3.13t
+    python = interpreter(version, variant)
     # Define command to run script
-    command = "bash Python_Application_Energy_Consumption/scripts/experiment/run_benchmarks.sh " + version
+    command = "bash Python_Application_Energy_Consumption/scripts/experiment/run_benchmarks.sh " + python
+    if benchmarks:
+        command += " " + benchmarks
+    if profile:
+        # Sample the stacks of every Python process of the run
+        command = f"python3 {PROFILER_SCRIPT} --interval {profile} --out profile.json -- {command}"
+    if telemetry:
+        # Sample CPU frequency, temperature, throttling and load on the Pi during the run
+        command = f"python3 {TELEMETRY_SCRIPT} --interval {telemetry} --out telemetry.json -- {command}"
+    samples = None
+    profile_data = None
+    remote_output = []
+    pyperf_path = None
+    clock_offset = 0.0
+    recording_start = None
+    recording = False
+    idle_wait = 0.0
+    error = None
 
     try:
         # Create an SSH client
@@ -30,8 +75,25 @@ def run_benchmarks(otii, device, project, rpi, linux, version, hostname, usernam
         # exit_status = stdout.channel.recv_exit_status()
         # print(f"Command completed with exit status: {exit_status}")
 
+        # Start measuring only once the Pi has settled after the previous run
+        idle_wait = wait_pi_idle(ssh_client)
+        print(f"Pi idle after {idle_wait:.1f} s")
+
+        # Offset between the Pi clock and ours, to place the phase markers on the recording
+        clock_offset = estimate_clock_offset(ssh_client, python)
+
+        # Build or reuse the cached benchmark venv before the recording starts
+        stdin, stdout, stderr = ssh_client.exec_command(
+            "bash Python_Application_Energy_Consumption/scripts/experiment/run_benchmarks.sh --prepare "
+            + python + (" " + benchmarks if benchmarks else ""))
+        if stdout.channel.recv_exit_status() != 0:
+            raise AppException(f"Preparing the venv failed: {stderr.read().decode().strip()}")
+        print(stdout.read().decode().strip())
+
         # Execute the command
         project.start_recording()
+        recording = True
+        recording_start = time.time()
         print(f"Running command: {command}")
         stdin, stdout, stderr = ssh_client.exec_command(command)
         
@@ -39,19 +101,39 @@ def run_benchmarks(otii, device, project, rpi, linux, version, hostname, usernam
         exit_status = stdout.channel.recv_exit_status()
         print(f"Command completed with exit status: {exit_status}")
         project.stop_recording()
+        recording = False
+        if exit_status != 0:
+            raise AppException(f"benchmark exited with status {exit_status}: {stderr.read().decode().strip()}")
 
         # Print the standard output and error
         # print("Standard Output:")
         # for line in stdout.read().decode().splitlines():
         #     print(line)
 
+        remote_output = stdout.read().decode().splitlines()
+
         print("Standard Error:")
         for line in stderr.read().decode().splitlines():
             print(line)
 
+        # Keep the pyperf results for per-benchmark attribution
+        os.makedirs(PYPERF_DIR, exist_ok=True)
+        pyperf_path = os.path.join(PYPERF_DIR, f"{rpi}_{linux}_{python}_{time.strftime('%Y%m%dT%H%M%S')}.json")
+        print(f"Fetching {python}.json to {pyperf_path}")
+        with ssh_client.open_sftp() as sftp:
+            sftp.get(f"{python}.json", pyperf_path)
+            if telemetry:
+                with sftp.open("telemetry.json") as f:
+                    samples = json.loads(f.read())
+                sftp.remove("telemetry.json")
+            if profile:
+                with sftp.open("profile.json") as f:
+                    profile_data = json.loads(f.read())
+                sftp.remove("profile.json")
+
         # Execute the command
-        print(f"Running command: rm {version}.json")
-        stdin, stdout, stderr = ssh_client.exec_command(f"rm {version}.json")
+        print(f"Running command: rm {python}.json")
+        stdin, stdout, stderr = ssh_client.exec_command(f"rm {python}.json")
 
         # Wait for the command to complete and fetch outputs
         exit_status = stdout.channel.recv_exit_status()
@@ -68,70 +150,155 @@ def run_benchmarks(otii, device, project, rpi, linux, version, hostname, usernam
             
     except Exception as e:
         print(f"An error occurred: {e}")
+        error = e
     
     finally:
         # Close the connection
         ssh_client.close()
         print("Connection closed.")
 
-    # Get statistics for the recording
-    time.sleep(10)
-    recording = project.get_last_recording()
+    # A broken run (lost connection, failed benchmark) must not end up in the results
+    if error is not None:
+        if recording:
+            project.stop_recording()
+        raise AppException(f"Run failed: {error}")
+
+    # Get statistics for the recording once Otii has finalized it
+    recording, finalize_wait = wait_recording_finalized(project, device.id)
     info = recording.get_channel_info(device.id, 'mp')
     statistics_mp = recording.get_channel_statistics(device.id, 'mp', info['from'], info['to'])
     
-    recording.rename(f"recording_{rpi}_{linux}_{version}")
+    recording.rename(f"recording_{rpi}_{linux}_{python}")
 
     # Assume info and statistics_mp are already defined
     duration = info["to"] - info["from"]
     energy_joules = statistics_mp["average"] * duration
 
-    # Column headers (must match order of data)
-    headers = [
-        "From", "To", "Offset", "Sample rate",
-        "Min", "Max", "Average", "Duration", "Energy consumption"
-    ]
-
-    # Row of data to append
-    row = [
-        info["from"],
-        info["to"],
-        info["offset"],
-        info["sample_rate"],
-        round(statistics_mp["min"], 5),
-        round(statistics_mp["max"], 5),
-        round(statistics_mp["average"], 5),
-        round(duration, 5),
-        round(energy_joules, 5)
-    ]
-
-    file_path = f"../../results/results_{rpi}_{linux}_{version}.csv"
-
-    # Check if file exists
-    file_exists = os.path.isfile(file_path)
-
-    # Open the file in append mode
-    with open(file_path, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        
-        # Write header if file is new
-        if not file_exists:
-            writer.writerow(headers)
-        
-        # Write the data row
-        writer.writerow(row)
+    trace = None
+    if trace_dir:
+        # Store the raw main power trace and integrate it instead of average * duration
+        trace_path = os.path.join(trace_dir, f"trace_{rpi}_{linux}_{python}_{time.strftime('%Y%m%dT%H%M%S')}")
+        print(f"Downloading raw trace to {trace_path}.f32")
+        trace_meta = download_trace(recording, device.id, 'mp', trace_path, metadata={
+            "rpi": rpi, "os": linux, "version": version, "variant": variant,
+            "from": info["from"], "to": info["to"],
+        })
+        energy_joules = trace_meta["energy"]
+        trace = (trace_path, trace_meta)
+
+    # Per-benchmark and per-phase energy from the phase markers and the pyperf results
+    markers, utc_offset = parse_markers(remote_output)
+    totals = None
+    if pyperf_path and recording_start is not None:
+        windows = benchmark_windows(load_pyperf(pyperf_path), markers, utc_offset)
 
+        def to_recording_time(t):
+            return t - clock_offset - recording_start + info["from"]
 
+        totals = attribute_energy(recording, device.id, info, windows, to_recording_time, trace)
 
-def main(otii, device, project, rpi, linux, version, hostname, username, password):
-    '''Connect to the Otii 3 application and run the measurement'''
+    # Store the run, its phases and its trace (results_db.py export writes the CSV files)
+    row = result_row(info, statistics_mp, duration, energy_joules)
+    db = ResultsDB(RESULTS_DB)
+    run_id = None
+    if profile:
+        # Profiling costs energy, so a profiled run is kept out of the runs
+        span = (markers.get("benchmarks", markers.get("setup")), markers.get("end"))
+        if not profile_data or totals is None or None in span:
+            raise AppException("Profiled run without samples, pyperf results or PHASE markers")
+        profile_totals = attribute_profile(recording, device.id, info, profile_data, span, windows,
+                                           to_recording_time, profile_window, trace)
+        profiled_run_id = db.insert_profiled_run(rpi, linux, version, variant, benchmarks, reference_run_id,
+                                                 profile_data, duration, energy_joules, profile_totals)
+        print(f"Profiled run {profiled_run_id}: {len(profile_data['samples'])} samples of "
+              f"{profile_data['processes']} processes, samplers used {profile_data['cpu']:.2f} CPU s")
+    else:
+        run_id = db.insert_run(rpi, linux, version, row, benchmarks, variant)
     try:
-        run_benchmarks(otii, device, project, rpi, linux, version, hostname, username, password)
+        if totals and run_id is not None:
+            db.insert_phases(run_id, totals)
+        if trace and run_id is not None:
+            db.insert_trace(run_id, *trace)
+        summary = None
+        if samples and recording_start is not None and run_id is not None:
+            summary = store_telemetry(db, run_id, samples,
+                                      lambda t: t - clock_offset - recording_start + info["from"])
+            print(f"Telemetry: {describe_telemetry(summary, samples)}")
+        reasons = (detector.check(db, run_id, rpi, linux, version, row, summary, variant)
+                   if detector and run_id is not None else [])
+
+        overhead = overhead_row(rpi, linux, python, idle_wait, finalize_wait)
+        append_result_row(OVERHEAD_FILE, overhead, OVERHEAD_HEADERS)
+        print(f"Overhead: {overhead[-1]} s waiting (fixed sleeps: 15 s)")
+    except Exception as error:
+        raise StoredRunError(f"The run is stored, but what follows failed: {error}") from error
+
+    if archiver:
+        # Everything is taken from the recording, so it can leave the project
+        try:
+            path, deleted = archiver.archive_and_prune(
+                recording, f"recording_{rpi}_{linux}_{python}_{time.strftime('%Y%m%dT%H%M%S')}", [device.id],
+                [run_id] if run_id is not None else [])
+            print(f"Archived the recording to {path}, deleted {deleted} archived recordings from the project")
+        except Exception as error:
+            print(f"Archiving the recording failed, it stays in the project: {error}")
+    return reasons
+
+
+def main(otii, device, project, rpi, linux, version, hostname, username, password, trace_dir=None,
+         benchmarks=None, telemetry=None, detector=None, archiver=None, variant=DEFAULT_VARIANT,
+         profile=None, profile_window=PROFILE_WINDOW, reference_run_id=None):
+    '''Connect to the Otii 3 application and run the measurement, retrying once unless the run was stored'''
+    arguments = (otii, device, project, rpi, linux, version, hostname, username, password, trace_dir,
+                 benchmarks, telemetry, detector, archiver, variant, profile, profile_window, reference_run_id)
+    try:
+        return run_benchmarks(*arguments)
+    except StoredRunError:
+        raise
     except Exception as error:
         print(f"Something went wrong: {error}. Retrying")
-        run_benchmarks(otii, rpi, linux, version, hostname, username, password)
+        wait_ssh_reachable(hostname)
+        return run_benchmarks(*arguments)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmarks and record their energy consumption')
+    parser.add_argument('--matrix', default='matrix.json', help='Matrix spec file (see matrix.py)')
+    parser.add_argument('--raw-traces', metavar='DIR',
+                        help='Store the raw 50 kHz main power trace of every run in DIR (e.g. ../../results/traces) and '
+                             'compute energy by integrating it')
+    parser.add_argument('--telemetry', type=float, nargs='?', const=TELEMETRY_INTERVAL, default=0, metavar='SECONDS',
+                        help='Sample CPU frequency, temperature, throttling and load on the Pi at this interval '
+                             f'(default {TELEMETRY_INTERVAL}) during every run. Off unless given: the sampler runs '
+                             'on the Pi inside the measured window')
+    parser.add_argument('--outlier-threshold', type=float, default=OUTLIER_THRESHOLD, metavar='Z',
+                        help='Quarantine and re-run iterations whose robust z-score exceeds Z, that drift '
+                             'or that were throttled (0 disables, see anomaly.py)')
+    parser.add_argument('--archive-recordings', metavar='DIR',
+                        help='Export every Otii recording to compressed files in DIR (e.g. ../../results/recordings) '
+                             'and prune archived ones from the project')
+    parser.add_argument('--archive-channels', nargs='+', default=ARCHIVE_CHANNELS, metavar='CHANNEL',
+                        help='Channels to archive (default: mp mc)')
+    parser.add_argument('--keep-recordings', type=int, default=KEEP_LAST, metavar='N',
+                        help='Archived recordings to keep in the Otii project, besides those with '
+                             'quarantined runs')
+    parser.add_argument('--profile', type=float, nargs='?', const=PROFILE_INTERVAL, metavar='SECONDS',
+                        help='Instead of the matrix iterations, profile every configuration (profiler.py) at this '
+                             f'sampling interval (default {PROFILE_INTERVAL}), each profiled run preceded by an '
+                             'unprofiled reference run, and attribute the energy to functions (energy_profile.py)')
+    parser.add_argument('--profile-runs', type=int, default=1, metavar='N',
+                        help='Profiled runs (and reference runs) per configuration')
+    parser.add_argument('--profile-window', type=float, default=PROFILE_WINDOW, metavar='SECONDS',
+                        help='Length of the power windows the energy is shared out in')
+    args = parser.parse_args()
+    detector = AnomalyDetector(args.outlier_threshold) if args.outlier_threshold else None
+    archiver = None
+    if args.archive_recordings:
+        archiver = RecordingArchiver(args.archive_recordings, ResultsDB(RESULTS_DB), args.archive_channels,
+                                     args.keep_recordings)
+
+    spec = load_matrix(args.matrix)
+    jobs = None if args.profile else matrix_queue(spec)
+
     client = otii_client.OtiiClient()
     with client.connect() as otii:
         # Get a reference to a Arc or Ace device
@@ -151,46 +318,54 @@ if __name__ == '__main__':
 
         # Get the active project
         project = otii.get_active_project()
-        with open("credentials.json") as f:
-            credentials = json.load(f)
-            max = 11     
-            for i in range(max):
-                print(f"Running iteration {i+1} of {max}")
-                try:
-                    main(otii, device, project, "RPi3B+", "Alpine", "python3.13", credentials["hostname"], credentials["username"], credentials["password"])
-                    time.sleep(5)
-                except Exception as error:
-                    print(f"Something went wrong: {error}. Skipping iteration.")
-                    time.sleep(10)
-            for i in range(max):
-                print(f"Running iteration {i+1} of {max}")
-                try:
-                    main(otii, device, project, "RPi3B+", "Alpine", "python3.12", credentials["hostname"], credentials["username"], credentials["password"])
-                    time.sleep(5)
-                except Exception as error:
-                    print(f"Something went wrong: {error}. Skipping iteration.")
-                    time.sleep(10)
-            for i in range(max):
-                print(f"Running iteration {i+1} of {max}")
-                try:
-                    main(otii, device, project, "RPi3B+", "Alpine", "python3.11", credentials["hostname"], credentials["username"], credentials["password"])
-                    time.sleep(5)
-                except Exception as error:
-                    print(f"Something went wrong: {error}. Skipping iteration.")
-                    time.sleep(10)
-            for i in range(max):
-                print(f"Running iteration {i+1} of {max}")
-                try:
-                    main(otii, device, project, "RPi3B+", "Alpine", "python3.10", credentials["hostname"], credentials["username"], credentials["password"])
-                    time.sleep(5)
-                except Exception as error:
-                    print(f"Something went wrong: {error}. Skipping iteration.")
-                    time.sleep(10)
-            for i in range(max):
-                print(f"Running iteration {i+1} of {max}")
+
+        # One device measures one board; run_parallel in orchestrator.py drives several
+        board = spec["boards"][0]
+        if len(spec["boards"]) > 1:
+            print(f"Running the jobs of {board['rpi']}/{board['os']} only; use orchestrator.py for all boards")
+        if args.profile:
+            # The reference run measures the profiler's overhead: same configuration, right before
+            for version, variant in configurations(spec):
+                for i in range(args.profile_runs):
+                    print(f"Profiling {interpreter(version, variant)} ({i + 1} of {args.profile_runs})")
+                    try:
+                        main(otii, device, project, board["rpi"], board["os"], version, board["hostname"],
+                             board["username"], board["password"], args.raw_traces, spec["benchmarks"],
+                             args.telemetry, None, archiver, variant)
+                        reference = ResultsDB(RESULTS_DB).last_run_id(board["rpi"], board["os"], version, variant)
+                        main(otii, device, project, board["rpi"], board["os"], version, board["hostname"],
+                             board["username"], board["password"], args.raw_traces, spec["benchmarks"],
+                             args.telemetry, None, archiver, variant, args.profile, args.profile_window, reference)
+                    except Exception as error:
+                        print(f"Something went wrong: {error}. Skipping.")
+                        wait_ssh_reachable(board["hostname"])
+        else:
+            while True:
+                job = jobs.get((board["rpi"], board["os"]))
+                if job is None:
+                    break
+                counts = jobs.counts()
+                print(f"Running {job.interpreter} iteration {job.iteration} of {spec['iterations']} "
+                      f"({counts['done']} of {sum(counts.values())} jobs done)")
                 try:
-                    main(otii, device, project, "RPi3B+", "Alpine", "python3.9", credentials["hostname"], credentials["username"], credentials["password"])
-                    time.sleep(5)
+                    reasons = main(otii, device, project, job.rpi, job.os, job.version, board["hostname"],
+                                   board["username"], board["password"], args.raw_traces, job.benchmarks,
+                                   args.telemetry, detector, archiver, job.variant)
+                    if not reasons:
+                        jobs.done(job)
+                    elif jobs.quarantined(job, "; ".join(reasons)):
+                        print(f"Quarantined: {'; '.join(reasons)}. Retrying later.")
+                    else:
+                        print(f"Quarantined: {'; '.join(reasons)}. Skipping iteration.")
+                except StoredRunError as error:
+                    # Running the job again would store the iteration twice
+                    print(f"{error}. Keeping the iteration.")
+                    jobs.done(job)
                 except Exception as error:
-                    print(f"Something went wrong: {error}. Skipping iteration.")
-                    time.sleep(10)
\ No newline at end of file
+                    if jobs.failed(job, str(error)):
+                        print(f"Something went wrong: {error}. Retrying later.")
+                    else:
+                        print(f"Something went wrong: {error}. Skipping iteration.")
+                    recovery_wait = wait_ssh_reachable(board["hostname"])
+                    append_result_row(OVERHEAD_FILE, overhead_row(job.rpi, job.os, job.interpreter,
+                                                                  recovery_wait=recovery_wait), OVERHEAD_HEADERS)
@@ -1,20 +1,117 @@
 #!/bin/bash
-# Run this script with desired Python version as argument.
+# Run this script with desired Python version as argument,
+# optionally followed by a comma-separated list of benchmarks.
+#
+#   run_benchmarks.sh [--prepare | --check] <python> [benchmarks]
+#
+# --prepare builds the pyperformance venv for the interpreter and benchmark set
+# once and caches it under $VENV_ROOT, keyed by interpreter path, full version
+# and benchmark list; the cached venv is precompiled. --check exits with 0 if
+# that venv is ready. pyperformance run has no --venv option: it uses the venv
+# at its default location, ./venv/<run id>, which is also where venv create
+# puts it without --venv. Both therefore run in the cache directory, so a
+# measured run finds the prepared venv with its dependencies installed and
+# installs nothing during the recording; if it has not been prepared, it is
+# created inside the run as its own phase.
+
+MODE=run
+if [ "$1" = "--prepare" ] || [ "$1" = "--check" ]; then
+    MODE=${1#--}
+    shift
+fi
+
+BENCHMARKS=${2:-2to3,chameleon,tornado_http}
+VENV_ROOT=${PYENERGY_VENVS:-$HOME/.cache/pyenergy/venvs}
+
+# Under profiler.py, pass its environment on to the pyperf worker processes
+INHERIT=""
+if [ -n "$PYENERGY_PROFILE" ]; then
+    INHERIT="--inherit-environ PYTHONPATH,PYENERGY_PROFILE,PYENERGY_PROFILE_INTERVAL,PYENERGY_PROFILER"
+fi
+
+# Print a phase marker: PHASE <name> <epoch seconds> <utc offset seconds>
+phase() {
+    echo "PHASE $1 $($PYTHON_BIN -c 'import time; print(time.time(), -time.altzone if time.localtime().tm_isdst > 0 else -time.timezone)')"
+}
+
+# Cache directory of the venv for an interpreter and the benchmark set; pyperformance runs in it
+venv_dir() {
+    KEY=$($1 -c "import hashlib, sys; print(hashlib.sha256('\n'.join([sys.executable, sys.version, '$BENCHMARKS']).encode()).hexdigest()[:16])")
+    echo "$VENV_ROOT/$KEY"
+}
+
+# Build and precompile the venv unless it is already cached
+prepare_venv() {
+    PYTHON_BIN=$1
+    PYTHON_PATH=$2
+    VENV=$(venv_dir $PYTHON_PATH)
+    if [ ! -f "$VENV/.ready" ]; then
+        echo "Preparing venv for $PYTHON_PATH ($BENCHMARKS) in $VENV..."
+        if [ -d "$VENV" ]; then
+            chmod -R u+w "$VENV" && rm -rf "$VENV"
+        fi
+        mkdir -p "$VENV"
+        (cd "$VENV" && $PYTHON_BIN -m pyperformance venv create --benchmarks=$BENCHMARKS --python=$PYTHON_PATH >&2) || exit 1
+        # run installs the pyperf version pinned by pyperformance into the venv; do it now, not in the recording
+        PYPERF_PIN=$($PYTHON_BIN -c "from pyperformance.venv import REQUIREMENTS_FILE; print(next((l.split('#')[0].strip() for l in open(REQUIREMENTS_FILE) if l.startswith('pyperf==')), ''))" 2>/dev/null)
+        for VENV_PYTHON in "$VENV"/venv/*/bin/python; do
+            if [ -n "$PYPERF_PIN" ]; then
+                "$VENV_PYTHON" -m pip install -q "$PYPERF_PIN" >&2 || exit 1
+            fi
+            "$VENV_PYTHON" -m compileall -q "$(dirname "$(dirname "$VENV_PYTHON")")" >&2
+        done
+        touch "$VENV/.ready"
+    fi
+    echo "VENV $VENV"
+}
 
 # Function to run benchmarks on a specific Python version
 run_benchmarks() {
     PYTHON_BIN=$1
-    PYTHON_PATH=$2 
-    $PYTHON_BIN -m pyperformance run --benchmarks=2to3,chameleon,tornado_http --python=$PYTHON_PATH -o $PYTHON_BIN.json
+    PYTHON_PATH=$2
+    VENV=$(venv_dir $PYTHON_PATH)
+    # <python>.json in the working directory, also when the interpreter is given by path (agent.py)
+    OUTPUT="$PWD/$(basename $PYTHON_BIN).json"
+    if [ -f "$VENV/.ready" ]; then
+        phase benchmarks
+        (cd "$VENV" && $PYTHON_BIN -m pyperformance run --benchmarks=$BENCHMARKS --python=$PYTHON_PATH $INHERIT -o "$OUTPUT")
+    else
+        echo "No prepared venv for $PYTHON_PATH ($BENCHMARKS); creating one inside the run" >&2
+        # Create the benchmark venv and install dependencies as a separate phase
+        phase setup
+        $PYTHON_BIN -m pyperformance venv create --benchmarks=$BENCHMARKS --python=$PYTHON_PATH >&2
+        phase benchmarks
+        $PYTHON_BIN -m pyperformance run --benchmarks=$BENCHMARKS --python=$PYTHON_PATH $INHERIT -o "$OUTPUT"
+    fi
+    # The callers decide from the exit status whether the run is stored
+    status=$?
+    phase end
+    return $status
 }
 
 # Script finds path to desired Python version
 if command -v $1 &>/dev/null; then
     PYTHON_PATH=$($1 -c "import sys; print(sys.executable)")
+    case $MODE in
+        prepare)
+            prepare_venv $1 $PYTHON_PATH
+            exit $?
+            ;;
+        check)
+            [ -f "$(venv_dir $PYTHON_PATH)/.ready" ]
+            exit $?
+            ;;
+    esac
     echo "Running benchmarks for $1 at $PYTHON_PATH..."
     run_benchmarks $1 $PYTHON_PATH
+    status=$?
+    if [ $status -ne 0 ]; then
+        echo "Benchmarking $1 failed with status $status" >&2
+        exit $status
+    fi
 else
-    echo "$1 is not installed. Exiting."
+    echo "$1 is not installed. Exiting." >&2
+    exit 1
 fi
 
 echo "Benchmarking complete for all versions."
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Multi-core scaling sweep: energy per unit of work against active cores and workers.
+
+The benchmarks of run_benchmarks.sh are essentially single-threaded. This
+sweep runs a parallel workload (scaling_workload.py) with a fixed amount of
+work on every board and interpreter while varying
+
+    cores      the number of active cores; the workload is pinned to cores
+               0..n-1 with taskset (cpuset -l on FreeBSD)
+    workers    worker processes, threads or servers, --workers-per-core
+               times the number of cores
+    workload   processes (multiprocessing pool), threads (thread pool, only
+               swept on free-threaded builds, the "ft" variant) and asyncio
+               (HTTP server processes under concurrent local clients)
+
+Every point is measured like an orchestrator job: the worker waits for its Pi
+to idle (settle.py), estimates the clock offset, runs the workload over SSH
+during the shared recording and takes the energy of the window between the
+workload's PHASE markers on its own Otii device (orchestrator.window_stats).
+Points are stored in the scaling table of the results database
+(results_db.py), apart from the benchmark runs; points already in it are
+skipped, so an interrupted sweep resumes where it stopped.
+
+analysis/scaling_report.py reports joules per unit of work, speedup and
+parallel efficiency per core count, and the most energy-efficient degree of
+parallelism for each board, interpreter and workload.
+
+Usage:
+    python3 scaling.py --matrix matrix.json [--simulate]
+    python3 scaling.py --boards boards.json --versions python3.13 --variants default ft
+    python3 scaling.py --boards boards.json --versions python3.13 --cores 1 2 4 --workers-per-core 1 2
+
+With --matrix the boards, versions and variants come from a matrix spec
+(matrix.py); the sweep's own settings still come from the command line.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+from matrix import VARIANTS, configurations, interpreter, load_matrix
+from orchestrator import (RESULTS_DIR, AppException, JobQueue, SharedRecording, configure_boards, paramiko_client,
+                          reconnectable, wait_recorded, window_stats)
+from phases import estimate_clock_offset, parse_markers
+from results_db import DB_NAME, DEFAULT_VARIANT, ResultsDB
+from scaling_workload import DEFAULT_UNIT_SIZE, DEFAULT_UNITS, WORKLOADS
+from settle import wait_pi_idle
+
+WORKLOAD_SCRIPT = "Python_Application_Energy_Consumption/scripts/experiment/scaling_workload.py"
+DEFAULT_CORES = [1, 2, 3, 4]
+# Variants whose threads run in parallel; the thread pool is only swept on these
+FREE_THREADED = ("ft",)
+
+
+class Point(namedtuple("Point", ["rpi", "os", "version", "variant", "workload", "cores", "workers", "units",
+                                 "unit_size", "iteration"])):
+    '''One measurement of the sweep on one board'''
+
+    __slots__ = ()
+
+    @property
+    def interpreter(self):
+        return interpreter(self.version, self.variant)
+
+    def __str__(self):
+        return (f"{self.interpreter} {self.workload} on {self.cores} cores with {self.workers} workers, "
+                f"iteration {self.iteration}")
+
+
+def sweep(entries, versions, variants, workloads, cores, workers_per_core, iterations, units=DEFAULT_UNITS,
+          unit_size=DEFAULT_UNIT_SIZE):
+    '''Every point of the sweep, iterations outermost so each setting is spread over the whole sweep'''
+    configs = configurations({"versions": versions, "variants": variants})
+    return [Point(e["rpi"], e["os"], version, variant, workload, n, n * k, units, unit_size, i + 1)
+            for i in range(iterations) for version, variant in configs for workload in workloads
+            if workload != "threads" or variant in FREE_THREADED
+            for n in cores for k in workers_per_core for e in entries]
+
+
+def remaining(db, points):
+    '''The points whose iteration is not yet in the results database'''
+    return [p for p in points
+            if db.count_scaling(p.rpi, p.os, p.version, p.variant, p.workload, p.cores, p.workers, p.units,
+                                p.unit_size) < p.iteration]
+
+
+def pin(os_name, cores, command):
+    '''Run a command, and every process it starts, on cores 0..cores-1 only'''
+    if os_name.lower() == "freebsd":
+        return f"cpuset -l 0-{cores - 1} {command}"
+    return f"taskset -c 0-{cores - 1} {command}"
+
+
+def scaling_command(point):
+    return pin(point.os, point.cores,
+               f"{point.interpreter} {WORKLOAD_SCRIPT} --workload {point.workload} --workers {point.workers} "
+               f"--units {point.units} --unit-size {point.unit_size}")
+
+
+def parse_result(lines):
+    '''The RESULT line of scaling_workload.py, or None'''
+    for line in lines:
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    return None
+
+
+def run_point(board, point, ssh_client, shared, otii_lock, db):
+    '''Measure one point of the sweep on a board and store it; return its energy, result and idle wait'''
+    idle_wait = wait_pi_idle(ssh_client)
+    clock_offset = estimate_clock_offset(ssh_client, point.interpreter)
+    recording, recording_start = shared.acquire()
+    try:
+        stdin, stdout, stderr = ssh_client.exec_command(scaling_command(point))
+        exit_status = stdout.channel.recv_exit_status()
+    finally:
+        shared.release()
+    try:
+        if exit_status != 0:
+            raise AppException(f"{board}: workload exited with status {exit_status}: "
+                               f"{stderr.read().decode().strip()}")
+        lines = stdout.read().decode().splitlines()
+        markers, _ = parse_markers(lines)
+        result = parse_result(lines)
+        if "scaling" not in markers or "end" not in markers or result is None:
+            raise AppException(f"{board}: workload printed no PHASE markers or result")
+        window = (markers["scaling"] - clock_offset, markers["end"] - clock_offset)
+        info = wait_recorded(recording, board.device.id, window, recording_start, otii_lock)
+        with otii_lock:
+            start, end, statistics = window_stats(recording, board.device.id, info, window, recording_start)
+    finally:
+        shared.finished(recording)
+    db.insert_scaling(point.rpi, point.os, point.version, point.variant, point.workload, point.cores,
+                      point.workers, point.units, point.unit_size, point.iteration, start, end,
+                      statistics["average"], result)
+    return statistics["average"] * (end - start), result, idle_wait
+
+
+def worker(board, points, shared, otii_lock, ssh_factory, failures, db, recover):
+    def connect():
+        client = ssh_factory()
+        client.connect(board.hostname, username=board.username, password=board.password)
+        return client
+
+    ssh_client = connect()
+    try:
+        while True:
+            point = points.get(board.key)
+            if point is None:
+                return
+            try:
+                energy, result, idle_wait = run_point(board, point, ssh_client, shared, otii_lock, db)
+                print(f"[{board}] {point}: {energy:.5f} J, {energy / point.units:.5f} J/unit, "
+                      f"{result['seconds']:.3f} s (waited {idle_wait:.1f} s for the Pi to idle)")
+            except Exception as error:
+                print(f"[{board}] {point}: something went wrong: {error}. Skipping point.")
+                failures.append((board.key, point, str(error)))
+                try:
+                    ssh_client.close()
+                except Exception:
+                    pass
+                recover(board)
+                ssh_client = connect()
+    finally:
+        ssh_client.close()
+
+
+def run_sweep(otii, entries, points, ssh_factory, results_dir=RESULTS_DIR, recover=reconnectable):
+    '''Drive every board in its own thread until all points are measured; return the failures'''
+    os.makedirs(results_dir, exist_ok=True)
+    db = ResultsDB(os.path.join(results_dir, DB_NAME))
+    queue = JobQueue(remaining(db, points))
+    print(f"{len(queue)} of {len(points)} points to measure")
+    otii_lock = threading.RLock()
+    with otii_lock:
+        boards = configure_boards(otii, entries)
+        project = otii.get_active_project()
+    shared = SharedRecording(project, otii_lock)
+    failures = []
+    threads = [threading.Thread(target=worker, name=str(board),
+                                args=(board, queue, shared, otii_lock, ssh_factory, failures, db, recover))
+               for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure energy and speedup of parallel workloads per core count')
+    parser.add_argument('--matrix', help='Matrix spec file; replaces --boards, --versions and --variants')
+    parser.add_argument('--boards', default='boards.json', help='Board configuration file')
+    parser.add_argument('--versions', nargs='+', help='Python executables, e.g. python3.13')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=[DEFAULT_VARIANT],
+                        help='Interpreter build variants to measure of every version (see matrix.py)')
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=WORKLOADS,
+                        help='Parallel workloads (threads only runs on free-threaded variants)')
+    parser.add_argument('--cores', nargs='+', type=int, default=DEFAULT_CORES, help='Active core counts')
+    parser.add_argument('--workers-per-core', nargs='+', type=int, default=[1],
+                        help='Workers per active core')
+    parser.add_argument('--units', type=int, default=DEFAULT_UNITS, help='Units of work per point')
+    parser.add_argument('--unit-size', type=int, default=DEFAULT_UNIT_SIZE, help='Loop iterations per unit')
+    parser.add_argument('--iterations', type=int, default=5, help='Iterations per point')
+    parser.add_argument('--results-dir', default=None,
+                        help=f'Directory holding results.db (default {RESULTS_DIR}, '
+                             'or a temporary directory with --simulate)')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Use local stand-ins for the Otii server and the boards')
+    args = parser.parse_args()
+    if min(args.cores + args.workers_per_core) < 1:
+        parser.error("--cores and --workers-per-core must be at least 1")
+
+    if args.simulate:
+        from stand_ins import StandInOtii, StandInSSHClient
+        results_dir = args.results_dir or tempfile.mkdtemp(prefix="simulated_results_")
+        recover = lambda board: 0.0
+    else:
+        from otii_tcp_client import otii_client
+        results_dir = args.results_dir
+        recover = reconnectable
+
+    if args.matrix:
+        spec = load_matrix(args.matrix)
+        entries, versions, variants = spec["boards"], spec["versions"], spec["variants"]
+        results_dir = results_dir or spec["results_dir"]
+    elif args.versions:
+        with open(args.boards) as f:
+            entries = json.load(f)
+        versions, variants = args.versions, args.variants
+    else:
+        parser.error("--versions is required without --matrix")
+    results_dir = results_dir or RESULTS_DIR
+    points = sweep(entries, versions, variants, args.workloads, args.cores, args.workers_per_core,
+                   args.iterations, args.units, args.unit_size)
+
+    if args.simulate:
+        connection, ssh_factory = StandInOtii(len(entries)), StandInSSHClient
+    else:
+        connection, ssh_factory = otii_client.OtiiClient().connect(), paramiko_client
+
+    print(f"Writing results to {results_dir}")
+    with connection as otii:
+        failures = run_sweep(otii, entries, points, ssh_factory, results_dir, recover)
+    for board_key, point, error in failures:
+        print(f"Failed: {board_key} {point}: {error}")
+    print(f"Report: python3 ../analysis/scaling_report.py --results-dir {results_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Parallel workload for the multi-core scaling sweep (scaling.py), run on the Pi.
+
+The benchmarks of run_benchmarks.sh are essentially single-threaded, so they
+say nothing about how energy scales with the number of active cores. This
+script does a fixed amount of work, --units units of a pure-Python CPU kernel,
+spread over --workers workers in one of three ways:
+
+    processes  a multiprocessing pool of workers processes
+    threads    a thread pool of workers threads; only parallel on a
+               free-threaded build (python3.13t), serialised by the GIL otherwise
+    asyncio    workers asyncio HTTP server processes sharing one listening
+               socket on localhost, each unit being one request, sent by
+               an asyncio client over 2 * workers concurrent keep-alive
+               connections
+
+scaling.py pins the whole process tree to the cores under test with taskset
+(cpuset on FreeBSD), so the pool never uses more cores than that. It prints
+PHASE markers (like run_benchmarks.sh) around the parallel section, pool
+start-up included as it is part of the cost of parallelism, and one result
+line:
+
+    PHASE scaling <epoch seconds> <utc offset seconds>
+    PHASE end <epoch seconds> <utc offset seconds>
+    RESULT {"workload": ..., "workers": n, "units": n, "seconds": s, "checksum": n, "gil": true}
+
+The checksum sums the final generator state of every unit, so it depends on
+every seed and step but is the same for every workload and worker count of
+a unit count and unit size, and a broken run is easy to spot. Only the standard library is
+used.
+
+Usage:
+    python3.13 scaling_workload.py --workload processes --workers 4 --units 256
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WORKLOADS = ["processes", "threads", "asyncio"]
+DEFAULT_UNITS = 256
+# Loop iterations of one unit, a few tenths of a second of CPU time on a Raspberry Pi 4
+DEFAULT_UNIT_SIZE = 200000
+CONNECTIONS_PER_WORKER = 2
+
+
+def work_unit(seed, size=DEFAULT_UNIT_SIZE):
+    '''One unit of CPU-bound pure-Python work: integer arithmetic and dict updates; return the final state'''
+    x = seed + 1
+    counts = {}
+    for _ in range(size):
+        x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+        key = x & 1023
+        counts[key] = counts.get(key, 0) + 1
+    # The low bits of the generator repeat every 1024 steps, so the counts alone do not depend on the seed
+    return x
+
+
+def _unit(args):
+    return work_unit(*args)
+
+
+def phase(name):
+    utc_offset = -time.altzone if time.localtime().tm_isdst > 0 else -time.timezone
+    print(f"PHASE {name} {time.time()} {utc_offset}", flush=True)
+
+
+def gil_enabled():
+    is_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_enabled is None else is_enabled()
+
+
+def run_processes(workers, units, size):
+    # fork keeps the pool start-up cheap and the same on every Python version
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        return sum(pool.imap_unordered(_unit, [(i, size) for i in range(units)], chunksize=1))
+
+
+def run_threads(workers, units, size):
+    with ThreadPoolExecutor(workers) as pool:
+        return sum(pool.map(work_unit, range(units), [size] * units))
+
+
+async def _handle(reader, writer, size):
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            seed = int(request.split(b" ", 2)[1].rsplit(b"/", 1)[1])
+            body = str(work_unit(seed, size)).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(sock, size):
+    async def serve():
+        server = await asyncio.start_server(lambda r, w: _handle(r, w, size), sock=sock)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+
+async def _client(port, seeds):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    total = 0
+    try:
+        for seed in seeds:
+            writer.write(b"GET /unit/%d HTTP/1.1\r\nHost: localhost\r\n\r\n" % seed)
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = int(headers.lower().split(b"content-length:", 1)[1].split(b"\r\n", 1)[0])
+            total += int(await reader.readexactly(length))
+    finally:
+        writer.close()
+    return total
+
+
+async def _clients(port, units, connections):
+    results = await asyncio.gather(*(_client(port, range(i, units, connections)) for i in range(connections)))
+    return sum(results)
+
+
+def run_asyncio(workers, units, size):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    ctx = multiprocessing.get_context("fork")
+    servers = [ctx.Process(target=_serve, args=(sock, size), daemon=True) for _ in range(workers)]
+    for server in servers:
+        server.start()
+    try:
+        connections = min(units, CONNECTIONS_PER_WORKER * workers)
+        return asyncio.run(_clients(sock.getsockname()[1], units, connections))
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.join()
+        sock.close()
+
+
+RUNNERS = {"processes": run_processes, "threads": run_threads, "asyncio": run_asyncio}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spread a fixed amount of CPU-bound work over parallel workers')
+    parser.add_argument('--workload', choices=WORKLOADS, required=True, help='How the work is parallelised')
+    parser.add_argument('--workers', type=int, required=True, help='Worker processes, threads or servers')
+    parser.add_argument('--units', type=int, default=DEFAULT_UNITS, help='Units of work to do')
+    parser.add_argument('--unit-size', type=int, default=DEFAULT_UNIT_SIZE, help='Loop iterations per unit')
+    args = parser.parse_args()
+    if args.workers < 1 or args.units < 1:
+        parser.error("--workers and --units must be at least 1")
+
+    phase("scaling")
+    t0 = time.perf_counter()
+    checksum = RUNNERS[args.workload](args.workers, args.units, args.unit_size)
+    seconds = time.perf_counter() - t0
+    phase("end")
+    print("RESULT " + json.dumps({"workload": args.workload, "workers": args.workers, "units": args.units,
+                                  "seconds": seconds, "checksum": checksum, "gil": gil_enabled()}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Wait for the Otii recording and the Pi to settle instead of sleeping.
+
+The orchestrators used to sleep 10 s before reading the last recording, 5 s
+between iterations and 10 s after a failure. These helpers poll instead and
+return as soon as the condition holds, with the old sleeps replaced by
+timeouts as the upper bound:
+
+    wait_recording_finalized  recording stopped and its 'mp' channel no longer growing
+    wait_pi_idle              CPU idle share on the Pi above a threshold, sampled
+                              from /proc/stat (kern.cp_time on FreeBSD) over half a second
+    wait_ssh_reachable        SSH port of the Pi accepts connections again
+
+Every helper returns the seconds it waited, which the orchestrators log per
+iteration in ../../results/overhead.csv.
+"""
+
+import socket
+import time
+
+POLL_INTERVAL = 0.25
+FINALIZE_TIMEOUT = 30
+IDLE_TIMEOUT = 60
+IDLE_THRESHOLD = 0.95
+RECONNECT_TIMEOUT = 120
+
+# Two samples of the aggregate CPU counters, half a second apart
+CPU_PROBE = ("for i in 1 2; do head -n1 /proc/stat 2>/dev/null || sysctl -n kern.cp_time; "
+             "[ $i = 1 ] && sleep 0.5; done")
+
+
+def wait_until(predicate, timeout, poll=POLL_INTERVAL):
+    '''Poll predicate until it is true or timeout passes; return (ok, seconds waited)'''
+    start = time.monotonic()
+    while True:
+        if predicate():
+            return True, time.monotonic() - start
+        if time.monotonic() - start >= timeout:
+            return False, time.monotonic() - start
+        time.sleep(poll)
+
+
+def wait_recording_finalized(project, device_id, timeout=FINALIZE_TIMEOUT):
+    '''Return (last recording, seconds waited) once it has stopped and its data is complete'''
+    state = {"to": None, "id": None}
+
+    def finalized():
+        # Every call returns a new Recording object, so the same recording is recognized by its id
+        recording = project.get_last_recording()
+        if recording is None or recording.is_running():
+            return False
+        end = recording.get_channel_info(device_id, 'mp')["to"]
+        stable = state["id"] == recording.id and state["to"] == end
+        state.update(id=recording.id, to=end)
+        return stable
+
+    ok, waited = wait_until(finalized, timeout)
+    if not ok:
+        print(f"Recording not finalized after {timeout} s, reading it anyway")
+    return project.get_last_recording(), waited
+
+
+def _cpu_counters(line):
+    '''(busy, idle) jiffies from a /proc/stat cpu line or kern.cp_time'''
+    parts = line.split()
+    if parts and parts[0] == "cpu":
+        values = [int(v) for v in parts[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+    else:
+        values = [int(v) for v in parts]
+        idle = values[4]
+    return sum(values) - idle, idle
+
+
+def cpu_idle(ssh_client):
+    '''Share of CPU time the Pi spent idle over the probe interval'''
+    stdin, stdout, stderr = ssh_client.exec_command(CPU_PROBE)
+    lines = [line for line in stdout.read().decode().splitlines() if line.strip()]
+    (busy0, idle0), (busy1, idle1) = _cpu_counters(lines[0]), _cpu_counters(lines[-1])
+    total = (busy1 - busy0) + (idle1 - idle0)
+    return (idle1 - idle0) / total if total else 1.0
+
+
+def wait_pi_idle(client, threshold=IDLE_THRESHOLD, timeout=IDLE_TIMEOUT, probe=cpu_idle):
+    '''Return seconds waited until the Pi's CPU idle share reaches threshold'''
+    ok, waited = wait_until(lambda: probe(client) >= threshold, timeout, poll=0)
+    if not ok:
+        print(f"Pi not idle after {timeout} s, continuing")
+    return waited
+
+
+def ssh_reachable(hostname, port=22, timeout=2):
+    try:
+        with socket.create_connection((hostname, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_ssh_reachable(hostname, port=22, timeout=RECONNECT_TIMEOUT):
+    '''Return seconds waited until the Pi accepts SSH connections again'''
+    ok, waited = wait_until(lambda: ssh_reachable(hostname, port), timeout, poll=1)
+    if not ok:
+        print(f"{hostname}:{port} not reachable after {timeout} s")
+    return waited
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Otii server and the Raspberry Pi SSH endpoints.
+
+They implement the subset of the otii_tcp_client and paramiko APIs that the
+orchestrator uses, so a full batch can be run on a laptop without any
+hardware:
+
+    python3 orchestrator.py --simulate --boards boards.json ...
+
+The stand-in Otii server raises if two threads call into it at the same time,
+mirroring the single TCP connection of the real client, so missing locking in
+the orchestrator shows up immediately. A benchmark command on a stand-in Pi
+sleeps for workload_seconds and reports success; the CPU probe of settle.py
+reports the Pi busy for cooldown_seconds after each benchmark. Wrapped in
+telemetry.py, it leaves synthetic samples of the run for 'cat telemetry.json'.
+It also leaves the pyperf JSON of one synthetic benchmark run, which the
+stand-in SFTP client returns.
+The parallel workload of scaling.py finishes sooner the more cores it is
+pinned to, with some loss per extra core, and prints its markers and result.
+cpufreq.py pins a simulated CPU frequency, and benchmarks slow down below the
+maximum frequency.
+
+start_stand_in_agent runs the real agent.py server on localhost with a
+stand-in workload, so --transport agent exercises the actual protocol. The
+workload writes the same synthetic pyperf JSON.
+"""
+
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from agent import AgentClient, AgentServer
+
+# Stand-in workload of the agent: PHASE markers around a short sleep, then the pyperf JSON of the sleep
+AGENT_WORKLOAD = ("import json, os, sys, time; sys.path.insert(0, {here!r}); from stand_ins import synthetic_pyperf; "
+                  "start = time.time(); print('PHASE benchmarks', start); time.sleep({seconds}); end = time.time(); "
+                  "json.dump(synthetic_pyperf(start, end), open(os.path.basename(sys.argv[1]) + '.json', 'w')); "
+                  "print('PHASE end', end)")
+# Simulated SSH channel and shell start-up before run_benchmarks.sh prints its first marker
+SSH_STARTUP = 0.03
+# Share of the ideal speedup lost per extra core by the simulated scaling workload
+SCALING_LOSS = 0.1
+# Simulated CPU frequencies (MHz) of cpufreq.py: the maximum and the ones governors other than these run at
+MAX_FREQUENCY = 1500
+GOVERNOR_FREQUENCIES = {"powersave": 600, "conservative": 1000, "minimum": 600}
+
+
+class ConcurrentAccessError(RuntimeError):
+    '''Two threads used the stand-in Otii connection at once'''
+
+
+class _Connection:
+    def __init__(self):
+        self._busy = threading.Lock()
+
+    def call(self, func, *args):
+        if not self._busy.acquire(blocking=False):
+            raise ConcurrentAccessError("Otii connection used from two threads at once")
+        try:
+            return func(*args)
+        finally:
+            self._busy.release()
+
+
+class StandInDevice:
+    def __init__(self, connection, name, power):
+        self._connection = connection
+        self.name = name
+        self.id = f"{name}-id"
+        self.type = "Arc"
+        self.power = power
+
+    def set_main_voltage(self, value):
+        pass
+
+    def set_exp_voltage(self, value):
+        pass
+
+    def set_max_current(self, value):
+        pass
+
+    def enable_channel(self, channel, enable):
+        pass
+
+    def add_to_project(self):
+        pass
+
+
+class _RecordingState:
+    '''A recording in the stand-in server, shared by the Recording objects handed out for it'''
+
+    def __init__(self, recording_id, name):
+        self.id = recording_id
+        self.name = name
+        self.start = time.monotonic()
+        self.stop = None
+
+
+class StandInRecording:
+    '''Like the client's Recording, a new object on every call, identified by its id'''
+
+    SAMPLE_RATE = 50000
+
+    def __init__(self, connection, devices, state, project=None):
+        self._connection = connection
+        self._devices = {d.id: d for d in devices}
+        self._project = project
+        self._state = state
+        self.id = state.id
+
+    @property
+    def name(self):
+        return self._state.name
+
+    def _elapsed(self):
+        return (self._state.stop or time.monotonic()) - self._state.start
+
+    def is_running(self):
+        return self._connection.call(lambda: self._state.stop is None)
+
+    def get_channel_info(self, device_id, channel):
+        return self._connection.call(lambda: {
+            "offset": 0.0, "from": 0.0, "to": round(self._elapsed(), 5), "sample_rate": self.SAMPLE_RATE})
+
+    def get_channel_data_count(self, device_id, channel):
+        return self._connection.call(lambda: int(self._elapsed() * self.SAMPLE_RATE))
+
+    def get_channel_data(self, device_id, channel, index, count):
+        def data():
+            # Power on mp, current at 5.1 V on mc, reproducible per sample index
+            level = self._devices[device_id].power / (5.1 if channel == "mc" else 1.0)
+            rnd = random.Random(index)
+            return {"timestamp": index / self.SAMPLE_RATE, "interval": 1 / self.SAMPLE_RATE,
+                    "values": [level * rnd.uniform(0.9, 1.1) for _ in range(count)]}
+        return self._connection.call(data)
+
+    def get_channel_statistics(self, device_id, channel, from_time, to_time):
+        def stats():
+            power = self._devices[device_id].power
+            return {"min": power * 0.7, "max": power * 1.4,
+                    "average": power * random.uniform(0.98, 1.02),
+                    "energy": power * (to_time - from_time)}
+        return self._connection.call(stats)
+
+    def rename(self, name):
+        self._connection.call(setattr, self._state, "name", name)
+
+    def delete(self):
+        def delete():
+            if self._project is not None:
+                self._project._recordings.remove(self._state)
+        self._connection.call(delete)
+
+
+class StandInProject:
+    def __init__(self, connection, devices):
+        self._connection = connection
+        self._devices = devices
+        self._recordings = []
+        self._ids = itertools.count(1)
+
+    def _recording(self, state):
+        return StandInRecording(self._connection, self._devices, state, self)
+
+    def start_recording(self):
+        def start():
+            recording_id = next(self._ids)
+            self._recordings.append(_RecordingState(recording_id, f"Recording {recording_id}"))
+        self._connection.call(start)
+
+    def stop_recording(self):
+        def stop():
+            self._recordings[-1].stop = time.monotonic()
+        self._connection.call(stop)
+
+    def get_last_recording(self):
+        return self._connection.call(lambda: self._recording(self._recordings[-1]) if self._recordings else None)
+
+    def get_recordings(self):
+        return self._connection.call(lambda: [self._recording(state) for state in self._recordings])
+
+
+class StandInOtii:
+    '''Stand-in for otii_client.OtiiClient().connect() with n_devices Arcs'''
+
+    def __init__(self, n_devices=2, power=2.5):
+        self._connection = _Connection()
+        self._devices = [StandInDevice(self._connection, f"Arc{i + 1}", power * (1 + 0.1 * i))
+                         for i in range(n_devices)]
+        self._project = StandInProject(self._connection, self._devices)
+
+    def get_devices(self, timeout=10):
+        return self._connection.call(lambda: list(self._devices))
+
+    def get_active_project(self):
+        return self._project
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Channel:
+    def __init__(self, done, status):
+        self._done = done
+        self._status = status
+
+    def recv_exit_status(self):
+        self._done.wait()
+        return self._status
+
+
+class _Stream(io.BytesIO):
+    def __init__(self, data, channel):
+        super().__init__(data)
+        self.channel = channel
+
+
+def synthetic_pyperf(start, end, name="stand_in"):
+    '''pyperf JSON of one worker run of a benchmark between two epochs, dated in UTC'''
+    duration = end - start
+    date = datetime.datetime.fromtimestamp(start, datetime.timezone.utc).replace(tzinfo=None).isoformat()
+    run = {"metadata": {"date": date, "duration": duration}, "warmups": [[1, 0.2 * duration]],
+           "values": [0.35 * duration, 0.35 * duration]}
+    return {"metadata": {"loops": 1}, "benchmarks": [{"metadata": {"name": name}, "runs": [run]}]}
+
+
+class _StandInSFTP:
+    '''Stand-in for paramiko.SFTPClient over the files left on a stand-in Pi'''
+
+    def __init__(self, files):
+        self._files = files
+
+    def open(self, path, mode="r"):
+        if path not in self._files:
+            raise FileNotFoundError(2, "No such file", path)
+        return io.BytesIO(self._files[path])
+
+    def remove(self, path):
+        self._files.pop(path, None)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class StandInSSHClient:
+    '''Stand-in for paramiko.SSHClient running a simulated benchmark'''
+
+    def __init__(self, workload_seconds=0.2, cooldown_seconds=0.1):
+        self.workload_seconds = workload_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.hostname = None
+        self._busy_until = 0.0
+        self._jiffies = [0, 0]
+        self._telemetry = None
+        self._files = {}
+        self._frequency = MAX_FREQUENCY
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, username=None, password=None, **kwargs):
+        self.hostname = hostname
+
+    def _cpu_line(self, busy):
+        self._jiffies[0] += 45 if busy else 1
+        self._jiffies[1] += 5 if busy else 49
+        return f"cpu  {self._jiffies[0]} 0 0 {self._jiffies[1]} 0 0 0 0 0 0\n"
+
+    def exec_command(self, command):
+        done = threading.Event()
+        if "/proc/stat" in command:
+            busy = time.monotonic() < self._busy_until
+            output = (self._cpu_line(busy) + self._cpu_line(busy)).encode()
+            done.set()
+            channel = _Channel(done, 0)
+            return io.BytesIO(), _Stream(output, channel), _Stream(b"", channel)
+        if "print(time.time())" in command:
+            done.set()
+            channel = _Channel(done, 0)
+            return io.BytesIO(), _Stream(f"{time.time()}\n".encode(), channel), _Stream(b"", channel)
+        if command.startswith("cat telemetry.json"):
+            done.set()
+            telemetry, self._telemetry = self._telemetry, None
+            channel = _Channel(done, 0 if telemetry else 1)
+            return (io.BytesIO(), _Stream(json.dumps(telemetry).encode() if telemetry else b"", channel),
+                    _Stream(b"" if telemetry else b"cat: telemetry.json: No such file or directory", channel))
+        output = f"{self.hostname}: {command}\n"
+        duration = 0.0
+        if "--prepare" in command:
+            output += "VENV /home/pi/.cache/pyenergy/venvs/0000000000000000\n"
+        elif "cpufreq.py" in command:
+            output = self._cpufreq(command)
+        elif "run_benchmarks.sh" in command:
+            duration = SSH_STARTUP + self.workload_seconds * MAX_FREQUENCY / self._frequency
+            now = time.time()
+            output += f"PHASE benchmarks {now + SSH_STARTUP}\nPHASE end {now + duration}\n"
+            if "telemetry.py" in command:
+                self._telemetry = self._synthetic_telemetry(now, duration, self._frequency)
+            interpreter = re.search(r"run_benchmarks\.sh (\S+)", command).group(1)
+            pyperf = synthetic_pyperf(now + SSH_STARTUP, now + duration)
+            self._files[f"{interpreter}.json"] = json.dumps(pyperf).encode()
+        elif "scaling_workload.py" in command:
+            markers, duration = self._scaling_workload(command)
+            output += markers
+        self._busy_until = time.monotonic() + duration + self.cooldown_seconds
+        threading.Timer(duration, done.set).start()
+        channel = _Channel(done, 0)
+        return io.BytesIO(), _Stream(output.encode(), channel), _Stream(b"", channel)
+
+    def _scaling_workload(self, command):
+        cores = int(re.search(r"(?:taskset -c|cpuset -l) 0-(\d+)", command).group(1)) + 1
+        workers = int(re.search(r"--workers (\d+)", command).group(1))
+        units = int(re.search(r"--units (\d+)", command).group(1))
+        parallel = min(cores, workers)
+        seconds = self.workload_seconds / (parallel - SCALING_LOSS * (parallel - 1))
+        now = time.time()
+        result = {"workload": re.search(r"--workload (\w+)", command).group(1), "workers": workers,
+                  "units": units, "seconds": seconds, "checksum": units,
+                  "gil": not re.search(r"python[\d.]+t ", command)}
+        markers = (f"PHASE scaling {now + SSH_STARTUP} 0\nPHASE end {now + SSH_STARTUP + seconds} 0\n"
+                   f"RESULT {json.dumps(result)}\n")
+        return markers, SSH_STARTUP + seconds
+
+    def _cpufreq(self, command):
+        fixed = re.search(r"--freq (\d+)", command)
+        governor = re.search(r"--governor (\w+)", command)
+        if fixed:
+            self._frequency = int(fixed.group(1))
+        elif governor:
+            self._frequency = GOVERNOR_FREQUENCIES.get(governor.group(1), MAX_FREQUENCY)
+        elif "restore" in command:
+            self._frequency = MAX_FREQUENCY
+        name = "performance" if fixed else governor.group(1) if governor else "ondemand"
+        return json.dumps({"governor": name, "min": self._frequency if fixed else 600, "max": self._frequency,
+                           "governors": ["ondemand", "powersave", "performance"],
+                           "frequencies": [600, 1000, MAX_FREQUENCY]}) + "\n"
+
+    @staticmethod
+    def _synthetic_telemetry(start, duration, freq=1400.0, interval=0.05):
+        n = max(2, int(duration / interval) + 1)
+        throttled = random.choice([0, 0, 0, 0x2])
+        samples = [[start + i * interval, float(freq) if not throttled or i < n // 2 else freq - 200.0,
+                    50.0 + 10.0 * i / n, throttled if i >= n // 2 else 0, 0.9] for i in range(n)]
+        return {"samples": samples, "cpu": 0.002 * duration, "wall": duration, "interval": interval}
+
+    def open_sftp(self):
+        return _StandInSFTP(self._files)
+
+    def close(self):
+        pass
+
+
+def start_stand_in_agent(board, ssh_client, token, versions=(), workload_seconds=0.2):
+    '''Serve agent.py on localhost with a stand-in workload; return a client for it'''
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-c", AGENT_WORKLOAD.format(here=here, seconds=workload_seconds), "{version}"]
+    server = AgentServer(("127.0.0.1", 0), token, command=command, idle_probe=lambda: 1.0,
+                         prepare_command=[sys.executable, "-c", "print('VENV stand-in')"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return AgentClient("127.0.0.1", server.server_address[1], token)
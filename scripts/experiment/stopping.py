@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Sequential stopping rule for the number of iterations per configuration.
+
+Instead of a fixed number of iterations, a configuration (board, OS, Python
+version) is measured until the Student-t confidence interval of its mean
+energy is narrow enough:
+
+    half_width = t(1 - (1 - confidence) / 2, n - 1) * s / sqrt(n)
+    stop once n >= min_iterations and half_width / mean <= target,
+    or once n reaches max_iterations
+
+The estimate is recomputed from the stored energies after every iteration.
+Stable configurations stop early; the iterations they leave unused stay in
+the board's budget (see matrix.py) and go to the configurations that are
+still noisy, up to max_iterations each.
+
+The t quantile uses the closed forms for 1 and 2 degrees of freedom and the
+Cornish-Fisher expansion (Abramowitz and Stegun 26.7.5) above, accurate to
+about 1e-3 from 3 degrees of freedom on, so only the standard library is needed.
+"""
+
+import math
+from collections import namedtuple
+from statistics import NormalDist, fmean, stdev
+
+DEFAULT_TARGET = 0.02
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_ITERATIONS = 5
+
+Precision = namedtuple("Precision", ["n", "mean", "half_width", "relative"])
+
+
+class StoppingRule(namedtuple("StoppingRule", ["target", "confidence", "min_iterations", "max_iterations"])):
+    '''Relative CI half-width target with minimum and maximum iteration caps'''
+
+    @classmethod
+    def from_spec(cls, adaptive, iterations):
+        '''Rule from the "adaptive" section of a matrix spec; max_iterations defaults to iterations'''
+        rule = cls(adaptive.get("target", DEFAULT_TARGET),
+                   adaptive.get("confidence", DEFAULT_CONFIDENCE),
+                   adaptive.get("min_iterations", DEFAULT_MIN_ITERATIONS),
+                   adaptive.get("max_iterations", iterations))
+        if not 0 < rule.target:
+            raise ValueError("target must be positive")
+        if not 0 < rule.confidence < 1:
+            raise ValueError("confidence must be between 0 and 1")
+        if not 2 <= rule.min_iterations <= rule.max_iterations:
+            raise ValueError("need 2 <= min_iterations <= max_iterations")
+        return rule
+
+    def decide(self, energies):
+        '''(stop, reason, precision) for the energies measured so far'''
+        estimate = precision(energies, self.confidence)
+        if estimate.n >= self.max_iterations:
+            return True, "cap reached", estimate
+        if estimate.n >= self.min_iterations and estimate.relative <= self.target:
+            return True, "target reached", estimate
+        return False, "running", estimate
+
+
+def t_quantile(p, df):
+    '''Quantile p of Student's t distribution with df degrees of freedom'''
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+def precision(energies, confidence=DEFAULT_CONFIDENCE):
+    '''Mean energy and the half-width of its confidence interval, absolute and relative'''
+    n = len(energies)
+    if n < 2:
+        return Precision(n, energies[0] if n else None, math.inf, math.inf)
+    mean = fmean(energies)
+    half_width = t_quantile(1 - (1 - confidence) / 2, n - 1) * stdev(energies) / math.sqrt(n)
+    return Precision(n, mean, half_width, half_width / abs(mean) if mean else math.inf)
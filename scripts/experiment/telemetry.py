@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Telemetry sampler for the Raspberry Pi: CPU frequency, temperature, throttling, load.
+
+While a workload runs, a background thread samples at a fixed interval
+
+    freq        mean current CPU frequency over all cores (MHz), from
+                /sys/devices/system/cpu/cpu*/cpufreq/scaling_cur_freq
+    temp        SoC temperature (°C), from /sys/class/thermal/thermal_zone0/temp
+    throttled   firmware throttling flags (the value of vcgencmd get_throttled),
+                from /sys/devices/platform/soc/soc:firmware/get_throttled or,
+                at most once per throttle_interval, from vcgencmd itself
+    busy        share of CPU time not idle since the previous sample, from /proc/stat
+
+On FreeBSD the values come from one sysctl call (dev.cpu.0.freq,
+dev.cpu.0.temperature, kern.cp_time) per throttle interval instead; throttled
+is not available there.
+The /sys and /proc files are kept open and re-read from the start, so a
+sample costs a few reads and no process start-up. Samples are buffered in
+memory, stamped with the Pi clock, and only handed over once the run is over.
+The sampler measures its own CPU time (thread time plus any vcgencmd or sysctl
+calls) so the orchestrators can report its cost.
+
+The agent (agent.py) samples in-process around every run. Over SSH the
+workload is wrapped instead:
+
+    python3 telemetry.py --interval 0.1 --out telemetry.json -- bash run_benchmarks.sh python3.13
+
+which runs the command with its output passed through, exits with its status
+and writes {"samples": [[time, freq, temp, throttled, busy], ...], "cpu": s,
+"wall": s, "interval": s} to --out.
+
+store_telemetry and describe_telemetry are used on the orchestrator side.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.1
+THROTTLE_INTERVAL = 1.0
+SAMPLE_FIELDS = ["time", "freq", "temp", "throttled", "busy"]
+# Bits of get_throttled describing the current state (the higher bits are sticky since boot):
+# under-voltage, ARM frequency capped, currently throttled, soft temperature limit
+THROTTLED_NOW = 0xF
+
+FREQ_FILES = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"
+TEMP_FILE = "/sys/class/thermal/thermal_zone0/temp"
+THROTTLED_FILE = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+STAT_FILE = "/proc/stat"
+
+
+def cpu_times():
+    '''(busy, idle) jiffies of all CPUs since boot'''
+    try:
+        with open(STAT_FILE) as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+    except FileNotFoundError:
+        # FreeBSD: user nice sys intr idle
+        values = [int(v) for v in subprocess.check_output(["sysctl", "-n", "kern.cp_time"]).split()]
+        idle = values[4]
+    return sum(values) - idle, idle
+
+
+def _open(path):
+    try:
+        return open(path, "rb", buffering=0)
+    except OSError:
+        return None
+
+
+def _read(f):
+    f.seek(0)
+    return f.read()
+
+
+def _children_cpu():
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+class Sampler:
+    '''Sample the telemetry in a background thread between start() and stop()'''
+
+    def __init__(self, interval=DEFAULT_INTERVAL, throttle_interval=THROTTLE_INTERVAL):
+        self.interval = interval
+        self.throttle_interval = throttle_interval
+        self.samples = []
+        self.cpu = 0.0
+        self.helper_cpu = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._freq = [f for f in map(_open, sorted(glob.glob(FREQ_FILES))) if f]
+        self._temp = _open(TEMP_FILE)
+        self._throttled = _open(THROTTLED_FILE)
+        self._stat = _open(STAT_FILE)
+        self._vcgencmd = self._throttled is None and subprocess.run(
+            "command -v vcgencmd", shell=True, stdout=subprocess.DEVNULL).returncode == 0
+        self._sysctl = self._stat is None
+        self._slow = {"at": 0.0, "freq": None, "temp": None, "throttled": None}
+        self._times = None
+        self._wall = None
+
+    def _run_cpu(self, argv):
+        '''Output of a helper process, its CPU time charged to the sampler'''
+        before = _children_cpu()
+        try:
+            return subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+        finally:
+            self.helper_cpu += _children_cpu() - before
+
+    def _slow_values(self, now):
+        '''Values that need a helper process, refreshed at most once per throttle_interval'''
+        slow = self._slow
+        if now - slow["at"] >= self.throttle_interval:
+            slow["at"] = now
+            if self._vcgencmd:
+                out = self._run_cpu(["vcgencmd", "get_throttled"])
+                slow["throttled"] = int(out.split("=")[1], 16) if "=" in out else None
+            if self._sysctl:
+                lines = self._run_cpu(["sysctl", "-n", "dev.cpu.0.freq", "dev.cpu.0.temperature",
+                                       "kern.cp_time"]).splitlines()
+                values = dict(zip(["freq", "temp", "cp_time"], lines))
+                slow["freq"] = float(values["freq"]) if "freq" in values else None
+                slow["temp"] = float(values["temp"].rstrip("C")) if "temp" in values else None
+                if "cp_time" in values:
+                    # user nice sys intr idle
+                    ticks = [int(v) for v in values["cp_time"].split()]
+                    slow["busy"] = self._busy_share((sum(ticks) - ticks[4], ticks[4]))
+        return slow
+
+    def _busy_share(self, times):
+        '''Share of CPU time not idle since the previous (busy, idle) reading'''
+        previous, self._times = self._times, times
+        if previous is None:
+            return None
+        busy, idle = times[0] - previous[0], times[1] - previous[1]
+        return busy / (busy + idle) if busy + idle else None
+
+    def _busy(self, slow):
+        if self._stat is None:
+            return slow.pop("busy", None)
+        values = [int(v) for v in _read(self._stat).split(b"\n", 1)[0].split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return self._busy_share((sum(values) - idle, idle))
+
+    def sample(self):
+        now = time.time()
+        slow = self._slow_values(now)
+        freq = slow["freq"]
+        if self._freq:
+            freq = sum(int(_read(f)) for f in self._freq) / len(self._freq) / 1000
+        temp = int(_read(self._temp)) / 1000 if self._temp is not None else slow["temp"]
+        throttled = int(_read(self._throttled), 16) if self._throttled is not None else slow["throttled"]
+        self.samples.append([now, freq, temp, throttled, self._busy(slow)])
+
+    def _loop(self):
+        start = time.thread_time()
+        deadline = time.monotonic()
+        while True:
+            self.sample()
+            deadline += self.interval
+            if self._stop.wait(max(0.0, deadline - time.monotonic())):
+                break
+        self.sample()
+        self.cpu += time.thread_time() - start
+
+    def start(self):
+        self._wall = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stop sampling; return the buffered samples and the sampler's cost'''
+        self._stop.set()
+        self._thread.join()
+        wall = time.monotonic() - self._wall
+        for f in self._freq + [self._temp, self._throttled, self._stat]:
+            if f is not None:
+                f.close()
+        return {"samples": self.samples, "cpu": self.cpu + self.helper_cpu, "wall": wall,
+                "interval": self.interval}
+
+
+def summarize(samples):
+    '''Per-run summary of the samples: frequency, temperature, throttling flags and load'''
+    columns = {name: [s[i] for s in samples if s[i] is not None] for i, name in enumerate(SAMPLE_FIELDS)}
+    freq, temp, throttled, busy = columns["freq"], columns["temp"], columns["throttled"], columns["busy"]
+    flags = None
+    if throttled:
+        flags = 0
+        for value in throttled:
+            flags |= value & THROTTLED_NOW
+    return {
+        "samples": len(samples),
+        "freq_min": min(freq) if freq else None,
+        "freq_mean": sum(freq) / len(freq) if freq else None,
+        "temp_max": max(temp) if temp else None,
+        "throttled": flags,
+        "busy_mean": sum(busy) / len(busy) if busy else None,
+    }
+
+
+def store_telemetry(db, run_id, telemetry, to_recording_time):
+    '''Put the telemetry samples of a run on the Otii time axis and store them; return the summary'''
+    samples = [[to_recording_time(s[0])] + s[1:] for s in telemetry["samples"]]
+    summary = summarize(samples)
+    db.insert_telemetry(run_id, samples, summary, telemetry["interval"], telemetry["cpu"], telemetry["wall"])
+    return summary
+
+
+def describe_telemetry(summary, telemetry):
+    '''One-line report of a run's telemetry and of what the sampler cost'''
+    parts = [f"{summary['samples']} samples"]
+    if summary["temp_max"] is not None:
+        parts.append(f"max {summary['temp_max']:.1f} °C")
+    if summary["freq_min"] is not None:
+        parts.append(f"min {summary['freq_min']:.0f} MHz")
+    if summary["throttled"] is not None:
+        parts.append(f"throttled {summary['throttled']:#x}")
+    share = telemetry["cpu"] / telemetry["wall"] if telemetry["wall"] else 0.0
+    parts.append(f"sampler used {telemetry['cpu']:.3f} CPU s ({100 * share:.2f} % of one core)")
+    return ", ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a command while sampling CPU frequency, temperature, '
+                                                 'throttling and load')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between samples')
+    parser.add_argument('--out', default='telemetry.json', help='File the samples are written to afterwards')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='Command to run, after --')
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error("no command given")
+
+    sampler = Sampler(args.interval).start()
+    try:
+        status = subprocess.call(command)
+    finally:
+        telemetry = sampler.stop()
+        # The whole wrapper process, interpreter start-up included, is the sampler's cost
+        t = os.times()
+        telemetry["cpu"] = t.user + t.system + sampler.helper_cpu
+        with open(args.out, "w") as f:
+            json.dump(telemetry, f)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Multi-resolution min/max/sum index of a stored power trace.
+
+Next to <name>.f32 (see trace_store.py) the pyramid keeps one file per level:
+
+    <name>.pyr/level<k>.bin   one record (min, max, sum) per block of
+                              BASE_BLOCK * 2**k samples, readable with np.memmap
+    <name>.pyr/pyramid.json   base block size, number of levels and blocks
+
+The mean of a block is sum / samples and its energy sum * interval, corrected
+by half of the first and last sample for the trapezoidal rule at the edges of
+a range. A time range is rendered at screen resolution from the level whose
+blocks are just smaller than a pixel, and the energy, min, max or mean of any
+range comes from at most two blocks per level plus fewer than 2 * BASE_BLOCK
+raw samples at its ends, so neither touches more than O(pixels) records
+however long the recording is.
+
+PyramidBuilder takes the samples in chunks in a single pass and appends to
+the level files as blocks complete. TraceWriter feeds it while a trace is
+still downloading; 'build' indexes traces stored before the pyramid existed.
+
+Usage:
+    python3 trace_pyramid.py build ../../results/traces/trace_*.f32
+    python3 trace_pyramid.py energy ../../results/traces/trace_X --from 10 --to 70
+    python3 trace_pyramid.py plot ../../results/traces/trace_X --from 10 --to 70 --out slice.png
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+BASE_BLOCK = 64
+MAX_LEVELS = 22
+BLOCK_DTYPE = np.dtype([('min', '<f4'), ('max', '<f4'), ('sum', '<f8')])
+BUILD_CHUNK_SIZE = 500_000
+
+
+def pyramid_dir(path):
+    return path + ".pyr"
+
+
+def _level_file(path, level):
+    return os.path.join(pyramid_dir(path), f"level{level}.bin")
+
+
+class PyramidBuilder:
+    '''Build the pyramid of a trace in one pass over its samples'''
+
+    def __init__(self, path, base_block=BASE_BLOCK, levels=MAX_LEVELS):
+        self.path = path
+        self.base_block = base_block
+        self.levels = levels
+        self.count = 0
+        self.blocks = [0] * levels
+        self._pending = np.empty(0, dtype='<f4')
+        # Per level, a block still waiting for its right-hand sibling
+        self._carry = [np.empty(0, dtype=BLOCK_DTYPE) for _ in range(levels)]
+        os.makedirs(pyramid_dir(path), exist_ok=True)
+        self._files = [open(_level_file(path, k), "wb") for k in range(levels)]
+
+    def write(self, values):
+        '''Add samples (as stored, float32) to the pyramid'''
+        values = np.asarray(values, dtype='<f4')
+        self.count += values.size
+        if self._pending.size:
+            values = np.concatenate([self._pending, values])
+        full = values.size - values.size % self.base_block
+        self._pending = values[full:].copy()
+        if not full:
+            return
+        samples = values[:full].reshape(-1, self.base_block)
+        blocks = np.empty(len(samples), dtype=BLOCK_DTYPE)
+        blocks['min'] = samples.min(axis=1)
+        blocks['max'] = samples.max(axis=1)
+        blocks['sum'] = samples.sum(axis=1, dtype=np.float64)
+        for level in range(self.levels):
+            self._append(level, blocks)
+            blocks = np.concatenate([self._carry[level], blocks])
+            paired = len(blocks) - len(blocks) % 2
+            self._carry[level] = blocks[paired:]
+            if not paired:
+                break
+            left, right = blocks[0:paired:2], blocks[1:paired:2]
+            blocks = np.empty(paired // 2, dtype=BLOCK_DTYPE)
+            blocks['min'] = np.minimum(left['min'], right['min'])
+            blocks['max'] = np.maximum(left['max'], right['max'])
+            blocks['sum'] = left['sum'] + right['sum']
+
+    def _append(self, level, blocks):
+        blocks.tofile(self._files[level])
+        self.blocks[level] += len(blocks)
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        levels = max((k + 1 for k, n in enumerate(self.blocks) if n), default=0)
+        for k in range(levels, self.levels):
+            os.remove(_level_file(self.path, k))
+        meta = {'base_block': self.base_block, 'count': self.count, 'blocks': self.blocks[:levels]}
+        tmp = os.path.join(pyramid_dir(self.path), "pyramid.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(pyramid_dir(self.path), "pyramid.json"))
+        return meta
+
+    def abort(self):
+        for f in self._files:
+            f.close()
+
+
+def build_pyramid(path, chunk_size=BUILD_CHUNK_SIZE):
+    '''Index a stored trace (<path>.f32/.json); return the pyramid metadata'''
+    from trace_store import load_trace
+
+    samples, _ = load_trace(path)
+    builder = PyramidBuilder(path)
+    for lo in range(0, len(samples), chunk_size):
+        builder.write(samples[lo:lo + chunk_size])
+    return builder.close()
+
+
+def has_pyramid(path):
+    return os.path.isfile(os.path.join(pyramid_dir(path), "pyramid.json"))
+
+
+class Pyramid:
+    '''Memory-mapped pyramid of a stored trace, with the raw samples for the edges'''
+
+    def __init__(self, path):
+        from trace_store import load_trace
+
+        self.samples, self.meta = load_trace(path)
+        with open(os.path.join(pyramid_dir(path), "pyramid.json")) as f:
+            info = json.load(f)
+        self.base_block = info['base_block']
+        self.levels = [np.memmap(_level_file(path, k), dtype=BLOCK_DTYPE, mode='r', shape=(n,))
+                       for k, n in enumerate(info['blocks'])]
+        self.interval = self.meta['interval']
+
+    def __len__(self):
+        return len(self.samples)
+
+    def index_at(self, t):
+        '''Sample index of a recording time, clamped to the trace'''
+        return min(max(0, int(round((t - self.meta['timestamp']) / self.interval))), len(self))
+
+    def _parts(self, start, stop):
+        '''Cover [start, stop) with raw sample slices and as few pyramid blocks as possible'''
+        raw, blocks = [], []
+        block = self.base_block
+        first = min(stop, -(-start // block) * block)
+        n0 = len(self.levels[0]) if self.levels else 0
+        last = max(first, min(stop // block * block, n0 * block))
+        if first > start:
+            raw.append((start, first))
+        i, j = first // block, last // block
+        while i < j:
+            level = 0
+            while (level + 1 < len(self.levels) and i % (2 << level) == 0 and i + (2 << level) <= j
+                   and (i >> (level + 1)) < len(self.levels[level + 1])):
+                level += 1
+            blocks.append(self.levels[level][i >> level])
+            i += 1 << level
+        if stop > last:
+            raw.append((last, stop))
+        return raw, blocks
+
+    def stats(self, start=0, stop=None):
+        '''(min, max, mean, energy in J) of the samples in [start, stop)'''
+        stop = len(self) if stop is None else min(stop, len(self))
+        if stop - start < 1:
+            raise ValueError("Empty sample range")
+        raw, blocks = self._parts(start, stop)
+        lo, hi, total = np.inf, -np.inf, 0.0
+        for block in blocks:
+            lo, hi, total = min(lo, block['min']), max(hi, block['max']), total + block['sum']
+        for a, b in raw:
+            values = np.asarray(self.samples[a:b], dtype=np.float64)
+            lo, hi, total = min(lo, values.min()), max(hi, values.max()), total + values.sum()
+        edges = (float(self.samples[start]) + float(self.samples[stop - 1])) / 2
+        return float(lo), float(hi), total / (stop - start), (total - edges) * self.interval
+
+    def energy(self, start=0, stop=None):
+        '''Trapezoidal energy (J) of the samples in [start, stop), as trace_store.trace_energy'''
+        stop = len(self) if stop is None else min(stop, len(self))
+        return self.stats(start, stop)[3] if stop - start > 1 else 0.0
+
+    def render(self, start, stop, pixels):
+        '''Per-pixel (first sample index, min, max, mean) of [start, stop) for plotting
+
+        Reads the level whose blocks hold at most (stop - start) / pixels
+        samples, with pixel edges snapped to its blocks; below one base block
+        per pixel the raw samples are used. The end of the trace that no
+        block of that level covers yet is rendered from the level below.
+        '''
+        stop = min(stop, len(self))
+        pixels = max(1, pixels)
+        per_pixel = max(1, (stop - start) // pixels)
+        level = -1
+        while level + 1 < len(self.levels) and self.base_block << (level + 1) <= per_pixel:
+            level += 1
+        return self._render_level(start, stop, pixels, level)
+
+    def _render_level(self, start, stop, pixels, level):
+        if level < 0:
+            values = np.asarray(self.samples[start:stop], dtype=np.float64)
+            return _bucket(start, 1, values, values, values, pixels)
+        size = self.base_block << level
+        blocks = self.levels[level]
+        first = start // size
+        covered = min(len(blocks), -(-stop // size))
+        end = min(stop, covered * size)
+        if covered <= first:
+            return self._render_level(start, stop, pixels, level - 1)
+        share = pixels if end >= stop else max(1, round(pixels * (end - start) / (stop - start)))
+        chunk = blocks[first:covered]
+        parts = _bucket(first * size, size, chunk['min'], chunk['max'], chunk['sum'] / size, share)
+        if end < stop:
+            tail = self._render_level(end, stop, max(1, pixels - share), level - 1)
+            parts = tuple(np.concatenate(pair) for pair in zip(parts, tail))
+        return parts
+
+
+def _bucket(offset, size, mins, maxs, means, pixels):
+    '''Reduce equal-sized items (blocks or samples) to at most pixels buckets'''
+    n = len(mins)
+    if n == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty, empty
+    edges = np.unique(np.linspace(0, n, min(pixels, n) + 1).astype(np.int64)[:-1])
+    counts = np.diff(np.append(edges, n))
+    return (offset + edges * size,
+            np.minimum.reduceat(np.asarray(mins, dtype=np.float64), edges),
+            np.maximum.reduceat(np.asarray(maxs, dtype=np.float64), edges),
+            np.add.reduceat(np.asarray(means, dtype=np.float64), edges) / counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the min/max/sum pyramid of stored power traces')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Index stored traces')
+    build.add_argument('traces', nargs='+', help='Trace paths, with or without the .f32 extension')
+    build.add_argument('--force', action='store_true', help='Rebuild pyramids that already exist')
+    for name, text in (('energy', 'Energy and power statistics of a time range'),
+                       ('plot', 'Plot a time range at screen resolution')):
+        query = sub.add_parser(name, help=text)
+        query.add_argument('trace', help='Trace path, with or without the .f32 extension')
+        query.add_argument('--from', dest='start', type=float, help='Start, in recording seconds')
+        query.add_argument('--to', dest='stop', type=float, help='End, in recording seconds')
+        if name == 'plot':
+            query.add_argument('--pixels', type=int, default=1600, help='Horizontal resolution')
+            query.add_argument('--out', default='trace.png', help='Output image')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for trace in args.traces:
+            path = trace[:-len(".f32")] if trace.endswith(".f32") else trace
+            if has_pyramid(path) and not args.force:
+                print(f"{path}: pyramid exists")
+                continue
+            meta = build_pyramid(path)
+            print(f"{path}: {meta['count']} samples, {len(meta['blocks'])} levels")
+        return
+
+    path = args.trace[:-len(".f32")] if args.trace.endswith(".f32") else args.trace
+    if not has_pyramid(path):
+        build_pyramid(path)
+    pyramid = Pyramid(path)
+    start = 0 if args.start is None else pyramid.index_at(args.start)
+    stop = len(pyramid) if args.stop is None else pyramid.index_at(args.stop)
+    if args.command == 'energy':
+        lo, hi, mean, energy = pyramid.stats(start, stop)
+        print(f"{(stop - start) * pyramid.interval:.3f} s: energy {energy:.5f} J, "
+              f"mean {mean:.5f} W, min {lo:.5f} W, max {hi:.5f} W")
+    else:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        index, lo, hi, mean = pyramid.render(start, stop, args.pixels)
+        t = pyramid.meta['timestamp'] + index * pyramid.interval
+        fig, ax = plt.subplots(figsize=(args.pixels / 100, 4), dpi=100)
+        ax.fill_between(t, lo, hi, step='post', alpha=0.4, linewidth=0, label='min/max')
+        ax.step(t, mean, where='post', linewidth=0.8, label='mean')
+        ax.set_xlabel('Recording time (s)')
+        ax.set_ylabel('Power (W)')
+        ax.legend(loc='upper right')
+        fig.tight_layout()
+        fig.savefig(args.out)
+        print(f"Saved {args.out}")
+
+
+if __name__ == '__main__':
+    main()
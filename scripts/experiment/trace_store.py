@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+On-disk storage for raw Otii power traces.
+
+A trace is stored as two files:
+    <name>.f32     little-endian float32 samples, readable with np.memmap
+    <name>.json    metadata sidecar (channel, sample interval, sample count,
+                   first timestamp, configuration, integrated energy)
+
+Samples are fetched from the Otii recording in bounded-size chunks and
+appended to the .f32 file as they arrive, so a 20-minute recording at 50 kHz
+(about 60M samples) never has to be held in memory. The energy of the trace is
+integrated (trapezoidal rule) while it is written, and its min/max/sum
+pyramid (<name>.pyr/, see trace_pyramid.py) is built in the same pass, so
+slices of it can be plotted or integrated without reading the whole trace.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from trace_pyramid import Pyramid, PyramidBuilder, has_pyramid
+
+DEFAULT_CHUNK_SIZE = 500_000
+SAMPLE_DTYPE = '<f4'
+
+
+class TraceWriter:
+    '''Append samples to a float32 trace file and integrate them on the fly'''
+
+    def __init__(self, path, interval, timestamp=0.0, metadata=None, pyramid=True):
+        self.path = path
+        self.interval = interval
+        self.timestamp = timestamp
+        self.metadata = dict(metadata or {})
+        self.count = 0
+        self.energy = 0.0
+        self._last = None
+        self._file = open(path + ".f32", "wb")
+        self._pyramid = PyramidBuilder(path) if pyramid else None
+
+    def write(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        stored = values.astype(SAMPLE_DTYPE)
+        stored.tofile(self._file)
+        if self._pyramid is not None:
+            self._pyramid.write(stored)
+        # Trapezoids inside this chunk plus the one joining it to the previous chunk
+        self.energy += self.interval * (values.sum() - (values[0] + values[-1]) / 2)
+        if self._last is not None:
+            self.energy += self.interval * (self._last + values[0]) / 2
+        self._last = values[-1]
+        self.count += values.size
+
+    def close(self):
+        self._file.close()
+        if self._pyramid is not None:
+            self._pyramid.close()
+        meta = dict(self.metadata,
+                    dtype=SAMPLE_DTYPE,
+                    count=self.count,
+                    interval=self.interval,
+                    sample_rate=1 / self.interval if self.interval else None,
+                    timestamp=self.timestamp,
+                    energy=self.energy)
+        with open(self.path + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            if self._pyramid is not None:
+                self._pyramid.abort()
+
+
+def download_trace(recording, device_id, channel, path, metadata=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Stream a recording channel to <path>.f32/.json and return the metadata'''
+    count = recording.get_channel_data_count(device_id, channel)
+    if count == 0:
+        raise ValueError(f"Channel {channel} of the recording has no samples")
+    first = recording.get_channel_data(device_id, channel, 0, min(chunk_size, count))
+    meta = dict(metadata or {}, channel=channel, device_id=device_id)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with TraceWriter(path, first["interval"], first["timestamp"], meta) as writer:
+        writer.write(first["values"])
+        index = len(first["values"])
+        while index < count:
+            chunk = recording.get_channel_data(device_id, channel, index, min(chunk_size, count - index))
+            if not chunk["values"]:
+                break
+            writer.write(chunk["values"])
+            index += len(chunk["values"])
+    with open(path + ".json") as f:
+        return json.load(f)
+
+
+def load_trace(path):
+    '''Return (memory-mapped samples, metadata) of a stored trace'''
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    samples = np.memmap(path + ".f32", dtype=meta["dtype"], mode="r", shape=(meta["count"],))
+    return samples, meta
+
+
+def trace_energy(path, start=None, stop=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Trapezoidal energy (J) of a stored power trace between two sample indices'''
+    if has_pyramid(path):
+        return Pyramid(path).energy(start or 0, stop)
+    samples, meta = load_trace(path)
+    samples = samples[start:stop]
+    energy = 0.0
+    last = None
+    for lo in range(0, len(samples), chunk_size):
+        values = np.asarray(samples[lo:lo + chunk_size], dtype=np.float64)
+        energy += values.sum() - (values[0] + values[-1]) / 2
+        if last is not None:
+            energy += (last + values[0]) / 2
+        last = values[-1]
+    return energy * meta["interval"]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Check that the quick pyenergy commands stay within an import-time budget.
+
+Runs 'pyenergy.py --help' and 'pyenergy.py summary' under
+'python -X importtime', adds up the self time of every imported module and
+fails (exit status 1) if a command goes over its budget or imports any of the
+heavy dependencies that only the analysis and experiment subcommands need.
+Each command is run a few times and the fastest run counts, so a busy
+machine does not fail the check. 'summary' is run once beforehand so it
+answers from a fresh cache, as it does after any analysis run.
+
+Usage:
+    python3 importtime_check.py [--budget-ms 250] [--repeat 3]
+
+The default budget leaves room for the slower Raspberry Pis; on a desktop the
+commands import in a fraction of it.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+PYENERGY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyenergy.py")
+BUDGET_MS = 250
+REPEAT = 3
+COMMANDS = [["--help"], ["summary"]]
+HEAVY_MODULES = {"numpy", "pandas", "matplotlib", "scipy", "statsmodels", "paramiko", "otii_tcp_client"}
+
+
+def import_times(args):
+    '''(total self time in ms, set of top-level packages imported) of one pyenergy run'''
+    proc = subprocess.run([sys.executable, "-X", "importtime", PYENERGY] + args,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"pyenergy {' '.join(args)} exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+    total_us = 0
+    packages = set()
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        packages.add(name.strip().split(".")[0])
+    return total_us / 1000, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if pyenergy --help or summary import too much')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS, help='Import-time budget per command')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='Runs per command; the fastest counts')
+    args = parser.parse_args()
+
+    # Make sure the summary cache is fresh, so the check measures the fast path
+    import_times(["summary"])
+
+    failed = False
+    for command in COMMANDS:
+        runs = [import_times(command) for _ in range(args.repeat)]
+        best = min(ms for ms, _ in runs)
+        heavy = sorted(set.union(*(packages for _, packages in runs)) & HEAVY_MODULES)
+        ok = best <= args.budget_ms and not heavy
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} pyenergy {' '.join(command)}: {best:.1f} ms of imports "
+              f"(budget {args.budget_ms:g} ms)" + (f", imports {', '.join(heavy)}" if heavy else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
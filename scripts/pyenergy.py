@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the experiment and analysis scripts.
+
+Each subcommand runs the main() of one script. The script is only imported
+once its subcommand is chosen, so 'pyenergy --help' and the cached 'summary'
+do not import numpy, pandas, matplotlib, scipy, statsmodels, paramiko or the
+Otii client (check with importtime_check.py). Everything after the
+subcommand is passed on to the script:
+
+    python3 pyenergy.py run --matrix matrix.json --simulate
+    python3 pyenergy.py scaling --matrix matrix.json --cores 1 2 4 --simulate
+    python3 pyenergy.py frequency --matrix matrix.json --frequencies 600 1000 1500 --simulate
+    python3 pyenergy.py summary --rpi RPi4B --metric consumption
+    python3 pyenergy.py kruskal --batch
+    python3 pyenergy.py boxplot python
+    python3 pyenergy.py barplot
+    python3 pyenergy.py averages --bootstrap 2000
+    python3 pyenergy.py flamegraph --rpi RPi4B --os ubuntu --python 3.13 --base 3.12
+
+The scripts resolve their input and output paths (../../results, figures/,
+matrix.json) relative to their own directory, so the subcommand runs from it.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# subcommand -> (directory, module, help)
+COMMANDS = {
+    'run': ('experiment', 'orchestrator', 'Run the benchmark matrix on the boards (orchestrator.py)'),
+    'scaling': ('experiment', 'scaling', 'Multi-core scaling sweep of parallel workloads (scaling.py)'),
+    'frequency': ('experiment', 'frequency_sweep', 'CPU governor and frequency sweep of the benchmarks (frequency_sweep.py)'),
+    'summary': ('analysis', 'quick_summary', 'Print summary statistics, from the cache when fresh (quick_summary.py)'),
+    'kruskal': ('analysis', 'kruskal_test', 'Kruskal-Wallis and rank tests (kruskal_test.py)'),
+    'boxplot': ('analysis', 'boxplot', 'Box plot of energy consumption (boxplot.py)'),
+    'barplot': ('analysis', 'multi_barplot', 'Bar plot of the average consumption of all Pis (multi_barplot.py)'),
+    'averages': ('analysis', 'averages', 'Average decrease in energy consumption (averages.py)'),
+    'flamegraph': ('analysis', 'energy_flamegraph', 'Energy flame graphs of profiled runs (energy_flamegraph.py)'),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pyenergy', description='Energy consumption experiments on Raspberry Pis')
+    subparsers = parser.add_subparsers(dest='command', metavar='command', required=True)
+    for name, (_, _, help_text) in COMMANDS.items():
+        # The script parses its own arguments, including --help
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def run_command(name, args):
+    directory, module_name, _ = COMMANDS[name]
+    directory = os.path.join(SCRIPTS_DIR, directory)
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    sys.argv = [f"pyenergy {name}"] + list(args)
+    importlib.import_module(module_name).main()
+
+
+def main(argv=None):
+    args, rest = build_parser().parse_known_args(argv)
+    run_command(args.command, rest)
+
+
+if __name__ == '__main__':
+    main()